@@ -1,4 +1,5 @@
 import datetime
+import functools
 import re
 import os
 import numpy as np
@@ -7,19 +8,84 @@ import json
 import copy
 from Seats import SeatGroupChronology, SeatGroup, Seat, SeatGroupFixedPrice, dt_list_arange, dt_list_trim
 from Seats import DuplicateSeatError, SeatGroupError, EmptySeatGroupError
-from Seats import np_describe
+from Seats import np_describe, match_locs_to_groups, expand_pattern, to_datetime64
+from groupby import Groups
 from stubhub_list_scrape import DATETIME_FORMAT
 from itertools import product
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 import pandas as pd
 
 
+def cached_analysis(method):
+    """
+    Decorator to memoize an Event method's results, keyed by its arguments and the Event's data_version.
+
+    Results are stored in the Event's LRU cache (see Event.cache_size).  Each call gets its own copy of any dicts,
+    lists and tuples in the result, and numpy arrays in cached results are read-only, so a caller cannot change what
+    later callers get.  Other objects (eg: the chronologies from group_chronologies()) are shared between calls and
+    must not be modified.  Calls with arguments that cannot be made hashable are not cached.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            key = (method.__name__, self.data_version, freeze(args), freeze(kwargs))
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        try:
+            self._cache.move_to_end(key)
+            return read_only(self._cache[key])
+        except KeyError:
+            pass
+        result = method(self, *args, **kwargs)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return read_only(result)
+    return wrapper
+
+
+def read_only(result):
+    """
+    Return a cached result in a form that cannot be used to change the cache.
+
+    numpy arrays are made read-only (in place), and dicts, lists and tuples are copied (recursively).  Other objects
+    are returned as they are.
+    """
+    if isinstance(result, np.ndarray):
+        result.flags.writeable = False
+        return result
+    elif isinstance(result, dict):
+        result = copy.copy(result)
+        for k in result:
+            result[k] = read_only(result[k])
+        return result
+    elif type(result) in (list, tuple):
+        return type(result)(read_only(x) for x in result)
+    else:
+        return result
+
+
 class Event(object):
     """
     Object for a event such as a game or concert.
     """
-    def __init__(self, eventid=None):
-        self.chronology = SeatGroupChronology()
+    def __init__(self, eventid=None, seatgroup_class=None, lazy=False, max_resident_nbytes=None, spill_dir=None):
+        """
+        :param eventid: StubHub EventID
+        :param seatgroup_class: Class used for the chronology's SeatGroups (SeatGroup (default) or FlatSeatGroup).  See
+                                SeatGroupChronology
+        :param lazy: If True, timepoints added from files are only parsed when first accessed, eg: for a quick look at
+                     a few timepoints of an event.  See SeatGroupChronology
+        :param max_resident_nbytes: (Optional) Approximate memory budget for lazily loaded or spilled timepoints.  See
+                                    SeatGroupChronology
+        :param spill_dir: (Optional) Directory to spill timepoints to when over max_resident_nbytes, including those of
+                          the chronologies derived from the chronology (sales, sales_filtered, ...), eg: to keep memory
+                          bounded for long events.  See SeatGroupChronology
+        """
+        self.chronology = SeatGroupChronology(seatgroup_class=seatgroup_class, lazy=lazy,
+                                              max_resident_nbytes=max_resident_nbytes, spill_dir=spill_dir)
         self.eventid = eventid
         self.event_info_file = None
         self.datetime = None
@@ -28,11 +94,28 @@ class Event(object):
         self.added = None
         self.new_price = None
         self.new_listid = None
+
+        # Memoized analysis results (see cached_analysis).  _data_version is incremented whenever the underlying data
+        # changes, which invalidates everything cached before that change
+        self._data_version = 0
+        self._cache = OrderedDict()
+        self.cache_size = 128
+        # Days from the event of each chronology timepoint (see days_to_event), and the (_data_version, datetime) it was
+        # computed for
+        self._days_to_event = None
+        self._days_to_event_key = None
+
         self.namemap = [] # For holding any common seat name remapping.  See subclasses below for example
         self.ignore = [] # List of location tuples that are to be ignored during any seat import
-        self.include = None # List of locations that will be used (if not None, anything not on this list is removed after loading SGC)
+        self.include = None # List of locations that will be used (if not None, anything not on this list is removed as each timepoint is loaded)
         self.season_ticket_groups = {}
         self.season_tickets = SeatGroup()
+        # Season ticket group ids and prices for vectorized lookups (see init_season_ticket_seatgroup())
+        self.season_ticket_group_names = []
+        self.season_ticket_prices = np.empty(0)
+        self._season_ticket_prefix_ids = {}
+        self._season_ticket_prefix_depths = []
+        self._season_ticket_loc_ids = {}
 
         self.sales_filter_settings = {
             'avail_tick_thresh_max_ratio': 1.5,  # Maximum ratio someone will pay above the cheapest available ticket
@@ -60,6 +143,11 @@ class Event(object):
                               'sales_filtered_min_moving_average',
                               ]
 
+        # Windows used for all moving averages.  The first window is stored in the *_moving_average attributes, and all
+        # windows are stored in moving_average_windows
+        self.moving_average_timedeltas = [datetime.timedelta(days=5)]
+        self.moving_average_windows = {}
+
         self.sales_min_average = None
         self.listed_min_average = None
         self.sales_filtered_average = None
@@ -90,6 +178,58 @@ class Event(object):
         self.sales_moving_average_rel = None
         self.listed_moving_average_rel = None
 
+    @property
+    def data_version(self):
+        """
+        Return a key identifying the current state of the Event's data and settings.
+
+        Changes whenever timepoints are added, the chronology is replaced or normalized, chronological changes are
+        re-inferred, sales_filter_settings are changed, season_ticket_groups or namemap are set, or the season ticket
+        groups are rebuilt (init_season_ticket_group_locs(), init_season_ticket_seatgroup()).
+
+        :return: A hashable tuple
+        """
+        return self._data_version, freeze(self.sales_filter_settings)
+
+    @property
+    def namemap(self):
+        """
+        List of (regex pattern, replacement) pairs used to rename seat locations as timepoints are loaded (see
+        SeatGroup.update_names()).  Setting it invalidates cached results.
+        """
+        return self._namemap
+
+    @namemap.setter
+    def namemap(self, namemap):
+        self._namemap = namemap
+        self.invalidate_cache()
+
+    @property
+    def season_ticket_groups(self):
+        """
+        Dict of {group name: {'price': price, 'patterns': location patterns, 'locs': locations}} of the season ticket
+        groups.  Setting it invalidates cached results.  After changing the groups in place, rebuild them with
+        init_season_ticket_group_locs() and init_season_ticket_seatgroup(), which also invalidate cached results.
+        """
+        return self._season_ticket_groups
+
+    @season_ticket_groups.setter
+    def season_ticket_groups(self, season_ticket_groups):
+        self._season_ticket_groups = season_ticket_groups
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """
+        Mark the Event's data as changed, so all previously cached results are discarded.
+
+        Called internally by any method that changes the data.  Call this manually after modifying the chronology or
+        other data directly.
+
+        :return: None
+        """
+        self._data_version += 1
+        self._cache.clear()
+
     def add_meta(self, json_file=None):
         """
         Add an Event's metadata from a JSON formatted event info file, looking it up by eventid.
@@ -129,14 +269,11 @@ class Event(object):
         :param update_names: If true, invoke
         :return: None
         """
-        self.chronology.add_seatgroup_from_event_json(timepoint, json_file, update_names=self.namemap)
-        # Remove any seats on ignore list
-        # Better way to do this?  Feels wasteful.
-        for ig in self.ignore:
-            try:
-                self.chronology.seatgroups[timepoint].remove(ig, remove_deep_seats=True, cleanup_empty_groups=True)
-            except SeatGroupError:
-                pass
+        self.invalidate_cache()
+        # Any seats on the ignore list are removed, and only those on the include list (if any) are kept, as the
+        # SeatGroup is loaded
+        self.chronology.add_seatgroup_from_event_json(timepoint, json_file, update_names=self.namemap,
+                                                      ignore=self.ignore, include=self.include)
 
         if update_meta:
             if self.meta != None and self.meta != self.chronology.seatgroups[timepoint].meta:
@@ -152,6 +289,24 @@ class Event(object):
         raise NotImplementedError()
 
 
+    def init_season_ticket_group_locs(self):
+        """
+        Add the list of seat locations ('locs') to any season ticket group defined only by location patterns.
+
+        Groups are defined by 'patterns', a list of location patterns (see Seats.SeatGroup.query_seats()) such as
+        [(sections, rows)], and are sliced from SeatGroups using those patterns.  'locs' is the expanded list of
+        locations, used to build the season ticket SeatGroup and the inclusion list.  Groups defined only by 'locs' use
+        their locs as patterns.
+
+        :return: None
+        """
+        self.invalidate_cache()
+        for group in self.season_ticket_groups.values():
+            if 'locs' not in group:
+                group['locs'] = [loc for pattern in group['patterns'] for loc in expand_pattern(pattern)]
+            elif 'patterns' not in group:
+                group['patterns'] = [tuple(loc) for loc in group['locs']]
+
     def init_season_ticket_seatgroup(self, price_override=None):
         """
         Initialize a SeatGroup with all season tickets.
@@ -161,21 +316,76 @@ class Event(object):
         :param price_override: A fixed price for a single game for all seats (useful for debugging).  If None, standard prices are used
         :return: None
         """
+        self.invalidate_cache()
+        # Season ticket prices as a vector indexed by group id (position in season_ticket_group_names), for pricing
+        # many seats at once (see get_season_ticket_group_ids())
+        self.season_ticket_group_names = sorted(self.season_ticket_groups)
+        self.season_ticket_prices = np.empty(len(self.season_ticket_group_names))
+        self._season_ticket_prefix_ids = {}
+        self._season_ticket_loc_ids = {}
         for group in self.season_ticket_groups:
+            i = self.season_ticket_group_names.index(group)
             sgfp = SeatGroupFixedPrice()
             if price_override is None:
                 this_price = self.season_ticket_groups[group]['price']
             else:
                 this_price = price_override
             sgfp.add_seat(Seat(this_price, season_ticket_group=group))
+            self.season_ticket_prices[i] = this_price
             for s in self.season_ticket_groups[group]['locs']:
                 self.season_tickets.add_seat(sgfp, s)
+                # Locations in more than one group get the cheapest group's price, the same as the merge in add_seat
+                prefix = tuple(str(x) for x in s)
+                j = self._season_ticket_prefix_ids.get(prefix)
+                if j is None or this_price < self.season_ticket_prices[j]:
+                    self._season_ticket_prefix_ids[prefix] = i
+        self._season_ticket_prefix_depths = sorted(set(len(prefix) for prefix in self._season_ticket_prefix_ids))
+
+    def get_season_ticket_group_ids(self, locs):
+        """
+        Return the id of the season ticket group of each seat location, as an index into season_ticket_group_names and
+        season_ticket_prices.
+
+        Raises a SeatGroupError if a location is not in any season ticket group.
+
+        :param locs: List of full seat location tuples, eg: from SeatGroupChronology.get_price_table()
+        :return: Numpy int array of group ids, one for each loc
+        """
+        loc_ids = self._season_ticket_loc_ids
+        ids = np.empty(len(locs), dtype=np.intp)
+        for i, loc in enumerate(locs):
+            try:
+                ids[i] = loc_ids[loc]
+            except KeyError:
+                for depth in self._season_ticket_prefix_depths:
+                    if loc[:depth] in self._season_ticket_prefix_ids:
+                        loc_ids[loc] = self._season_ticket_prefix_ids[loc[:depth]]
+                        break
+                else:
+                    raise SeatGroupError("Seat '{0}' is not in a season ticket group".format(loc))
+                ids[i] = loc_ids[loc]
+        return ids
+
+    def relative_prices(self, sgc):
+        """
+        Return a new SGC with the seats of sgc priced relative to their season ticket price (price - season ticket price).
+
+        Equivalent to sgc - self.season_tickets, but looks up each seat's season ticket price through its group id and
+        subtracts the prices of all seats at once.
+
+        :param sgc: A SeatGroupChronology with only seats in season ticket groups
+        :return: SeatGroupChronology
+        """
+        timepoints, locs, prices = sgc.get_price_table()
+        return sgc.with_prices(prices - self.season_ticket_prices[self.get_season_ticket_group_ids(locs)])
 
 
     def scrape_timepoints_from_dir(self, directory="./", update_names=True, tp_slice=None, tp_map=None):
         """
         Scrapes directory for JSON listings files of format "eventid_YYYY-MM-DD_hh-mm-ss.json" and adds them to event.
 
+        If the Event is lazy, the files are only registered here and each is parsed when its timepoint is first used.
+
         :param eventid: DEPRECIATED EventID to look for in directory (only adds events with this ID)
         :param directory: Directory to search for listing files
         :param tp_slice: Optionally load only some of the data, based on a date slice
@@ -223,16 +433,8 @@ class Event(object):
         for tp, fn in sorted(tp_map.items()):
             self.add_timepoint(tp, fn, update_names=update_names)
 
-        # Keep only the locations on the include list
-        if self.include is not None:
-            old_locs = self.chronology.get_locs()
-            self.chronology = self.chronology.get_seats(self.include)
-            new_locs = self.chronology.get_locs()
-            removed = [loc for loc in old_locs if loc not in new_locs]
-            # print("Include filtered out {0} seats:".format(len(removed)))
-            # pprint(removed)
-
     def infer_chronological_changes(self):
+        self.invalidate_cache()
         self.chronology.find_differences()
         self.sales = self.chronology.sales
         self.added = self.chronology.added
@@ -253,12 +455,13 @@ class Event(object):
         st_max_abs = self.sales_filter_settings['st_max_abs']
 
         # Apply filters
-        sales_filt = copy.deepcopy(self.sales) # faster way?  Make a real copy routine?
+        sales_filt = self.sales.copy()
+        group_sales = self.group_chronologies('sales')
+        group_avail = self.group_chronologies('chronology')
         # print("Number of seats in sales before filter: {0}".format(len(sales_filt)))
         for g in sorted(self.season_ticket_groups): # Sorting not necessary, but easier for debugging
             st_price = self.season_ticket_groups[g]['price']
-            locs = self.season_ticket_groups[g]['locs']
-            group_sales_sgc = self.sales.get_seats(seat_locs=locs)
+            group_sales_sgc = group_sales[g]
             for i_tp in range(len(group_sales_sgc.sorted_timepoints)):
                 tp = group_sales_sgc.sorted_timepoints[i_tp]
                 tp_sales_sg = group_sales_sgc.seatgroups[tp]
@@ -268,7 +471,7 @@ class Event(object):
                     continue
 
                 # Collect the data
-                tp_avail = self.chronology.seatgroups[tp].get_seats_as_seatgroup(seat_locs=locs, fail_if_missing=False)
+                tp_avail = group_avail[g].seatgroups[tp]
                 tp_prices = tp_sales_sg.get_prices()
                 tp_prices_masks = []
                 # Make the filters (True means a row will be removed)
@@ -306,24 +509,36 @@ class Event(object):
         self.sales_filtered = sales_filt
 
         # Calculate sales prices relative to season ticket costs
-        self.sales_rel = self.sales - self.season_tickets
-        self.sales_filtered_rel = self.sales_filtered - self.season_tickets
+        self.sales_rel = self.relative_prices(self.sales)
+        self.sales_filtered_rel = self.relative_prices(self.sales_filtered)
 
     # Properties
     # Add day_of_week property?
     # Add time of event/date of event, which pulls from the self.datetime?
 
-    def calc_all_average_price_history(self, averages_to_calculate = None):
+    def calc_all_average_price_history(self, averages_to_calculate = None, moving_average_timedeltas = None):
         """
         Calculate and store standard average price history data.
 
+        Moving averages are calculated for all windows in moving_average_timedeltas in a single pass.  The first window
+        is stored in the average's attribute (eg: self.sales_moving_average[group]) and all windows are stored in
+        self.moving_average_windows[average][group][timedelta] (and the same for the average's "_rel" version).
+
+        :param averages_to_calculate: List of averages to calculate (default is self.default_averages_to_calculate)
+        :param moving_average_timedeltas: List of one or more timedelta windows for moving averages (default is
+                                          self.moving_average_timedeltas)
         :return: None
         """
 
         if averages_to_calculate is None:
             averages_to_calculate = self.default_averages_to_calculate
+        if moving_average_timedeltas is None:
+            moving_average_timedeltas = self.moving_average_timedeltas
+        moving_average_timedeltas = list(moving_average_timedeltas)
+        if len(moving_average_timedeltas) == 0:
+            raise ValueError("moving_average_timedeltas must include at least one timedelta")
 
-        moving_average_timedelta = datetime.timedelta(days=5)
+        moving_average_timedelta = moving_average_timedeltas
 
         # Settings for different types of averages
         settings = {
@@ -399,21 +614,50 @@ class Event(object):
         for p in averages_to_calculate:
             setattr(self, p, {})
             setattr(self, p + "_rel", {})
+            if settings[p]['average_type'] == 'moving':
+                self.moving_average_windows[p] = {}
+                self.moving_average_windows[p + "_rel"] = {}
+
+        # Each group's seats from each chronology, split from the chronology in one pass
+        chronology_names = {'listed': 'chronology', 'sales': 'sales', 'sales_filtered': 'sales_filtered'}
+        group_sgcs = {}
+        for p in averages_to_calculate:
+            price_type = settings[p]['price_type']
+            if price_type not in group_sgcs:
+                group_sgcs[price_type] = self.group_chronologies(chronology_names[price_type])
 
-        caph = self.average_price_history
         # Calculate the requested averages
         for i, g in enumerate(sorted(self.season_ticket_groups)):
-            locs = self.season_ticket_groups[g]['locs']
+            st_price = self.season_ticket_groups[g]['price']
             for p in averages_to_calculate:
+                kwargs = {k: v for k, v in settings[p].items() if k != 'price_type'}
                 try:
-                    getattr(self, p)[g] = caph(seat_locs = locs, **settings[p])
-                    getattr(self, p + "_rel")[g] = copy.deepcopy(getattr(self, p)[g])
-                    getattr(self, p + "_rel")[g]['price'] = getattr(self, p + "_rel")[g]['price'] - self.season_ticket_groups[g]['price']
+                    avg = group_sgcs[settings[p]['price_type']][g].calc_average_price_history(price_type='listed',
+                                                                                             **kwargs)
                 except EmptySeatGroupError:
                     # print("Caught EmptySeatGroupError for group {0}, average {1}- setting to NaN".format(g, settings[p]))
                     getattr(self, p)[g] = np.nan
                     getattr(self, p + "_rel")[g] = np.nan
+                    if settings[p]['average_type'] == 'moving':
+                        self.moving_average_windows[p][g] = {td: np.nan for td in moving_average_timedeltas}
+                        self.moving_average_windows[p + "_rel"][g] = {td: np.nan for td in moving_average_timedeltas}
+                    continue
+
+                if settings[p]['average_type'] == 'moving':
+                    avg_rel = {}
+                    for td in avg:
+                        avg_rel[td] = avg[td].copy()
+                        avg_rel[td]['price'] = avg_rel[td]['price'] - st_price
+                    self.moving_average_windows[p][g] = avg
+                    self.moving_average_windows[p + "_rel"][g] = avg_rel
+                    getattr(self, p)[g] = avg[moving_average_timedeltas[0]]
+                    getattr(self, p + "_rel")[g] = avg_rel[moving_average_timedeltas[0]]
+                else:
+                    getattr(self, p)[g] = avg
+                    getattr(self, p + "_rel")[g] = avg.copy()
+                    getattr(self, p + "_rel")[g]['price'] = getattr(self, p + "_rel")[g]['price'] - st_price
 
+    @cached_analysis
     def average_price_history(self, price_type = 'sales', **kwargs):
         """
         Binding to use self.chronology.calc_average_price_history
@@ -421,6 +665,7 @@ class Event(object):
         See SeatGroupChronology.calc_average_price_history() for more details.
 
         :param seat_locs:
+        :param seat_patterns:
         :param average_type:
         :param moving_average_timedelta:
         :param price_type:
@@ -440,6 +685,79 @@ class Event(object):
             raise SeatGroupError("Unknown price_type '{0}'".format(price_type))
         return sgc.calc_average_price_history(price_type = 'listed', **kwargs)
 
+    @cached_analysis
+    def get_group_prices(self, group, ticket_type='chronology', f=None):
+        """
+        Return the prices of a season ticket group from one of the Event's chronologies.
+
+        :param group: Name of a season ticket group
+        :param ticket_type: Name of the chronology attribute to use (chronology, sales, sales_rel, sales_filtered, or
+                            sales_filtered_rel)
+        :param f: Function applied to the prices of each timepoint.  See SGC.get_prices()
+        :return: Numpy record array of timepoint and price (see SGC.get_prices()).  Raises an EmptySeatGroupError if
+                 the group has no seats
+        """
+        return self.group_chronologies(ticket_type)[group].get_prices(f=f)
+
+    @cached_analysis
+    def group_chronologies(self, ticket_type='chronology'):
+        """
+        Return one of the Event's chronologies split into a chronology for each season ticket group.
+
+        The chronology is split in a single pass (see SeatGroupChronology.partition()), and the result is cached, so
+        all groups can be analysed for the cost of walking the chronology once.
+
+        :param ticket_type: Name of the chronology attribute to use (chronology, sales, sales_rel, sales_filtered, or
+                            sales_filtered_rel)
+        :return: Dict of {group name: SeatGroupChronology}
+        """
+        if ticket_type not in ['chronology', 'sales', 'sales_rel', 'sales_filtered', 'sales_filtered_rel']:
+            raise ValueError("Invalid ticket_type '{0}'".format(ticket_type))
+        sgc = getattr(self, ticket_type)
+        return sgc.partition({g: self.season_ticket_groups[g]['patterns'] for g in self.season_ticket_groups})
+
+    @property
+    def days_to_event(self):
+        """
+        Return the time of each chronology timepoint relative to the event, in days (negative before the event).
+
+        Aligned with self.chronology.sorted_timepoints and timepoint_index.  Computed once, and again only after the
+        data (see data_version) or the event's datetime changes.
+
+        :return: Numpy float64 array (read-only)
+        """
+        if self.datetime is None:
+            raise EventError("Event {0} has no datetime".format(self.eventid))
+        key = (self._data_version, self.datetime)
+        if self._days_to_event_key != key or len(self._days_to_event) != len(self.chronology.sorted_timepoints):
+            self._days_to_event = days_between(self.chronology.timepoint_index, self.datetime)
+            self._days_to_event.flags.writeable = False
+            self._days_to_event_key = key
+        return self._days_to_event
+
+    def days_relative_to(self, timepoints, reference=None):
+        """
+        Return timepoints as days relative to a reference time, eg: for plotting.
+
+        Relative to the event's datetime, timepoints of the chronology are looked up in days_to_event, and any others
+        are computed directly.
+
+        :param timepoints: List or array of datetime objects, eg: the timepoint field of get_group_prices() or an
+                           average
+        :param reference: (Optional) datetime object to measure from.  Default is the event's datetime
+        :return: Numpy float64 array
+        """
+        ts = to_datetime64(timepoints)
+        if reference is not None and reference != self.datetime:
+            return days_between(ts, reference)
+        days_to_event = self.days_to_event
+        i = self.chronology.get_timepoint_indices(ts, single_type='exact')
+        found = i >= 0
+        days = days_to_event[np.where(found, i, 0)] if len(days_to_event) > 0 else np.empty(len(ts))
+        if not found.all():
+            days[~found] = days_between(ts[~found], self.datetime)
+        return days
+
     def plot_price_history(self, groups='all', price_type='rel', prefix="",
                            plot_date_relative_to_event=True, xlim=None, ylim=None,
                            plot_listed=True,
@@ -462,9 +780,9 @@ class Event(object):
         # if ylim is None:
         #     ylim = (-200, 200)
         if price_type == 'rel':
-            sgc = self.sales_filtered_rel
+            sgc_name = 'sales_filtered_rel'
         elif price_type == 'abs':
-            sgc = self.sales_filtered
+            sgc_name = 'sales_filtered'
         else:
             raise ValueError("Invalid price_type '{0}' - must be 'abs' or 'rel'".format(price_type))
 
@@ -529,11 +847,12 @@ class Event(object):
 
                 # Plot all listed tickets
                 if plot_listed:
-                    locs = self.season_ticket_groups[g]['locs']
-                    listed = self.chronology.get_seats(seat_locs = locs).get_prices(f = None)
+                    listed = self.get_group_prices(g, ticket_type='chronology', f=None)
                     if len(listed) > 0:
+                        # Cached data is shared, so make a new record array rather than modifying it inplace
                         if price_type == 'rel':
-                            listed['price'] = listed['price'] - self.season_ticket_groups[g]['price']
+                            listed = np.rec.array([listed['timepoint'], listed['price'] - self.season_ticket_groups[g]['price']],
+                                                  dtype=listed.dtype)
                         dates = listed['timepoint']
                         #
                         # remaining_rel = (sg[last_tp].get_seats_as_seatgroup(seat_locs=locs, fail_if_missing=False) - self.season_tickets).get_prices()
@@ -544,7 +863,7 @@ class Event(object):
                             # ax.plot_date(dates, remaining_rel, 'x', label=g + " Unsold", color=main_color)
                             ax.plot_date(dates, listed['price'], 'x', label=g + " Unsold ({0})".format(len(listed)), color='grey')
                         elif plot_date_relative_to_event:
-                            dates = [(d - plot_date_relative_to_event).total_seconds() / 86400.0 for d in dates]
+                            dates = self.days_relative_to(dates, plot_date_relative_to_event)
                             # ax.plot(dates, remaining_rel, 'x', label=g + " Unsold ({0})".format(len(remaining_rel)), color=main_color)
                             ax.plot(dates, listed['price'], 'x', label=g + " Unsold ({0})".format(len(listed)), color='grey')
                         else:
@@ -572,18 +891,18 @@ class Event(object):
                     if plot_date_relative_to_event is False:
                         ax.plot_date(avg['timepoint'], avg['price'], ls, label=label, color=c, marker=m)
                     else:
-                        dates = [(d - plot_date_relative_to_event).total_seconds() / 86400.0 for d in avg['timepoint']]
+                        dates = self.days_relative_to(avg['timepoint'], plot_date_relative_to_event)
                         ax.plot(dates, avg['price'], ls, label=label, color=c, marker=m)
 
                 # Plot unfiltered sales first, if requested (so they sit behind the filtered sales)
                 if plot_filtered_out_sales:
                     if price_type == 'rel':
-                        sgc_uf = self.sales_rel
+                        sgc_uf_name = 'sales_rel'
                     elif price_type == 'abs':
-                        sgc_uf = self.sales
+                        sgc_uf_name = 'sales'
                     plot_uf = False
                     try:
-                        sales_uf_all = sgc_uf.get_seats(self.season_ticket_groups[g]['locs']).get_prices(f=None)
+                        sales_uf_all = self.get_group_prices(g, ticket_type=sgc_uf_name, f=None)
                         plot_uf = True
                     except EmptySeatGroupError:
                         pass
@@ -595,8 +914,7 @@ class Event(object):
                         if plot_date_relative_to_event is False:
                             ax.plot_date(dates_all, sales_uf_all['price'], ".", label=g + " Sales Filtered Out", color='r')
                         elif plot_date_relative_to_event:
-                            # Is this better served as a SGC property, or at least method?  Will it get used elsewhere?
-                            dates_all = [(d - plot_date_relative_to_event).total_seconds() / 86400.0 for d in dates_all]
+                            dates_all = self.days_relative_to(dates_all, plot_date_relative_to_event)
                             ax.plot(dates_all, sales_uf_all['price'], ".", label=g + " Sales Filtered Out", color='r')
                         else:
                             raise ValueError("normalize_dates must be True, False, or a datetime object")
@@ -608,8 +926,8 @@ class Event(object):
                 # Move these down to where data actually gets plotted?  Dont think they're needed up here
                 plot_sales = False
                 try:
-                    sales = sgc.get_seats(self.season_ticket_groups[g]['locs']).get_prices(f = np.min)
-                    sales_all = sgc.get_seats(self.season_ticket_groups[g]['locs']).get_prices(f = None)
+                    sales = self.get_group_prices(g, ticket_type=sgc_name, f=np.min)
+                    sales_all = self.get_group_prices(g, ticket_type=sgc_name, f=None)
                     plot_sales = True
                 except EmptySeatGroupError:
                     pass
@@ -620,9 +938,8 @@ class Event(object):
                         ax.plot_date(dates, sales['price'], "-", marker='.', label=g, color=main_color)[0]
                         ax.plot_date(dates_all, sales_all['price'], ".", color=main_color)
                     elif plot_date_relative_to_event:
-                        # Is this better served as a SGC property, or at least method?  Will it get used elsewhere?
-                        dates = [(d - plot_date_relative_to_event).total_seconds() / 86400.0 for d in dates]
-                        dates_all = [(d - plot_date_relative_to_event).total_seconds() / 86400.0 for d in dates_all]
+                        dates = self.days_relative_to(dates, plot_date_relative_to_event)
+                        dates_all = self.days_relative_to(dates_all, plot_date_relative_to_event)
                         ax.plot(dates, sales['price'], "-", label=g + "({0})".format(len(sales_all)), marker='.', color=main_color)[0]
                         ax.plot(dates_all, sales_all['price'], ".", color=main_color)
                         ax.set_xlim((None, 1))
@@ -683,7 +1000,9 @@ class Event(object):
         dt_slice = slice(start, dt_slice.stop, step)
         # self.chronology = self.chronology.arange(start, stop, step, rename_timepoints=rename_timepoints)
         self.chronology = self.chronology[dt_slice]
+        self.invalidate_cache()
 
+    @cached_analysis
     def summarize(self, price_type='rel', ticket_type='sales_filtered'):
         """
         Summarize high level data about an event and return as a dictionary.
@@ -724,7 +1043,9 @@ class Event(object):
             raise ValueError("Invalid price_type '{0}'".format(price_type))
         sgc = getattr(self, name)
 
-        ret = sgc.describe()
+        # Extract all prices once, then describe the overall data and every season ticket group from the same table
+        timepoints, locs, prices = sgc.get_price_table()
+        ret = np_describe(prices)
 
         # Embed settings
         ret['price_type'] = price_type
@@ -732,13 +1053,65 @@ class Event(object):
 
         ret['by_group'] = {}
 
-        for g in self.season_ticket_groups:
-            locs = self.season_ticket_groups[g]['locs']
-            group_sgc = sgc.get_seats(seat_locs = locs)
-            ret['by_group'][g] = group_sgc.describe()
+        rows, group_names = self.get_season_ticket_group_rows(locs)
+        g = Groups(group_names)
+        stats = g.describe(prices[rows])
+        group_stats = g.as_dict(range(len(g)))
+        for group in self.season_ticket_groups:
+            if group in group_stats:
+                i = group_stats[group]
+                ret['by_group'][group] = {k: stats[k][i] for k in stats}
+                ret['by_group'][group]['count'] = int(ret['by_group'][group]['count'])
+            else:
+                ret['by_group'][group] = np_describe(np.array(()))
 
         return ret
 
+    def get_season_ticket_group_rows(self, locs):
+        """
+        Match seat locations to the season ticket groups that include them.
+
+        See Seats.match_locs_to_groups() for more details.
+
+        :param locs: List of full seat location tuples, eg: from SeatGroup.get_locs()
+        :return: Tuple of (numpy array of indices into locs, numpy object array of group names), with one entry for each
+                 (seat, group) match
+        """
+        return match_locs_to_groups(locs, self.get_season_ticket_group_locs())
+
+    def get_season_ticket_group_locs(self):
+        """
+        Return a dict of {season_ticket_group: list of location tuples}
+
+        :return: Dict
+        """
+        return {g: self.season_ticket_groups[g]['locs'] for g in self.season_ticket_groups}
+
+    @cached_analysis
+    def resample(self, freq, by_group=True, ticket_type='sales_filtered'):
+        """
+        Binding to use self.chronology.resample, grouping by season ticket group and counting sales from ticket_type.
+
+        See SeatGroupChronology.resample() for more details.
+
+        :param freq: timedelta object for the size of each bucket
+        :param by_group: If True, split the data by season ticket group.  Otherwise, aggregate all seats together
+        :param ticket_type: sales or sales_filtered, the sales to count in each bucket (requires
+                            infer_chronological_changes to have been run).  If None, sales are not counted
+        :return: numpy record array (see SeatGroupChronology.resample())
+        """
+        if ticket_type is None:
+            sales = None
+        elif ticket_type in ['sales', 'sales_filtered']:
+            sales = getattr(self, ticket_type, None)
+        else:
+            raise ValueError("Invalid ticket_type '{0}'".format(ticket_type))
+        if by_group:
+            groups = self.get_season_ticket_group_locs()
+        else:
+            groups = None
+        return self.chronology.resample(freq, groups=groups, sales=sales)
+
     @classmethod
     def get_season_ticket_groups(cls):
         """
@@ -857,6 +1230,7 @@ class Panthers(Event):
 
         # Build season tickets
         self.init_season_ticket_groups()
+        self.init_season_ticket_group_locs()
         self.init_season_ticket_seatgroup(price_override=price_override)
 
         # Custom inclusion list (only sections in this list are loaded)
@@ -883,42 +1257,42 @@ class Panthers(Event):
         # Club 1
         sections = [315, 316, 343, 344]
         self.season_ticket_groups['Club 1'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 4500.0 / 8.0,
 		}
 
         # Club 2
         sections = [313, 314, 317, 318, 341, 342, 345, 346]
         self.season_ticket_groups['Club 2'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 3250.0 / 8.0,
 		}
 
         # Club 3
         sections = [308, 309, 310, 311, 312, 319, 320, 321, 322, 323, 336, 337, 338, 339, 340, 347, 348, 349, 350]
         self.season_ticket_groups['Club 3'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 2750.0 / 8.0,
 		}
 
         # A1
         sections = [111, 112, 131, 132]
         self.season_ticket_groups['A1'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 1950.0 / 8.0,
 		}
 
         # A2
         sections = [110, 113, 130, 133]
         self.season_ticket_groups['A2'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 1600.0 / 8.0,
 		}
 
         # B
         sections = [106, 107, 108, 109, 114, 115, 116, 117, 126, 127, 128, 129, 134, 135, 136, 137]
         self.season_ticket_groups['B'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 1300.0 / 8.0,
 		}
 
@@ -926,7 +1300,7 @@ class Panthers(Event):
         sections = [101, 102, 103, 104, 119, 120, 121, 122, 123, 124, 139, 140, 201, 202, 203, 204, 205, 206, 224, 225, 226, 227,
                     228, 229, 230, 231, 232, 233, 234, 252, 253, 254, 255, 256]
         self.season_ticket_groups['C'] = {
-			'locs': list(product(sections)),
+			'patterns': [(sections,)],
 			'price': 1100.0 / 8.0,
 		}
 
@@ -934,7 +1308,7 @@ class Panthers(Event):
         sections = [513, 514, 515, 516, 540, 541, 542, 543]
         rows = rows_box
         self.season_ticket_groups['D Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 840.0 / 8.0,
 		}
 
@@ -942,7 +1316,7 @@ class Panthers(Event):
         # sections = [513, 514, 515, 516, 540, 541, 542, 543]
         rows = rows_reserved
         self.season_ticket_groups['D Reserved'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 710.0 / 8.0,
 		}
 
@@ -950,7 +1324,7 @@ class Panthers(Event):
         sections = list(range(508, 513)) + list(range(517, 522)) + list(range(535, 540)) + list(range(544, 549))
         rows = rows_box
         self.season_ticket_groups['E Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 740.0 / 8.0,
 		}
 
@@ -958,7 +1332,7 @@ class Panthers(Event):
         # sections =
         rows = rows_reserved
         self.season_ticket_groups['E Reserved'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 610.0 / 8.0,
 		}
 
@@ -966,7 +1340,7 @@ class Panthers(Event):
         sections = [501, 502, 503] + list(range(526, 531)) + [553, 554]
         rows = rows_box
         self.season_ticket_groups['F Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 680.0 / 8.0,
 		}
 
@@ -974,7 +1348,7 @@ class Panthers(Event):
         # sections =
         rows = rows_reserved
         self.season_ticket_groups['F Reserved'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 550.0 / 8.0,
 		}
 
@@ -982,7 +1356,7 @@ class Panthers(Event):
         sections = [505, 506, 523, 524, 532, 533, 550, 551]
         rows = rows_box
         self.season_ticket_groups['G Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 610.0 / 8.0,
 		}
 
@@ -990,7 +1364,7 @@ class Panthers(Event):
         # sections =
         rows = rows_reserved
         self.season_ticket_groups['G Reserved'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 480.0 / 8.0,
 		}
 
@@ -998,7 +1372,7 @@ class Panthers(Event):
         sections = [507, 522, 534, 549]
         rows = rows_box
         self.season_ticket_groups['X Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 740.0 / 8.0,
 		}
 
@@ -1006,7 +1380,7 @@ class Panthers(Event):
         # sections =
         rows = rows_reserved
         self.season_ticket_groups['X Reserved'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 610.0 / 8.0,
 		}
 
@@ -1014,7 +1388,7 @@ class Panthers(Event):
         sections = [504, 525, 531, 552]
         rows = rows_box
         self.season_ticket_groups['Y Box'] = {
-			'locs': list(product(sections, rows)),
+			'patterns': [(sections, rows)],
 			'price': 680.0 / 8.0,
 		}
 
@@ -1022,14 +1396,14 @@ class Panthers(Event):
         # sections =
         rows = rows_reserved
         self.season_ticket_groups['Y Reserved'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 550.0 / 8.0,
         }
 
         # # Unknown - these are not part of any set section
         # sections = [105, 118, 125, 138]
         # self.season_ticket_groups['Unknown'] = {
-        #     'locs': list(product(sections)),
+        #     'patterns': [(sections,)],
         #     'price': 5000.0, # Set these to a high ticket price so they never come up as super good deals
         # }
 
@@ -1056,6 +1430,7 @@ class Hornets(Event):
 
         # Build season tickets
         self.init_season_ticket_groups()
+        self.init_season_ticket_group_locs()
         self.init_season_ticket_seatgroup(price_override=price_override)
 
         # Custom inclusion list (only sections in this list are loaded)
@@ -1093,158 +1468,157 @@ class Hornets(Event):
         # sections = [104, 105, 106, 113, 114, 115]
         # rows = ['CS1', 'CS2']
         # self.season_ticket_groups['Courtside'] = {
-        #     'locs': list(product(sections, rows)),
+        #     'patterns': [(sections, rows)],
         #     'price': 0.0,
         # }
 
         sections = [105, 114]
         rows = rows_lower_front
         self.season_ticket_groups['ICC Center'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 315.0,
         }
 
-        seats = list(product(secs_club_outside, rows_lower_front)) + list(product([103, 116], ["A1"]))
+        patterns = [(secs_club_outside, rows_lower_front), ([103, 116], ["A1"])]
         self.season_ticket_groups['ICC Outside'] = {
-            'locs': seats,
+            'patterns': patterns,
             'price': 285.00,
         }
 
         sections = [105, 114]
         rows = rows_lower_mid_mid
         self.season_ticket_groups['Low Club Center'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 160.0,
         }
 
         sections = secs_club_outside
         rows = rows_lower_low
         self.season_ticket_groups['Low Club Outside'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 140.0,
         }
 
         sections = [105, 114]
         rows = rows_lower_mid_high
         self.season_ticket_groups['Mid Clubs Center'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 134.0,
         }
 
         sections = secs_club_outside
         rows = rows_lower_mid
         self.season_ticket_groups['Mid Club Outside'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 134.0,
         }
 
-        seats = list(product([105, 114], ["R"])) + list(product(secs_club_outside, [c for c in "NOPQRS"]))
+        patterns = [([105, 114], ["R"]), (secs_club_outside, [c for c in "NOPQRS"])]
         self.season_ticket_groups['High Club'] = {
-            'locs': seats,
+            'patterns': patterns,
             'price': 105.00,
         }
 
-        seats = list(product([101, 107, 109, 110, 117], ["A1", "A2", "A3"])) + list(product([103, 112, 116], ["A2", "A3"]))
+        patterns = [([101, 107, 109, 110, 117], ["A1", "A2", "A3"]), ([103, 112, 116], ["A2", "A3"])]
         self.season_ticket_groups['Lower Baseline Front'] = {
-            'locs': seats,
+            'patterns': patterns,
             'price': 108.00,
         }
 
-        seats = list(product([102, 103, 107, 112, 116], rows_lower_mid_mid)) + list(
-            product([101, 109, 110, 117], list("ABCDE")))
+        patterns = [([102, 103, 107, 112, 116], rows_lower_mid_mid), ([101, 109, 110, 117], list("ABCDE"))]
         self.season_ticket_groups['Lower Curve Baseline Low'] = {
-            'locs': seats,
+            'patterns': patterns,
             'price': 85.00,
         }
 
         sections = ["L01", "L02", "L03"]
         self.season_ticket_groups['Ledge Baseline'] = {
-            'locs': list(product(sections)),
+            'patterns': [(sections,)],
             'price': 72.0,
         }
 
         sections = [102, 103, 107, 112, 116]
         rows = list("KLMNOPQR")
-        seats = list(product(sections, rows)) + list(product([108, 111]))
+        patterns = [(sections, rows), ([108, 111],)]
         self.season_ticket_groups['Lower Curve Mid'] = {
-            'locs': seats,
+            'patterns': patterns,
             'price': 65.0,
         }
 
         sections = [101, 109, 110, 117]
         rows = list("FGHIJKLMNOPQR")
         self.season_ticket_groups['Lower Baseline Mid'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 58.0,
         }
 
         sections = [101, 102, 103, 116, 117]
         rows = list("STUVWXYZ") + ["AA", "BB", "CC", "DD", "EE"]
         self.season_ticket_groups['Lower Curve Baseline High'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 48.0,
         }
 
         sections = secs_upper_sideline
         rows = list("AB")
         self.season_ticket_groups['Upper Sideline Front'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 42.0,
         }
 
         sections = secs_upper_sideline
         rows = list("CDEFGHI")
         self.season_ticket_groups['Upper Sideline Low'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 29.0,
         }
 
         sections = secs_upper_curve
         rows = rows_upper_front
         self.season_ticket_groups['Upper Curve Low'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 27.0,
         }
 
         sections = secs_upper_baseline
         rows = rows_upper_front
         self.season_ticket_groups['Upper Baseline Low'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 22.0,
         }
 
         sections = secs_upper_sideline
         rows = rows_upper_mid
         self.season_ticket_groups['Upper Sideline Mid'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 18.0,
         }
 
         sections = secs_upper_curve
         rows = rows_upper_mid
         self.season_ticket_groups['Upper Curve Mid'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 13.0,
         }
 
         sections = secs_upper_baseline
         rows = rows_upper_mid
         self.season_ticket_groups['Upper Baseline High'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 13.0,
         }
 
         sections = secs_upper_sideline
         rows = rows_upper_up
         self.season_ticket_groups['Upper Sideline High'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 14.0,
         }
 
         sections = secs_upper_curve
         rows = rows_upper_up
         self.season_ticket_groups['Upper Curve High'] = {
-            'locs': list(product(sections, rows)),
+            'patterns': [(sections, rows)],
             'price': 12.0,
         }
 
@@ -1253,7 +1627,7 @@ class EventError(Exception):
     pass
 
 def summarize_events(event_object, directory='./', save_to=None, eventids=None, tp_slice=None, ticket_type='sales_filtered',
-                     plot_settings=None):
+                     plot_settings=None, event_kwargs=None):
     """
     Scrape a directory for events, summarize them, and return summary as a Pandas DataFrame.
 
@@ -1262,8 +1636,8 @@ def summarize_events(event_object, directory='./', save_to=None, eventids=None,
     :save_to: Filename to save the output DataFrame to as csv
     :param eventids: List of eventids to include in summary, or None to grab all events in the directory.
     :param tp_slice: tp_slice as defined in Event.scrape_timepoints_from_dir()
-    :param event_kwargs: (UNUSED) Optional arguments to pass to the event constructor (in addition to eventid, which is always
-                         passed)
+    :param event_kwargs: Optional arguments to pass to the event constructor (in addition to eventid, which is always
+                         passed), eg: {'spill_dir': '/tmp/spill', 'max_resident_nbytes': 200000000} to bound memory
     :param ticket_type: Type of tickets (sales, sales_filtered, listed) passed to event.summarize()
     :plot_settings: (Optional) List of dicts of settings for plot_price_history (allows to make ticket vs date plots
                     during the summary).  For each dict, a different call to plot_price_history will be made.  Note that
@@ -1303,7 +1677,7 @@ def summarize_events(event_object, directory='./', save_to=None, eventids=None,
     for i, eventid in enumerate(ids):
         row = []
         print("Processing event {0}: {1}".format(i + 1, eventid))
-        event = event_object(eventid=eventid)
+        event = event_object(eventid=eventid, **(event_kwargs or {}))
         # Extract metadata
         row.append(event.opponent)
         row.append(days_of_week[event.datetime.isoweekday()])
@@ -1337,6 +1711,164 @@ def summarize_events(event_object, directory='./', save_to=None, eventids=None,
         df.to_csv(save_to)
     return df
 
+
+def asof_join(events, offsets, single_type='left', tolerance=None, ticket_type='chronology', group=None):
+    """
+    Match a grid of times relative to each event's start to the timepoints of many events at once (an as-of join).
+
+    For example, the snapshot of every game at 3 and 1 days before the event:
+        i = asof_join(events, [datetime.timedelta(days=-3), datetime.timedelta(days=-1)])
+    where i[e, k] is the index into events[e].chronology.sorted_timepoints of the last timepoint at or before
+    events[e].datetime + offsets[k].  All events are matched with a single search: each event's timepoints are
+    converted to offsets from its datetime and laid out one event after another on a single sorted axis.
+
+    :param events: List of Event objects (each must have a datetime)
+    :param offsets: List of timedelta objects (or a numpy timedelta64 array) relative to each Event.datetime, eg:
+                    negative for before the event
+    :param single_type: Mode to match timepoints within each event (see SeatGroupChronology.get_timepoint_indices()):
+                        'left' (default): last timepoint at or before the time
+                        'right': first timepoint at or after the time
+                        'nearest': nearest timepoint (ties go to the earlier timepoint)
+                        'exact': timepoint exactly at the time
+    :param tolerance: (Optional) Timedelta.  Matches further than this from the requested time are treated as missing
+    :param ticket_type: Name of the Event chronology attribute to match (chronology, sales, sales_filtered, ...)
+    :param group: (Optional) Season ticket group name.  If given, each event's chronology is first split by group (see
+                  Event.group_chronologies()), which has the same timepoints
+    :return: Numpy int array of shape (len(events), len(offsets)) of timepoint indices into each event's chronology,
+             -1 where no timepoint matches
+    """
+    if single_type not in ['exact', 'nearest', 'left', 'right']:
+        raise ValueError("Invalid single_type '{0}'".format(single_type))
+    offsets = np.asarray(offsets, dtype='timedelta64[us]').astype(np.int64)
+    rel = []
+    for event in events:
+        if event.datetime is None:
+            raise EventError("Event {0} has no datetime".format(event.eventid))
+        sgc = asof_chronology(event, ticket_type, group)
+        rel.append((sgc.timepoint_index - np.datetime64(event.datetime, 'us')).astype(np.int64))
+    n_events = len(events)
+    lengths = np.array([len(r) for r in rel], dtype=np.intp)
+    starts = np.zeros(n_events + 1, dtype=np.intp)
+    starts[1:] = np.cumsum(lengths)
+    if starts[-1] == 0 or len(offsets) == 0:
+        return np.full((n_events, len(offsets)), -1, dtype=np.intp)
+    rel = np.concatenate(rel)
+
+    # Lay the events out one after another on one axis, each in a span wide enough for all offsets from its datetime
+    lo = min(rel.min(), offsets.min())
+    span = max(rel.max(), offsets.max()) - lo + 1
+    if span > np.iinfo(np.int64).max // (n_events + 1):
+        raise ValueError("Timepoints and offsets span too wide a range to join {0} events".format(n_events))
+    keys = rel - lo + np.repeat(np.arange(n_events, dtype=np.int64), lengths) * span
+    targets = (offsets - lo)[np.newaxis, :] + np.arange(n_events, dtype=np.int64)[:, np.newaxis] * span
+    first = starts[:-1, np.newaxis]
+    last = starts[1:, np.newaxis] - 1
+
+    if single_type == 'left':
+        i = np.searchsorted(keys, targets, side='right') - 1
+    else:
+        i = np.searchsorted(keys, targets, side='left')
+        if single_type == 'nearest':
+            # Candidates on either side, kept within the event.  Same as nearest_indices(): ties go to the earlier one
+            left = np.maximum(i - 1, first)
+            right = np.minimum(i, last)
+            i = np.where(targets - keys[np.clip(left, 0, len(keys) - 1)] <= keys[np.clip(right, 0, len(keys) - 1)] -
+                         targets, left, right)
+    found = (i >= first) & (i <= last)
+    matched = keys[np.clip(i, 0, len(keys) - 1)]
+    if single_type == 'exact':
+        found &= matched == targets
+    if tolerance is not None:
+        found &= np.abs(matched - targets) <= np.timedelta64(tolerance, 'us').astype(np.int64)
+    return np.where(found, i - first, -1)
+
+
+def asof_snapshots(events, offsets, ticket_type='chronology', group=None, **kwargs):
+    """
+    Return the SeatGroups matched by asof_join() (references, not copies).
+
+    :param events: See asof_join()
+    :param offsets: See asof_join()
+    :param ticket_type: See asof_join()
+    :param group: See asof_join()
+    :param kwargs: Other arguments for asof_join() (single_type, tolerance)
+    :return: List (one per event) of lists (one per offset) of SeatGroups, with None where no timepoint matches
+    """
+    indices = asof_join(events, offsets, ticket_type=ticket_type, group=group, **kwargs)
+    snapshots = []
+    for event, event_indices in zip(events, indices.tolist()):
+        sgc = asof_chronology(event, ticket_type, group)
+        snapshots.append([None if i < 0 else sgc.seatgroups[sgc.sorted_timepoints[i]] for i in event_indices])
+    return snapshots
+
+
+def asof_aggregate(events, offsets, f='mean', ticket_type='chronology', group=None, **kwargs):
+    """
+    Return an aggregate of the prices of each SeatGroup matched by asof_join(), eg: the mean listed price of every
+    event 3 days before it starts.
+
+    The prices of each distinct matched SeatGroup are read once (several offsets often match the same timepoint) and
+    all SeatGroups are aggregated together with a Groups reduction.
+
+    :param events: See asof_join()
+    :param offsets: See asof_join()
+    :param f: Name of the Groups reduction applied to the prices of each matched SeatGroup ('mean' (default), 'min',
+              'max', 'sum', 'count', or 'std'), or a function applied to the numpy array of prices of each (called once
+              per matched SeatGroup)
+    :param ticket_type: See asof_join()
+    :param group: See asof_join()
+    :param kwargs: Other arguments for asof_join() (single_type, tolerance)
+    :return: Numpy float array of shape (len(events), len(offsets)), NaN where no timepoint matches or the matched
+             SeatGroup is empty
+    """
+    if not callable(f) and f not in ['mean', 'min', 'max', 'sum', 'count', 'std']:
+        raise ValueError("Invalid f '{0}'".format(f))
+    indices = asof_join(events, offsets, ticket_type=ticket_type, group=group, **kwargs)
+    # Id of the distinct SeatGroup matched at each (event, offset), -1 where none matches, and the prices of each
+    # SeatGroup labelled by its id
+    snapshot_ids = np.full(indices.shape, -1, dtype=np.intp)
+    prices = []
+    labels = []
+    for e, event in enumerate(events):
+        sgc = asof_chronology(event, ticket_type, group)
+        matched, inverse = np.unique(indices[e], return_inverse=True)
+        for j, i in enumerate(matched.tolist()):
+            if i < 0:
+                continue
+            these_prices = np.asarray(sgc.seatgroups[sgc.sorted_timepoints[i]].get_prices(), dtype=float)
+            snapshot_ids[e, inverse.reshape(-1) == j] = len(prices)
+            labels.append(np.full(len(these_prices), len(prices), dtype=np.intp))
+            prices.append(these_prices)
+
+    values = np.full(indices.shape, np.nan)
+    if len(prices) == 0:
+        return values
+    g = Groups(np.concatenate(labels))
+    all_prices = np.concatenate(prices)
+    if callable(f):
+        sorted_prices = all_prices[g.order]
+        stats = np.array([f(sorted_prices[start:end]) for start, end in zip(g.starts, g.ends)], dtype=float)
+    elif f == 'count':
+        stats = g.count().astype(float)
+    else:
+        stats = getattr(g, f)(all_prices)
+    # Empty SeatGroups have no prices, so are not in g and stay NaN
+    by_snapshot = np.full(len(prices), np.nan)
+    by_snapshot[g.keys] = stats
+    found = snapshot_ids >= 0
+    values[found] = by_snapshot[snapshot_ids[found]]
+    return values
+
+
+def asof_chronology(event, ticket_type='chronology', group=None):
+    """
+    Return the chronology of an Event used by asof_join().
+    """
+    if group is None:
+        return getattr(event, ticket_type)
+    return event.group_chronologies(ticket_type)[group]
+
+
 def profit_by_col(df, col, sort_by='index'):
     """
     Return a DataFrame that has the contents of df grouped by the column col
@@ -1473,6 +2005,32 @@ def plot_profit_by_day(df, sub_col="25%", kind='box', ax=None, **kwargs):
 
 
 # Helper
+def days_between(ts, reference):
+    """
+    Return the days from a reference datetime to each of a numpy datetime64 array of times, as a float64 array.
+
+    Same values as (t - reference).total_seconds() / 86400.0 for each t.
+    """
+    return ((ts - np.datetime64(reference, 'us')) / np.timedelta64(1, 's')) / 86400.0
+
+def freeze(x):
+    """
+    Return a hashable version of x, converting (recursively) lists and tuples to tuples, sets to frozensets, and dicts
+    to sorted tuples of (key, value).
+
+    :param x: Any object
+    :return: A hashable equivalent of x (raises a TypeError if some part of x cannot be made hashable)
+    """
+    if isinstance(x, (list, tuple)):
+        return tuple(freeze(y) for y in x)
+    elif isinstance(x, (set, frozenset)):
+        return frozenset(freeze(y) for y in x)
+    elif isinstance(x, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in x.items()))
+    else:
+        hash(x)
+        return x
+
 def mygen(start=0, stop=100, inc=1):
     """A simple custom generator"""
     i = start
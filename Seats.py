@@ -1,32 +1,50 @@
 import bisect
 import copy
 import datetime
+import functools
 import json
+import os
 import re
+import shutil
+import tempfile
+import weakref
+from collections import namedtuple, OrderedDict
+from collections.abc import MutableMapping
+from itertools import product
 from pprint import pprint
 
 import numpy as np
 
-from nearest import nearest_index, nearest_value
-from groupby import groupby
+from nearest import nearest_indices
+from groupby import Groups
+
+# Data shared by all seats of a listing.  Seats reference one of these instead of storing their own copies, so seats
+# from the same listing (or the same listing seen at many timepoints) share a single object.  Immutable, so changing a
+# Seat's price replaces its reference rather than modifying a listing shared with other seats.
+SeatListing = namedtuple('SeatListing', ['price', 'facevalue', 'list_id'])
+
 
 class Seat(object):
     """
     Object to hold data associated with a single seat
     """
+    __slots__ = ('_listing', 'available', 'season_ticket_group')
 
-    def __init__(self, price=None, available=None, facevalue=None, list_id=None, season_ticket_group=None):
-        self._price = None
-        self.price = price
-        self._facevalue = None
-        self.facevalue = facevalue
+    # These are what are used in evaluating equality.  Put them up here so I don't forget to add_seat to the list
+    # if we add_seat new attributes
+    _equality_attributes = ('price', 'facevalue', 'available', 'list_id')
+
+    def __init__(self, price=None, available=None, facevalue=None, list_id=None, season_ticket_group=None,
+                 listing=None):
+        """
+        :param listing: (Optional) A SeatListing to share with other seats.  If given, price, facevalue, and list_id
+                        are ignored
+        """
+        if listing is None:
+            listing = make_seat_listing(price, facevalue, list_id)
+        self._listing = listing
         self.available = available
-        self._list_id = None
-        self.list_id = list_id
         self.season_ticket_group = season_ticket_group
-        # These are what are used in evaluating equality.  Put them up here so I don't forget to add_seat to the list
-        # if we add_seat new attributes
-        self._equality_attributes = ['price', 'facevalue', 'available', 'list_id']
 
     def __eq__(self, other):
         """
@@ -35,6 +53,8 @@ class Seat(object):
         :param other: Another Seat
         :return: Boolean
         """
+        if isinstance(other, Seat):
+            return self._listing == other._listing and self.available == other.available
         for attr in self._equality_attributes:
             try:
                 if getattr(self, attr) == getattr(other, attr):
@@ -48,16 +68,44 @@ class Seat(object):
     def __repr__(self):
         return "{0}(price={1}, group={2})".format(type(self).__name__, self.price, self.season_ticket_group)
 
+    def copy(self):
+        """
+        Return a copy of the Seat.  The copy shares this Seat's SeatListing, which is safe because listings are
+        immutable (changing the copy's price replaces its listing).
+
+        :return: Seat
+        """
+        return Seat(available=self.available, season_ticket_group=self.season_ticket_group, listing=self._listing)
+
+    @property
+    def listing(self):
+        return self._listing
+
     @property
     def price(self):
-        return self._price
+        return self._listing.price
 
     @price.setter
     def price(self, price):
-        if price is None:
-            self._price = None
-        else:
-            self._price = float(price)
+        if price is not None:
+            price = float(price)
+        self._listing = self._listing._replace(price=price)
+
+    @property
+    def facevalue(self):
+        return self._listing.facevalue
+
+    @facevalue.setter
+    def facevalue(self, facevalue):
+        self._listing = self._listing._replace(facevalue=facevalue)
+
+    @property
+    def list_id(self):
+        return self._listing.list_id
+
+    @list_id.setter
+    def list_id(self, list_id):
+        self._listing = self._listing._replace(list_id=list_id)
 
 
 class SeatGroup(object):
@@ -67,22 +115,107 @@ class SeatGroup(object):
 
     def __init__(self):
         self.seats = {}
-        self.sorted_names = []
+        # Sorted list of the keys of self.seats, rebuilt lazily on the first ordered read after any adds or removes (see
+        # sorted_names)
+        self._sorted_names = []
+        self._names_sorted = True
+        # Names of nested SeatGroups that may be shared with a copy of this group (see copy())
+        self._shared = set()
+        # Totals of all seats in the group, including nested seats, kept up to date by add_seat/remove (see totals)
+        self._len = 0
+        self._price_sum = 0.0
+        self._n_unpriced = 0
         self.meta = {}
 
+    @property
+    def sorted_names(self):
+        """
+        Return the names of the Seats and SeatGroups in this group, in sorted order.
+
+        Adding or removing seats only marks the names as unsorted, and the list is sorted again when next read.  This
+        keeps bulk adds/removes O(1) per seat instead of O(n) for maintaining a sorted list on every change.  The
+        returned list must not be modified.
+
+        :return: Sorted list of names
+        """
+        if not self._names_sorted:
+            self._sorted_names = sorted(self.seats)
+            self._names_sorted = True
+        return self._sorted_names
+
+    def copy(self, copy_seats=False):
+        """
+        Return a copy of the SeatGroup that shares nested SeatGroups and Seats with this one until either is modified.
+
+        Copying is copy-on-write: only this level of the group is copied, and a shared nested SeatGroup is copied (one
+        level at a time) the first time add_seat(), remove(), merge() or update_names() modifies it through either
+        group.  Seats are always shared, so a Seat modified in place (eg: seat.price = 5) changes both groups - use
+        copy_seats=True to also copy every Seat.
+
+        :param copy_seats: If True, return a full copy with copies of all Seats (Seats still share their SeatListing)
+        :return: A new object of the same type as this one
+        """
+        newsg = copy.copy(self)
+        newsg.meta = copy.copy(self.meta)
+        if copy_seats:
+            newsg.seats = {name: seat.copy(copy_seats=True) if isinstance(seat, SeatGroup) else seat.copy()
+                           for name, seat in self.seats.items()}
+            newsg._shared = set()
+        else:
+            newsg.seats = dict(self.seats)
+            shared = {name for name, seat in self.seats.items() if isinstance(seat, SeatGroup)}
+            self._shared = self._shared | shared
+            newsg._shared = set(shared)
+        return newsg
+
+    def _unshare(self, name):
+        # Replace the nested SeatGroup at name with a copy if it may be shared with another group, so it can be modified
+        if name in self._shared:
+            self.seats[name] = self.seats[name].copy()
+            self._shared.discard(name)
+
+    @property
+    def totals(self):
+        """
+        Return the (number of seats, sum of seat prices, number of seats without a price) of the group, including
+        nested seats.
+
+        Totals are updated on every add_seat, remove, merge, and update_names, so this (and len() and price) is O(1).
+        A Seat modified in place (eg: seat.price = 5) is not seen by the totals until update_totals() is called.
+
+        :return: Tuple of (int, float, int)
+        """
+        return self._len, self._price_sum, self._n_unpriced
+
+    def update_totals(self):
+        """
+        Recalculate the totals of this group and all nested groups from their seats.
+
+        Only needed after Seats in the group are modified in place.
+
+        :return: None
+        """
+        self._len = 0
+        self._price_sum = 0.0
+        self._n_unpriced = 0
+        for seat in self.seats.values():
+            if isinstance(seat, SeatGroup):
+                seat.update_totals()
+            self._change_totals(NO_TOTALS, seat_totals(seat))
+
+    def _change_totals(self, before, after):
+        # Apply the change of a seat's or nested group's totals (see seat_totals()) to this group's totals
+        self._len += after[0] - before[0]
+        self._price_sum += after[1] - before[1]
+        self._n_unpriced += after[2] - before[2]
+
     def __len__(self):
         """
         Return the number of seats in the SeatGroup, including seats in nested groups.
 
         :return:
         """
-        length = 0
-        for seatname in self.seats:
-            try:
-                length += len(self.seats[seatname])
-            except TypeError:
-                length += 1
-        return length
+        return self._len
 
     def __eq__(self, other):
         """
@@ -148,8 +281,7 @@ class SeatGroup(object):
             raise NotImplementedError(
                 "Need to implement and think about concequences for inplace==True + preserve_unreferenced_seats==False")
 
-        # If SeatGroup had any other data, this would be better served by a real .copy() method (maybe one that accepts
-        # seat_locs to copy subsets).  But this works almost as well
+        # Copy only the seats used, so the prices can be modified below without changing self
         newsg = self.get_seats_as_seatgroup(seat_locs=all_seat_locs, copy_seats=True)
 
         # Make a list of other's seats needed here.
@@ -170,6 +302,7 @@ class SeatGroup(object):
                 seats[i].price = seats[i].price + other_seats[i].price
             elif operation == 'sub':
                 seats[i].price = seats[i].price - other_seats[i].price
+        newsg.update_totals()
 
         return newsg
 
@@ -223,19 +356,26 @@ class SeatGroup(object):
                     if this_name in self.seats:
                         raise DuplicateSeatError("Seat \"{0}\" already in use".format(this_name))
                     else:
-                        # Store the Seat and maintain a sorted list of names
-                        bisect.insort(self.sorted_names, this_name)
+                        # Store the Seat and mark the names for resorting
                         self.seats[this_name] = seat
+                        self._names_sorted = False
+                        self._change_totals(NO_TOTALS, seat_totals(seat))
                 elif isinstance(seat, SeatGroup):
                     if this_name in self.seats:
                         if merge:
+                            self._unshare(this_name)
+                            before = seat_totals(self.seats[this_name])
                             self.seats[this_name].merge(seat, handle_duplicates='cheapest', inplace=True)
+                            self._change_totals(before, seat_totals(self.seats[this_name]))
                         else:
                             raise DuplicateSeatError("Seat \"{0}\" already in use".format(this_name))
                     else:
-                        # Store the Seat and maintain a sorted list of names
-                        bisect.insort(self.sorted_names, this_name)
+                        # Store the Seat and mark the names for resorting.  The SeatGroup is still referenced by the
+                        # caller, so treat it as shared to keep changes made through this group from reaching it
                         self.seats[this_name] = seat
+                        self._shared.add(this_name)
+                        self._names_sorted = False
+                        self._change_totals(NO_TOTALS, seat_totals(seat))
                 else:
                     raise SeatGroupError(
                         "Seat '{0}' must be a Seat or SeatGroup object - found {1}".format(this_name, type(seat)))
@@ -247,12 +387,109 @@ class SeatGroup(object):
                     if make_deep_groups:
                         sg = SeatGroup()
                         self.add_seat(seat=sg, name=(this_name,))
+                        # Created here, so not shared with anything
+                        self._shared.discard(this_name)
                     else:
                         raise SeatGroupError(
                             "Cannot add_seat seat '{0}', SeatGroup '{1}' not defined".format(name, name[0]))
+                self._unshare(this_name)
+                before = seat_totals(self.seats[this_name])
                 self.seats[this_name].add_seat(seat, name[1:], make_deep_groups=make_deep_groups)
+                self._change_totals(before, seat_totals(self.seats[this_name]))
                 return
 
+    def add_seats(self, locs, seats, on_duplicate='raise'):
+        """
+        Add many Seats (or SeatGroups) to the object at once.
+
+        Equivalent to calling add_seat(seat, loc) for each pair, but each nested group is found (or created) once and
+        remembered by its location, so seats are inserted without walking down from the top for every seat.  Totals
+        are updated once per group at the end.
+
+        :param locs: List of location tuples
+        :param seats: List of Seats or SeatGroups, one for each loc.  SeatGroups are added with add_seat()
+        :param on_duplicate: How to handle a Seat added where a seat already exists (in the object or earlier in seats):
+                                raise: raise a DuplicateSeatError (seats before the duplicate are kept)
+                                warn: keep the existing seat and print a warning
+                                skip: keep the existing seat
+        :return: None
+        """
+        if on_duplicate not in ['raise', 'warn', 'skip']:
+            raise ValueError("Invalid value for on_duplicate '{0}'".format(on_duplicate))
+        if len(locs) != len(seats):
+            raise SeatGroupError("Cannot add_seats - got {0} locations for {1} seats".format(len(locs), len(seats)))
+        # {location prefix: nested group at that prefix}, for groups that are safe to modify (not shared)
+        groups = {(): self}
+        # {location prefix: [number of seats, price sum, unpriced seats] added directly to that group}
+        added = {}
+        try:
+            for loc, seat in zip(locs, seats):
+                if not (isinstance(loc, tuple) or isinstance(loc, list)) or len(loc) == 0:
+                    raise SeatGroupError(
+                        "Cannot add_seat Seat - invalid name.  Must be iterable, but got: {0}".format(loc))
+                if not isinstance(seat, Seat):
+                    self.add_seat(seat, loc)
+                    continue
+                # Internally, names are always treated as strings
+                key = tuple(map(str, loc))
+                parent = key[:-1]
+                group = groups.get(parent)
+                if group is None:
+                    group = self._bulk_group(key, groups)
+                    if isinstance(group, SeatGroupFixedPrice):
+                        self.add_seat(seat, loc)
+                        continue
+                name = key[-1]
+                if name in group.seats:
+                    if on_duplicate == 'raise':
+                        raise DuplicateSeatError("Seat \"{0}\" already in use".format(name))
+                    elif on_duplicate == 'warn':
+                        print("WARNING: Duplicate seat detected at {0}".format(key))
+                    continue
+                group.seats[name] = seat
+                group._names_sorted = False
+                totals = added.get(parent)
+                if totals is None:
+                    totals = added[parent] = [0, 0.0, 0]
+                totals[0] += 1
+                price = seat.price
+                if price is None:
+                    totals[2] += 1
+                else:
+                    totals[1] += price
+        finally:
+            # Add each group's new seats to its totals and to the totals of all groups above it, deepest first
+            for depth in range(max([len(prefix) for prefix in added] + [0]), -1, -1):
+                for prefix in [prefix for prefix in added if len(prefix) == depth]:
+                    totals = added[prefix]
+                    groups[prefix]._change_totals(NO_TOTALS, totals)
+                    if depth > 0:
+                        above = added.setdefault(prefix[:-1], [0, 0.0, 0])
+                        for i in range(3):
+                            above[i] += totals[i]
+
+    def _bulk_group(self, key, groups):
+        # Return the nested group holding the seat at key for add_seats, creating it (or copying it if shared) as needed
+        # and remembering every group on the way in groups
+        prefix = key[:-1]
+        i = len(prefix)
+        while prefix[:i] not in groups:
+            i -= 1
+        group = groups[prefix[:i]]
+        for j in range(i, len(prefix)):
+            name = prefix[j]
+            if name not in group.seats:
+                group.seats[name] = SeatGroup()
+                group._names_sorted = False
+            elif not isinstance(group.seats[name], SeatGroup):
+                raise SeatGroupError(
+                    "Seat '{0}' is a Seat but was used as a SeatGroup with location '{1}'".format(prefix[:j + 1], key))
+            else:
+                group._unshare(name)
+            group = group.seats[name]
+            groups[prefix[:j + 1]] = group
+        return group
+
     def remove(self, name, remove_deep_seats=True, cleanup_empty_groups=True):
         """
         Remove a Seat or SeatGroup from the object
@@ -274,13 +511,17 @@ class SeatGroup(object):
                 # Seat being removed is deeper than this group.  Recurse if allowed.
                 if remove_deep_seats:
                     this_name = str(name[0])
-                    if this_name not in self.seats or this_name not in self.sorted_names:
+                    if this_name not in self.seats:
                         raise SeatGroupError("Seat \"{0}\" is not in this group - cannot remove".format(name))
+                    self._unshare(this_name)
+                    before = seat_totals(self.seats[this_name])
                     self.seats[this_name].remove(name[1:], remove_deep_seats=remove_deep_seats)
+                    self._change_totals(before, seat_totals(self.seats[this_name]))
                     if len(self.seats[this_name]) == 0 and cleanup_empty_groups:
                         # Remove the empty parent SeatGroup
                         self.seats.pop(this_name)
-                        self.sorted_names.remove(this_name)
+                        self._shared.discard(this_name)
+                        self._names_sorted = False
                 else:
                     raise SeatGroupError("Cannot remove seat '{0}', remove_deep_seats is False".format(name))
                 return None
@@ -288,9 +529,11 @@ class SeatGroup(object):
         # Internally, names are always treated as strings
         name = str(name)
         try:
-            # Remove seat and its name
-            self.seats.pop(name)
-            self.sorted_names.remove(name)
+            # Remove seat and mark the names for resorting
+            seat = self.seats.pop(name)
+            self._shared.discard(name)
+            self._names_sorted = False
+            self._change_totals(seat_totals(seat), NO_TOTALS)
         except (KeyError, ValueError):
             raise SeatGroupError("Seat \"{0}\" is not in this group - cannot remove".format(name))
 
@@ -312,19 +555,18 @@ class SeatGroup(object):
         Structure of the original group is preserved (so if seats were broken into SeatGroups in the original SeatGroup,
         they are returned in a similar way in the new SeatGroup
 
+        Nested SeatGroups are shared between the two groups copy-on-write (see copy()), so seats later added to or
+        removed from either group are not seen by the other.
+
         :param seat_locs:
         :param fail_if_missing: Raise exception if a seat in seat_locs does not exist
         :param copy_seats: If True, return copies of the seats instead of references
         :return:
         """
         seats_as_list = self.get_seats_as_list(seat_locs, fail_if_missing=fail_if_missing, copy_seats=copy_seats)
-        seats = zip(seat_locs, seats_as_list)
+        found = [(loc, seat) for loc, seat in zip(seat_locs, seats_as_list) if seat is not None]
         newsg = SeatGroup()
-        for loc, seat in seats:
-            if seat is None:
-                continue
-            else:
-                newsg.add_seat(seat, loc)
+        newsg.add_seats([loc for loc, seat in found], [seat for loc, seat in found])
         return newsg
 
     def get_seats_as_list(self, seat_locs, fail_if_missing=True, copy_seats=False):
@@ -344,10 +586,15 @@ class SeatGroup(object):
             elif len(loc) == 1:
                 try:
                     # Locations are always strings
+                    seat = self.seats[str(loc[0])]
                     if copy_seats:
-                        returned[i] = copy.deepcopy(self.seats[str(loc[0])])
+                        returned[i] = seat.copy(copy_seats=True) if isinstance(seat, SeatGroup) else seat.copy()
                     else:
-                        returned[i] = self.seats[str(loc[0])]
+                        if isinstance(seat, SeatGroup):
+                            # The caller can now keep (or add elsewhere) this nested group, so copy it before this
+                            # group modifies it (see copy())
+                            self._shared.add(str(loc[0]))
+                        returned[i] = seat
                 except KeyError as e:
                     if fail_if_missing:
                         raise e
@@ -357,7 +604,7 @@ class SeatGroup(object):
             else:
                 try:
                     # Get will return a list of seats of length 1, but we just want the seat
-                    returned[i] = self.seats[str(loc[0])].get_seats_as_list([loc[1:]])[0]
+                    returned[i] = self.seats[str(loc[0])].get_seats_as_list([loc[1:]], copy_seats=copy_seats)[0]
                 except KeyError as e:
                     if fail_if_missing:
                         raise e
@@ -378,7 +625,7 @@ class SeatGroup(object):
         """
         if seat_locs is None:
             if depth == 1:
-                return self.sorted_names
+                return [(name,) for name in self.sorted_names]
             else:
                 if depth is not None:
                     depth = depth - 1
@@ -404,6 +651,70 @@ class SeatGroup(object):
                 seat_list.extend(these_seats)
             return seat_list
 
+    def query(self, patterns, copy_seats=False):
+        """
+        Return a new SeatGroup of all seats matching any of the location patterns.
+
+        See query_seats() for the pattern format.
+
+        :param patterns: List of location pattern tuples
+        :param copy_seats: If True, return copies of the seats instead of references
+        :return: A new SeatGroup (see FlatSeatGroup.query() for FlatSeatGroups)
+        """
+        found = self.query_seats(patterns)
+        newsg = SeatGroup()
+        newsg.add_seats([loc for loc, seat in found], [seat.copy() if copy_seats else seat for loc, seat in found])
+        return newsg
+
+    def query_locs(self, patterns):
+        """
+        Return a sorted list of the locations of all seats matching any of the location patterns.
+
+        See query_seats() for the pattern format.
+
+        :param patterns: List of location pattern tuples
+        :return: List of location tuples
+        """
+        return [loc for loc, seat in self.query_seats(patterns)]
+
+    def query_seats(self, patterns):
+        """
+        Return (location, Seat) pairs for all seats matching any of the location patterns, sorted by location.
+
+        A pattern is a tuple with one element per location level, where each element is:
+            a name (eg: 105 or 'A'): matches that name
+            a collection (list, tuple, set, or range): matches any name in the collection, eg: [105, 114]
+            ANY: matches every name at that level, eg: (105, ANY, '12')
+            NameRange(start, stop): matches names between start and stop (inclusive), eg: NameRange('A', 'M')
+        A pattern shorter than a seat's location matches everything below it, so (105,) and (105, ANY, ANY) are the
+        same.  Patterns are resolved by following the matching names at each level, so the cost scales with the number
+        of matches rather than with the size of the group (ANY and NameRange check every name at their level).
+
+        :param patterns: List of location pattern tuples, eg: [(sections, rows)] to match product(sections, rows)
+        :return: List of (location tuple, Seat) pairs
+        """
+        found = {}
+        for pattern in patterns:
+            if not isinstance(pattern, tuple):
+                raise SeatGroupError("Invalid pattern {0} - must be a tuple".format(pattern))
+            self._query(pattern, (), found)
+        return sorted(found.items(), key=lambda item: item[0])
+
+    def _query(self, pattern, prefix, found):
+        # Add all (loc, seat) matching pattern below this group (located at prefix) to dict found
+        if len(pattern) == 0:
+            locs = self.get_locs()
+            for loc, seat in zip(locs, self.get_seats_as_list(locs)):
+                found[prefix + loc] = seat
+            return
+        for name in match_names(pattern[0], self.seats):
+            child = self.seats[name]
+            if isinstance(child, SeatGroup):
+                child._query(pattern[1:], prefix + (name,), found)
+            elif len(pattern) == 1:
+                found[prefix + (name,)] = child
+            # Otherwise, a Seat cannot match a pattern that continues deeper
+
     def get_prices(self):
         """
         Return a numpy array of prices in the SG, including nested seats.  These are in the same order as get_locs.
@@ -443,30 +754,35 @@ class SeatGroup(object):
         """
         if handle_duplicates not in ['cheapest']:
             raise NotImplementedError("handle_duplicates mode '{0}' not yet supported".format(handle_duplicates))
-        else:
-            # First check for duplicates
-            locs_this = self.get_locs()
-            locs_other = other.get_locs()
-
-            locs_both = [loc for loc in locs_this if loc in locs_other]
-            if len(locs_both) > 0 and handle_duplicates is False:
-                raise DuplicateSeatError("Found duplicate seats when merging: {0}".format(locs_both))
+        # Join the two groups on location (hashed), so duplicates are found in O(n + m)
+        locs_this = self.get_locs()
+        locs_other = other.get_locs()
+        seats_other = other.get_seats_as_list(locs_other)
+        locs_this_set = set(locs_this)
+        is_dup = np.array([loc in locs_this_set for loc in locs_other], dtype=bool)
+        if is_dup.any() and handle_duplicates is False:
+            raise DuplicateSeatError("Found duplicate seats when merging: {0}".format(
+                [loc for loc, dup in zip(locs_other, is_dup) if dup]))
         if inplace:
             sg = self
         else:
             sg = self.get_seats_as_seatgroup(locs_this)
-        merged_seats = zip(locs_other, other.get_seats_as_list(locs_other))
-        for loc, seat in merged_seats:
-            # If this is a duplicate, handle it
-            if loc in locs_both:
-                if handle_duplicates == 'cheapest':
-                    # Use the cheaper ticket (if sg.price > other.price, sg already has the cheapest
-                    if sg.get_seats_as_list([loc])[0].price > seat.price:
-                        sg.remove(loc)
-                    else:
-                        # Keep the seat we already have
-                        continue
-            sg.add_seat(seat, loc)
+
+        # Apply the duplicate policy to all duplicates at once
+        replace = np.ones(len(locs_other), dtype=bool)
+        if is_dup.any():
+            i_dup = np.flatnonzero(is_dup)
+            locs_dup = [locs_other[i] for i in i_dup]
+            prices_this = np.array([seat.price for seat in sg.get_seats_as_list(locs_dup)], dtype=float)
+            prices_other = np.array([seats_other[i].price for i in i_dup], dtype=float)
+            if handle_duplicates == 'cheapest':
+                # Use the cheaper ticket (if sg.price > other.price, replace it.  Otherwise keep the seat we have)
+                replace[i_dup] = prices_this > prices_other
+            for i in i_dup[replace[i_dup]]:
+                sg.remove(locs_other[i])
+
+        i_add = np.flatnonzero(replace)
+        sg.add_seats([locs_other[i] for i in i_add], [seats_other[i] for i in i_add])
         if not inplace:
             return sg
 
@@ -480,7 +796,11 @@ class SeatGroup(object):
                       depth==None renames all nested items)
         :return: None
         """
-        for name in self.sorted_names:
+        # Step through the names by position as they change (the names are re-sorted after each rename), as the loop
+        # over the always sorted list of names did before the names were sorted lazily
+        i = 0
+        while i < len(self.sorted_names):
+            name = self.sorted_names[i]
             # update names at deeper levels if requested (double if statment to handle depth=None.
             if isinstance(self.seats[name], SeatGroup):
                 if depth is None:
@@ -491,7 +811,10 @@ class SeatGroup(object):
                 else:
                     go_deep = False
                 if go_deep:
+                    self._unshare(name)
+                    before = seat_totals(self.seats[name])
                     self.seats[name].update_names(namemap=namemap, depth=depth)
+                    self._change_totals(before, seat_totals(self.seats[name]))
 
             # Find all names that match criteria at this level and rename them and/or merge with existing SeatGroups
             for pattern, repl in namemap:
@@ -507,12 +830,15 @@ class SeatGroup(object):
                         to_replace.append((name, pat_comp.sub(repl, name)))
                 # Perform renames
                 for oldname, newname in to_replace:
-                    # print("SG.update_names: Changing \"{0}\" to \"{2}\" in {1}".format(pattern, name, repl))
                     # print("\tChanging {0} with {1}".format(oldname, newname))
                     temp = self.seats[oldname]
-                    # print("got temp: ", temp)
+                    shared = oldname in self._shared
                     self.remove((oldname,))
                     self.add_seat(temp, (newname,))
+                    if not shared and self.seats[newname] is temp:
+                        # Moved rather than merged, and still only referenced here
+                        self._shared.discard(newname)
+            i += 1
 
     def difference(self, other_sg):
         """
@@ -528,11 +854,12 @@ class SeatGroup(object):
         other_locs = other_sg.get_locs()
         all_locs = set(this_locs + other_locs)
 
+        # {result name: ([locs], [seats])}, added to new SeatGroups in bulk at the end
         res = {
-            'added': SeatGroup(),
-            'removed': SeatGroup(),
-            'new_price': SeatGroup(),
-            'new_listid': SeatGroup(),
+            'added': ([], []),
+            'removed': ([], []),
+            'new_price': ([], []),
+            'new_listid': ([], []),
         }
 
         # For each seat, find any differences
@@ -549,19 +876,26 @@ class SeatGroup(object):
                 continue
             elif this_seat is None:
                 # Removed seat
-                res['removed'].add_seat(other_seat, loc)
+                res['removed'][0].append(loc)
+                res['removed'][1].append(other_seat)
             elif other_seat is None:
                 # Added seat
-                res['added'].add_seat(this_seat, loc)
+                res['added'][0].append(loc)
+                res['added'][1].append(this_seat)
             else:
                 # Could be more than one of these at a time
                 if this_seat.price != other_seat.price:
                     # Price change
-                    res['new_price'].add_seat(this_seat, loc)
+                    res['new_price'][0].append(loc)
+                    res['new_price'][1].append(this_seat)
                 if this_seat.list_id != other_seat.list_id:
                     # Listid change (new listing)
-                    res['new_listid'].add_seat(this_seat, loc)
+                    res['new_listid'][0].append(loc)
+                    res['new_listid'][1].append(this_seat)
 
+        for name, (locs, seats) in res.items():
+            res[name] = SeatGroup()
+            res[name].add_seats(locs, seats)
         return res
 
     def describe(self):
@@ -586,33 +920,30 @@ class SeatGroup(object):
         Return the average price of all seats in the group and return the value.
         Implemented as a property to mimic Seat.price
 
-        NOTE: Is a recursive implementation faster, or would using get_locs, get_seat_list, then sum prices be faster?
+        Uses the group's totals, so this is O(1) (see totals).
 
         :return: Float of average ticket price in the group
         """
-        n = 0.0
-        price_sum = 0.0
-        for seatname in self.seats:
-            this_price = float(self.seats[seatname].price)
-            try:
-                this_n = len(self.seats[seatname])
-            except TypeError:
-                this_n = 1
-            n += this_n
-            price_sum += this_price * this_n
-        return price_sum / n
+        if self._n_unpriced > 0:
+            raise TypeError("Cannot average prices - {0} seats in the group have no price".format(self._n_unpriced))
+        return self._price_sum / float(self._len)
 
     @classmethod
-    def init_from_event_json(cls, json_file, price_type='listing_minus_fees', get_meta=False, warn_on_duplicate=False):
+    def init_from_event_json(cls, json_file, price_type='listing_minus_fees', get_meta=False, warn_on_duplicate=False,
+                             intern=None):
         """
         Populate and return a SeatGroup object fro4m a JSON formatted event file
 
+        All seats of a listing share a single SeatListing.  Pass the same intern dict when loading many files of the same
+        event to also share listings across files.
+
         :param json_file: Filename of a JSON file with event listings data
         :param price_type: Type of price to be loaded from the JSON.  Options are:
                             current: The "currentPrice" from listing (price to buy including Stubhub buyer fees)
                             listing: The "listingPrice" from listing (price the seller will get, ignoring Stubhub seller fees)
                             listing_minus_fees: The "listingPrice" minus a 10% StubHub seller fee
         :param get_meta: If True, will attempt to scrape metadata from the JSON (otherwise, data set to None)
+        :param intern: (Optional) Dict used to intern SeatListings (see make_seat_listing())
         :return: None
         """
         # Load event information to dictionary
@@ -631,7 +962,9 @@ class SeatGroup(object):
             sg.meta['date'] = datetime.datetime.strptime(temp, date_format)
         except:
             pass
-        # Grab all listing data
+        # Grab all listing data, collecting the seats to add them all at once
+        locs = []
+        seats = []
         for listing in event_dict['listing']:
             # Unpack and handle possible missing values
             try:
@@ -645,6 +978,7 @@ class SeatGroup(object):
             elif price_type == 'listing_minus_fees':
                 price = listing['listingPrice']['amount'] * 0.9
             list_id = listing['listingId']
+            seat_listing = make_seat_listing(price=price, facevalue=facevalue, list_id=list_id, intern=intern)
             section = listing['sellerSectionName'].upper()
             # Row is occasionally a list of up to 2 rows.  In that case, the seatNumbers will have repeated elements, ie:
             #  quantity=4
@@ -677,18 +1011,13 @@ class SeatGroup(object):
 
                 for seatNumber in local_seatNumbers:
                     # print('DEBUG: Creating seat with Price: {0} (face: {4}), Loc: ({1}, {2}, {3})'.format(price, section, row, seatNumber, facevalue))
-                    seat = Seat(price=price,
-                                list_id=list_id,
-                                facevalue=facevalue,
+                    seat = Seat(listing=seat_listing,
                                 available=True,
                                 )
-                    # Some listing files have duplicate listings.  Handle these here and warn the user
-                    loc = (section, row, seatNumber)
-                    try:
-                        sg.add_seat(seat, loc)
-                    except DuplicateSeatError:
-                        if warn_on_duplicate:
-                            print("WARNING: Duplicate seat detected at {0}".format(loc))
+                    locs.append((section, row, seatNumber))
+                    seats.append(seat)
+        # Some listing files have duplicate listings.  Keep the first seat and optionally warn the user
+        sg.add_seats(locs, seats, on_duplicate='warn' if warn_on_duplicate else 'skip')
         return sg
 
 
@@ -712,234 +1041,1298 @@ class SeatGroupFixedPrice(SeatGroup):
         """
         super().add_seat(seat, self.master_seat_name, *args, **kwargs)
 
-    def get_seats_as_list(self, seat_locs, fail_if_missing=True):
+    def get_seats_as_list(self, seat_locs, fail_if_missing=True, copy_seats=False):
         """
         Mimic SeatGroup's function by returning a list of Seats of length len(seat_locs), but all elements reference .seats['*"]
 
         :param seat_locs:
         :param fail_if_missing: Ignored (here only for matching parent's signature
+        :param copy_seats: If True, return copies of .seats["*"] instead of references
         :return: List of references to .seats["*"] of length len(seat_locs)
         """
+        if copy_seats:
+            return [self.seats[self.master_seat_name[0]].copy() for loc in seat_locs]
         return [self.seats[self.master_seat_name[0]]] * len(seat_locs)
 
 
-class SeatGroupChronology(object):
+class FlatSeatGroup(SeatGroup):
     """
-    Object for grouping many SeatGroups chronologically and extracting time-based data
+    SeatGroup-like object that stores all Seats in a single dict keyed by their full location tuple.
+
+    Alternative layout to the nested SeatGroup.  A prefix index ({location prefix: {child name: number of seats}})
+    replaces the nested groups for section or row level lookups, so:
+        - looking up or removing a single seat is O(1) instead of a recursive walk with one call per level
+        - looking up a section or row is a scan of the index below that prefix instead of a tree walk
+
+    Differences from SeatGroup:
+        - Only Seats are stored.  Adding a SeatGroup adds each of its seats (merged with existing seats using the
+          cheapest seat, the same as SeatGroup.add_seat(merge=True)).  SeatGroupFixedPrice cannot be added
+        - Empty groups are never kept (cleanup_empty_groups is always True)
+        - get_seats_as_list() for a location prefix returns a new FlatSeatGroup referencing the same seats, rather than
+          the nested SeatGroup object itself
     """
 
     def __init__(self):
-        self.seatgroups = {}
-        self.sorted_timepoints = []
-        self.meta = None  # For things like home/away team, etc.
-        self.added = None
-        self.removed = None
-        self.new_price = None
-        self.new_listid = None
-        self.sales = None
-
-    def display(self):
-        for tp in self.sorted_timepoints:
-            print(tp)
-            self.seatgroups[tp].display()
+        super().__init__()
+        self.flat = {}
+        # {location prefix: {child name: number of seats under prefix + (child name,)}}.  Root prefix is ()
+        self.prefix_index = {(): {}}
+        self._sorted_locs = []
+        self._locs_sorted = True
 
-    def add_seatgroup(self, timepoint, sg, update_names=None, update_meta=False):
+    @classmethod
+    def from_seatgroup(cls, sg):
         """
-        Add a SeatGroup to the object, checking if another of the same timepoint already exists.
+        Return a new FlatSeatGroup with references to all seats in sg
 
-        :param timepoint: datetime object identifying the SeatGroup (used as the key for storing data)
-        :param sg: SeatGroup to be added
-        :param update_names: If not None, invokes sg.update_names(update_names) to update any Seat names in the
-                             SeatGroup.  Useful for data munging.
-        :return: None
+        :param sg: A SeatGroup
+        :return: FlatSeatGroup
         """
-        if timepoint in self.seatgroups:
-            raise DuplicateSeatError(
-                "Cannot add_seat SeatGroup at timepoint {0} - SeatGroup already exists with that timepoint".format(
-                    timepoint))
-        else:
-            if isinstance(timepoint, datetime.datetime):
-                self.seatgroups[timepoint] = sg
-                if update_names is not None:
-                    self.seatgroups[timepoint].update_names(update_names)
-                bisect.insort(self.sorted_timepoints, timepoint)
-                # Check the metadata
-                if update_meta:
-                    if self.meta != None and self.meta != self.seatgroups[timepoint].meta:
-                        print(
-                            "WARNING: Seatgroup metadata '{0}' does not match past metadata '{1}'.  Metadata updated with most recent data".format(
-                                self.seatgroups[timepoint].meta, self.meta))
-                    self.meta = self.seatgroups[timepoint].meta
-            else:
-                raise SeatGroupError("Invalid timepoint {0} - must be a datetime object".format(timepoint))
+        flat_sg = cls()
+        locs = sg.get_locs()
+        flat_sg.add_seats(locs, sg.get_seats_as_list(locs))
+        flat_sg.meta = sg.meta
+        return flat_sg
 
-    def add_seatgroups_from_event_json(self, timepoints, json_files, update_names=None):
+    def to_seatgroup(self):
         """
-        Add a seatgroup from a list of JSON formatted even files and their timepoint identifiers.
+        Return a new nested SeatGroup with references to all seats in this FlatSeatGroup
 
-        :param timepoints: See add_timepoint (similar version of this function)
-        :param json_files: See add_timepoint (similar version of this function)
-        :return: None
+        :return: SeatGroup
         """
-        for timepoint, json_file in zip(timepoints, json_files):
-            self.add_seatgroup_from_event_json(timepoint, json_file, update_names=update_names)
+        sg = SeatGroup()
+        locs = self.get_locs()
+        sg.add_seats(locs, [self.flat[loc] for loc in locs])
+        sg.meta = self.meta
+        return sg
 
-    def add_seatgroup_from_event_json(self, timepoint, json_file, update_names=None, verbose=False):
+    def copy(self, copy_seats=False):
         """
-        Add a SeatGroup from a JSON formatted event file, identified by a timepoint key.
+        Return a copy of the FlatSeatGroup that shares its Seats with this one (see SeatGroup.copy()).
 
-        :param timepoint: See add_seatgroup.
-        :param json_file: Filename of a JSON file with event listings data
-        :return: None
-        """
-        if verbose:
-            print("DEBUG: Adding timepoint {0} from file {1}".format(timepoint, json_file))
-        self.add_seatgroup(timepoint, SeatGroup.init_from_event_json(json_file), update_names=update_names)
+        The seat dict and prefix index are copied directly (there are no nested groups to share).
 
-    def find_differences(self):
+        :param copy_seats: If True, also copy every Seat
+        :return: FlatSeatGroup
         """
-        Compares all timepoints chronologically to determine sales, adds, price changes, and listings changes over time.
+        newsg = copy.copy(self)
+        newsg.meta = copy.copy(self.meta)
+        if copy_seats:
+            newsg.flat = {key: seat.copy() for key, seat in self.flat.items()}
+        else:
+            newsg.flat = dict(self.flat)
+        newsg.prefix_index = {prefix: dict(children) for prefix, children in self.prefix_index.items()}
+        return newsg
 
-        :return: None
+    @property
+    def sorted_names(self):
         """
-        self.added = SeatGroupChronology()
-        self.removed = SeatGroupChronology()
-        self.new_price = SeatGroupChronology()
-        self.new_listid = SeatGroupChronology()
-        for i in range(1, len(self.sorted_timepoints)):
-            this_t = self.sorted_timepoints[i]
-            prev_t = self.sorted_timepoints[i - 1]
-            # print("comparing {0} to {1}".format(this_t, prev_t))
-            diff = self.seatgroups[this_t].difference(self.seatgroups[prev_t])
-            self.added.add_seatgroup(this_t, diff['added'])
-            self.removed.add_seatgroup(this_t, diff['removed'])
-            self.new_price.add_seatgroup(this_t, diff['new_price'])
-            self.new_listid.add_seatgroup(this_t, diff['new_listid'])
+        Return the names at the top level of the group, in sorted order (see SeatGroup.sorted_names)
+        """
+        return sorted(self.prefix_index[()])
 
-        # Apply some logic to figure out which removed tickets are sales:
-        #   - For any seat that is removed and then added again, assume the first removal is not a sale
-        self.sales = copy.deepcopy(self.removed)
-        all_locs = [self.sales.seatgroups[tp].get_locs() for tp in self.sales.sorted_timepoints]
-        for i in range(len(all_locs)):
-            to_remove = []
-            for loc in all_locs[i]:
-                for j in range(i+1, len(all_locs)):
-                    if loc in all_locs[j]:
-                        to_remove.append(loc)
-                        break
-            # Remove repeated seats from the seatgroup
-            for loc in to_remove:
-                self.sales.seatgroups[self.sales.sorted_timepoints[i]].remove(loc)
-        #   - Filter out "generic" seat numbers?
+    def __len__(self):
+        return len(self.flat)
 
-    def calc_average_price_history(self, seat_locs=None, average_type='cumulative', moving_average_timedelta=None,
-                                   price_type='sales', filter_func=None):
+    def update_totals(self):
         """
-        Returns a numpy record array of the history of average price for the SeatGroupChronology
-
-        :param seat_locs:
-        :param average_type: The type of average to calculate:
-                                moving: a moving average over the last moving_average_timedelta period of time
-                                cumulative: an average over all results up to this timepoint
-        :param moving_average_timedelta: A timedelta object for the range of the moving average (default is 5 days).
-                                         moving_average_timedelta must be positive
-        :param price_type: The type of tickets to include in the average:
-                            sales: average tickets sold
-                            listed: average tickets listed
-                            filtered_sales: average filtered tickets sold
-        :param filter_func: TBD (some way to filter outliers.  Maybe a function that accepts list of prices and returns only
-                            the ones that meet some criteria?)
-        :return: Numpy record array of timepoint and price.
+        Recalculate the totals of the group from its seats (see SeatGroup.update_totals())
         """
-        if moving_average_timedelta is None:
-            moving_average_timedelta = datetime.timedelta(days=5)
-        elif isinstance(moving_average_timedelta, datetime.timedelta):
-            if moving_average_timedelta.total_seconds() < 0:
-                raise ValueError("moving_average_timedelta must be positive (was '{0}')".format(
-                    moving_average_timedelta.total_seconds()))
-        else:
-            raise ValueError("moving_average_timedelta must be a datetime.timedelta object or None")
+        self._len = 0
+        self._price_sum = 0.0
+        self._n_unpriced = 0
+        for seat in self.flat.values():
+            self._change_totals(NO_TOTALS, seat_totals(seat))
 
-        # I don't think I do any data manipulation on these, but still using copy_seats here to make sure there's no
-        # side effects I forget...
-        if price_type == 'listed':
-            # data = copy.deepcopy(self)
-            data = self.get_seats(seat_locs, copy_seats=True)
-            # pass
-        elif price_type == 'sales':
-            # data = copy.deepcopy(self.sales)
-            data = self.sales.get_seats(seat_locs, copy_seats=True)
-            # Add a try/catch here?  Make sales a property that initializes itself if needed?
-            # data = data.sales
-        else:
-            raise ValueError("Invalid value for price_type '{0}'".format(price_type))
+    def __eq__(self, other):
+        """
+        Compare two SeatGroups by ensuring they have identical seat entries.
 
-        # Slice to get only the seats requested, and filter out prices
-        # data = data.get_seats(seat_locs)
-        data = data.get_prices(f=filter_func)
+        :param other: Another SeatGroup
+        :return: Boolean
+        """
+        if isinstance(other, FlatSeatGroup):
+            return self.flat == other.flat
+        locs = self.get_locs()
+        if locs != other.get_locs():
+            return False
+        return self.get_seats_as_list(locs) == other.get_seats_as_list(locs)
 
-        # if price_type == 'listed':
-        #     data = self.get_prices(f=filter_func)
-        # elif price_type == 'sales':
-        #     data = self.sales.get_prices(f=filter_func)
+    def _key(self, name):
+        if not (isinstance(name, tuple) or isinstance(name, list)):
+            raise SeatGroupError("Invalid name - must be a tuple or list, but got: {0}".format(name))
+        # Internally, names are always treated as strings
+        return tuple(map(str, name))
+
+    def _check_prefixes(self, key):
+        # Raise if part of key is already a Seat (a Seat cannot be used as a SeatGroup)
+        for i in range(1, len(key)):
+            if key[:i] in self.flat:
+                raise SeatGroupError(
+                    "Seat '{0}' is a Seat but was used as a SeatGroup with location '{1}'".format(key[:i], key))
+
+    def _insert(self, key, seat):
+        # Add a Seat at key and update the prefix index and totals.  Does not check for conflicts
+        self.flat[key] = seat
+        self._change_totals(NO_TOTALS, seat_totals(seat))
+        for i in range(len(key)):
+            children = self.prefix_index.setdefault(key[:i], {})
+            children[key[i]] = children.get(key[i], 0) + 1
+        self._locs_sorted = False
+
+    def _delete(self, key):
+        # Remove the Seat at key and update the prefix index and totals, dropping any prefixes left without seats
+        seat = self.flat.pop(key)
+        self._change_totals(seat_totals(seat), NO_TOTALS)
+        for i in range(len(key) - 1, -1, -1):
+            children = self.prefix_index[key[:i]]
+            children[key[i]] -= 1
+            if children[key[i]] == 0:
+                del children[key[i]]
+                if i > 0 and len(children) == 0:
+                    del self.prefix_index[key[:i]]
+        self._locs_sorted = False
+        return seat
+
+    def _keys_under(self, prefix):
+        # Full keys of all seats under a prefix (or the prefix itself if it is a seat), found through the prefix index
+        if prefix in self.flat:
+            return [prefix]
+        keys = []
+        stack = [prefix]
+        while stack:
+            p = stack.pop()
+            for name in self.prefix_index.get(p, ()):
+                key = p + (name,)
+                if key in self.flat:
+                    keys.append(key)
+                else:
+                    stack.append(key)
+        return keys
 
-        # Group all data by timepoint
-        # Use groupby(), which only accepts regular numpy arrays.  Get around this by adding a numeric index instead of
-        # timepoint and grouping by those
-        tps_unique, tps_indices = np.unique(data['timepoint'], return_inverse=True)
+    def add_seat(self, seat, name, make_deep_groups=True, merge=True):
+        """
+        Add a Seat or the seats in a SeatGroup to the object.
 
-        temp = np.stack((tps_indices, data['price'])).T
-        # print("temp (index, price) array")
-        # pprint(temp)
+        See SeatGroup.add_seat() for argument details.  Adding a SeatGroup at a name adds every seat in that group below
+        name.
 
-        # Exclude the first column returned by groupby which is just indices referring to timepoints
-        data = groupby(temp, by=0, axis=0)[:, 1:]
-        # print("data after groupby:")
-        # pprint(data)
+        :return: None
+        """
+        key = self._key(name)
+        if len(key) == 0:
+            raise SeatGroupError("Cannot add_seat Seat - invalid name.  Must not be empty")
+        if not make_deep_groups and len(key) > 1 and key[:-1] not in self.prefix_index:
+            raise SeatGroupError("Cannot add_seat seat '{0}', SeatGroup '{1}' not defined".format(name, name[:-1]))
+        self._check_prefixes(key)
+        if isinstance(seat, Seat):
+            if key in self.flat or key in self.prefix_index:
+                raise DuplicateSeatError("Seat \"{0}\" already in use".format(key[-1]))
+            self._insert(key, seat)
+        elif isinstance(seat, SeatGroupFixedPrice):
+            raise SeatGroupError("Cannot add a SeatGroupFixedPrice to a FlatSeatGroup")
+        elif isinstance(seat, SeatGroup):
+            if key in self.flat:
+                raise DuplicateSeatError("Seat \"{0}\" already in use".format(key[-1]))
+            if key in self.prefix_index and not merge:
+                raise DuplicateSeatError("Seat \"{0}\" already in use".format(key[-1]))
+            locs = seat.get_locs()
+            for loc, s in zip(locs, seat.get_seats_as_list(locs)):
+                this_key = key + loc
+                if this_key in self.flat:
+                    # Use the cheaper ticket (if existing.price > new.price, replace it)
+                    if self.flat[this_key].price > s.price:
+                        self._delete(this_key)
+                    else:
+                        continue
+                else:
+                    self._check_prefixes(this_key)
+                self._insert(this_key, s)
+        else:
+            raise SeatGroupError(
+                "Seat '{0}' must be a Seat or SeatGroup object - found {1}".format(key[-1], type(seat)))
 
-        if average_type == 'cumulative':
-            data_cumsum = data.cumsum(axis=0)
-            # print('data_cumsum')
-            # pprint(data_cumsum)
-            avg = data_cumsum[:, 0] / data_cumsum[:, 1]
-            # print('avg (shape = {0}):'.format(avg.shape))
-            # pprint(avg)
-        elif average_type == 'moving':
-            # This could be faster by doing a single filter first, I think
-            avg = []
-            for i in range(len(tps_unique)):
-                data_subset = data[
-                    (tps_unique >= tps_unique[i] - moving_average_timedelta) & (tps_unique <= tps_unique[i])]
-                data_subset_sum = data_subset.sum(axis=0)
-                avg.append(data_subset_sum[0] / data_subset_sum[1])
+    def add_seats(self, locs, seats, on_duplicate='raise'):
+        """
+        Add many Seats (or SeatGroups) to the object at once.  See SeatGroup.add_seats() for argument details.
 
-        avg = np.rec.array([tps_unique, avg],
-                           dtype=[('timepoint', 'O'), ('price', 'float')])
-        return avg
+        Seats are stored directly, and the prefix index is updated once per parent location rather than once per seat.
 
-    def get_lens(self):
+        :return: None
         """
-        Return a numpy array with rows of (timepoint, len(SG@timepoint)).
+        if on_duplicate not in ['raise', 'warn', 'skip']:
+            raise ValueError("Invalid value for on_duplicate '{0}'".format(on_duplicate))
+        if len(locs) != len(seats):
+            raise SeatGroupError("Cannot add_seats - got {0} locations for {1} seats".format(len(locs), len(seats)))
+        # Prefixes of the seats added so far (already checked to not be Seats), and {parent: [names]} of those seats,
+        # which are not in the prefix index until flushed
+        prefixes = set()
+        added = {}
+        try:
+            for loc, seat in zip(locs, seats):
+                if not isinstance(seat, Seat):
+                    self._flush_added(added, prefixes)
+                    self.add_seat(seat, loc)
+                    continue
+                key = self._key(loc)
+                if len(key) == 0:
+                    raise SeatGroupError("Cannot add_seat Seat - invalid name.  Must not be empty")
+                if key in self.flat or key in self.prefix_index or key in prefixes:
+                    if on_duplicate == 'raise':
+                        raise DuplicateSeatError("Seat \"{0}\" already in use".format(key[-1]))
+                    elif on_duplicate == 'warn':
+                        print("WARNING: Duplicate seat detected at {0}".format(key))
+                    continue
+                parent = key[:-1]
+                if parent not in prefixes:
+                    self._check_prefixes(key)
+                    for i in range(len(key)):
+                        prefixes.add(key[:i])
+                self.flat[key] = seat
+                self._change_totals(NO_TOTALS, seat_totals(seat))
+                added.setdefault(parent, []).append(key[-1])
+        finally:
+            self._flush_added(added, prefixes)
+
+    def _flush_added(self, added, prefixes):
+        # Add the seats of add_seats ({parent: [names]}, already in flat) to the prefix index
+        for parent, names in added.items():
+            children = self.prefix_index.setdefault(parent, {})
+            for name in names:
+                children[name] = children.get(name, 0) + 1
+            for i in range(len(parent)):
+                children = self.prefix_index.setdefault(parent[:i], {})
+                children[parent[i]] = children.get(parent[i], 0) + len(names)
+        if len(added) > 0:
+            self._locs_sorted = False
+        added.clear()
+        prefixes.clear()
 
-        :return:
+    def remove(self, name, remove_deep_seats=True, cleanup_empty_groups=True):
         """
-        lens = [None] * len(self.sorted_timepoints)
-        # lens = np.empty((len(self.sorted_timepoints), 2))
+        Remove a Seat, or all seats under a location prefix, from the object.
 
-        for i, t in enumerate(self.sorted_timepoints):
-            # lens[i, :] = (t, len(self.seatgroups[t]))
-            lens[i] = (t, len(self.seatgroups[t]))
-        return np.array(lens)
+        See SeatGroup.remove() for argument details.  cleanup_empty_groups is ignored (empty groups are always removed).
 
-    def get_prices(self, f = None, return_type='numpy'):
+        :return: None
         """
+        if isinstance(name, tuple) or isinstance(name, list):
+            if len(name) > 1 and not remove_deep_seats:
+                raise SeatGroupError("Cannot remove seat '{0}', remove_deep_seats is False".format(name))
+            key = self._key(name)
+        else:
+            key = (str(name),)
+        keys = self._keys_under(key)
+        if len(keys) == 0:
+            raise SeatGroupError("Seat \"{0}\" is not in this group - cannot remove".format(name))
+        for k in keys:
+            self._delete(k)
 
-        Future: Merge all price_type scalar options into the same returned numpy record array?  Would save computation,
-                but mess with the sgc return type option (multiple entries with min, max, avg in a SGC would be
-                impossible to use).
+    def get_seats_as_seatgroup(self, seat_locs, fail_if_missing=True, copy_seats=False):
+        """
+        Return a FlatSeatGroup of seats described by an iterable of seat location tuples.
 
-        :param f:   Function to be applied to the prices returned for each timepoint's SeatGroup.  Default is None,
-                    which returns all prices.  Other options could be np.min (min price in each SG), np.max, np.average.
+        See SeatGroup.get_seats_as_seatgroup() for more details.
+        """
+        newsg = FlatSeatGroup()
+        for loc in seat_locs:
+            key = self._key(loc)
+            if key in self.flat:
+                keys = [key]
+            elif key in self.prefix_index:
+                keys = self._keys_under(key)
+            else:
+                if key[0] in self.prefix_index[()]:
+                    self._check_prefixes(key)
+                if fail_if_missing:
+                    raise KeyError(loc)
+                continue
+            for k in keys:
+                if k in newsg.flat:
+                    continue
+                if copy_seats:
+                    newsg._insert(k, self.flat[k].copy())
+                else:
+                    newsg._insert(k, self.flat[k])
+        return newsg
+
+    def get_seats_as_list(self, seat_locs, fail_if_missing=True, copy_seats=False):
+        """
+        Return a list of seats described by an iterable of seat location tuples.
+
+        Locations of a single seat return that Seat.  Location prefixes (eg: a section) return a new FlatSeatGroup of
+        the seats under that prefix, with the prefix removed from their locations.
+
+        See SeatGroup.get_seats_as_list() for more details.
+        """
+        returned = [None] * len(seat_locs)
+        for i, loc in enumerate(seat_locs):
+            key = self._key(loc)
+            seat = self.flat.get(key)
+            if seat is not None:
+                returned[i] = seat.copy() if copy_seats else seat
+            elif key in self.prefix_index:
+                sub = FlatSeatGroup()
+                n = len(key)
+                for k in self._keys_under(key):
+                    sub._insert(k[n:], self.flat[k].copy() if copy_seats else self.flat[k])
+                returned[i] = sub
+            else:
+                self._check_prefixes(key)
+                if fail_if_missing:
+                    raise KeyError(key[0])
+        return returned
+
+    def get_locs(self, seat_locs=None, depth=None):
+        """
+        Returns a list of tuples identifying all the seats in this group, in sorted order.
+
+        See SeatGroup.get_locs() for more details.
+        """
+        if seat_locs is None:
+            if depth is None:
+                if not self._locs_sorted:
+                    # Sorting full location tuples gives the same order as walking the nested names in sorted order
+                    self._sorted_locs = sorted(self.flat)
+                    self._locs_sorted = True
+                return self._sorted_locs
+            return self._walk_index((), depth)
+        else:
+            seat_list = []
+            for seat_loc in seat_locs:
+                key = self._key(seat_loc)
+                if key in self.flat:
+                    raise SeatGroupError("Seat '{0}' is a Seat, not a SeatGroup".format(seat_loc))
+                if key not in self.prefix_index:
+                    raise KeyError(key[0])
+                seat_list.extend([(*seat_loc, *loc[len(key):]) for loc in self._walk_index(key, depth)])
+            return seat_list
+
+    def _walk_index(self, prefix, depth):
+        # Sorted locations below prefix, truncated to depth levels below prefix (depth=None for full locations)
+        locs = []
+        for name in sorted(self.prefix_index.get(prefix, ())):
+            key = prefix + (name,)
+            if key in self.flat or depth == 1:
+                locs.append(key)
+            else:
+                locs.extend(self._walk_index(key, None if depth is None else depth - 1))
+        return locs
+
+    def query(self, patterns, copy_seats=False):
+        """
+        Return a new FlatSeatGroup of all seats matching any of the location patterns.  See SeatGroup.query()
+        """
+        found = self.query_seats(patterns)
+        newsg = FlatSeatGroup()
+        newsg.add_seats([loc for loc, seat in found], [seat.copy() if copy_seats else seat for loc, seat in found])
+        return newsg
+
+    def _query(self, pattern, prefix, found):
+        # Add all (loc, seat) matching pattern below prefix to dict found, following the prefix index
+        if prefix in self.flat:
+            if len(pattern) == 0:
+                found[prefix] = self.flat[prefix]
+            return
+        if len(pattern) == 0:
+            for key in self._keys_under(prefix):
+                found[key] = self.flat[key]
+            return
+        children = self.prefix_index.get(prefix)
+        if children is None:
+            return
+        for name in match_names(pattern[0], children):
+            self._query(pattern[1:], prefix + (name,), found)
+
+    def get_prices(self):
+        """
+        Return a numpy array of prices in the group, in the same order as get_locs().
+        """
+        return np.array([self.flat[loc].price for loc in self.get_locs()], dtype=float)
+
+    def update_names(self, namemap=None, depth=None):
+        """
+        Update names of the Seats and location levels based on namemap.
+
+        Renamed groups that collide with existing groups are merged, keeping the cheapest seat when the same seat is in
+        both.  A Seat renamed to the name of another Seat in the same group raises a DuplicateSeatError.
+
+        Every name within depth is renamed once, by a single pass through namemap.  SeatGroup.update_names() instead
+        applies namemap level by level as it steps through the names, which can skip or revisit names as renames
+        reorder them, so the two can differ when a rename changes the order of names in a group.
+
+        See SeatGroup.update_names() for argument details.
+        """
+        compiled = [(re.compile(pattern), repl) for pattern, repl in namemap]
+
+        def rename(name):
+            for pat_comp, repl in compiled:
+                if pat_comp.search(name):
+                    name = pat_comp.sub(repl, name)
+            return name
+
+        cache = {}
+        renamed = {}
+        changed = False
+        for key in self.get_locs():
+            for i, n in enumerate(key):
+                if (depth is None or i < depth) and n not in cache:
+                    cache[n] = rename(n)
+            new_key = tuple(cache[n] if (depth is None or i < depth) else n for i, n in enumerate(key))
+            changed = changed or new_key != key
+            if new_key in renamed:
+                other_key, other_seat = renamed[new_key]
+                if other_key[:-1] == key[:-1]:
+                    raise DuplicateSeatError("Seat \"{0}\" already in use".format(new_key[-1]))
+                if other_seat.price > self.flat[key].price:
+                    renamed[new_key] = (key, self.flat[key])
+            else:
+                renamed[new_key] = (key, self.flat[key])
+        if changed:
+            self.flat = {}
+            self.prefix_index = {(): {}}
+            self.update_totals()
+            for new_key in renamed:
+                self._check_prefixes(new_key)
+                self._insert(new_key, renamed[new_key][1])
+
+    def difference(self, other_sg):
+        """
+        Find the differences between this and other_sg and return them.
+
+        See SeatGroup.difference() for more details.  Returned groups are FlatSeatGroups.
+        """
+        if isinstance(other_sg, FlatSeatGroup):
+            other_flat = other_sg.flat
+        else:
+            other_flat = FlatSeatGroup.from_seatgroup(other_sg).flat
+
+        res = {
+            'added': FlatSeatGroup(),
+            'removed': FlatSeatGroup(),
+            'new_price': FlatSeatGroup(),
+            'new_listid': FlatSeatGroup(),
+        }
+        for key, this_seat in self.flat.items():
+            other_seat = other_flat.get(key)
+            if other_seat is None:
+                res['added']._insert(key, this_seat)
+            elif this_seat == other_seat:
+                continue
+            else:
+                if this_seat.price != other_seat.price:
+                    res['new_price']._insert(key, this_seat)
+                if this_seat.list_id != other_seat.list_id:
+                    res['new_listid']._insert(key, this_seat)
+        for key, other_seat in other_flat.items():
+            if key not in self.flat:
+                res['removed']._insert(key, other_seat)
+        return res
+
+
+class LazySeatGroups(MutableMapping):
+    """
+    Dict-like mapping of {timepoint: SeatGroup} that loads SeatGroups on first access, for lazy SeatGroupChronologies.
+
+    Timepoints are registered with a loader (a callable returning the SeatGroup), and loaded SeatGroups are kept
+    resident in least recently used order until their estimated size (see estimate_nbytes()) exceeds max_nbytes, at
+    which point the least recently used are dropped and reloaded on their next access.  Without a spill_dir,
+    SeatGroups assigned directly (mapping[tp] = sg) have no loader and are always resident.
+
+    With a spill_dir, every SeatGroup (including those assigned directly) counts toward max_nbytes, and dropped
+    SeatGroups are written to a private directory in spill_dir (see write_seatgroup()) and read back on their next
+    access.  SeatGroups that cannot be written (those containing a SeatGroupFixedPrice) stay resident.
+
+    Without a spill_dir, dropped SeatGroups are reloaded from their source, so changes made in place to a loaded
+    SeatGroup can be lost.  To keep a changed SeatGroup, assign it back (mapping[tp] = sg).  With a spill_dir, a
+    SeatGroup is written as it is when dropped, so only changes made through references held after it is dropped are
+    lost.
+    """
+    def __init__(self, max_nbytes=None, spill_dir=None, intern=None):
+        """
+        :param max_nbytes: (Optional) Approximate memory budget in bytes for SeatGroups that can be dropped.  If None,
+                           loaded SeatGroups are never dropped
+        :param spill_dir: (Optional) Directory to write dropped SeatGroups to
+        :param intern: (Optional) Dict used to intern the SeatListings of SeatGroups read back from spill_dir (see
+                       make_seat_listing())
+        """
+        self.max_nbytes = max_nbytes
+        # Loader of each timepoint that can be dropped (None until a SeatGroup assigned directly is spilled)
+        self.loaders = {}
+        self.pinned = {}
+        self.resident = OrderedDict()
+        self.resident_nbytes = 0
+        self._nbytes = {}
+        self.intern = intern
+        self.spill_path = None
+        self._spilled = {}
+        self._n_spilled = 0
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.spill_path = tempfile.mkdtemp(prefix='seatgroups_', dir=spill_dir)
+            # Remove the spilled SeatGroups with the mapping
+            weakref.finalize(self, shutil.rmtree, self.spill_path, True)
+
+    def register(self, timepoint, loader):
+        """
+        Register a timepoint to be loaded on first access.
+
+        :param timepoint: Key of the SeatGroup
+        :param loader: Callable taking no arguments that returns the SeatGroup
+        :return: None
+        """
+        self._discard(timepoint)
+        self.loaders[timepoint] = loader
+
+    def is_resident(self, timepoint):
+        """
+        Return True if the SeatGroup at timepoint is in memory (loaded or assigned directly).
+        """
+        return timepoint in self.pinned or timepoint in self.resident
+
+    def drop(self, timepoint):
+        """
+        Drop the loaded SeatGroup at timepoint from memory (it is reloaded on its next access), writing it to disk
+        first if spilling.  SeatGroups that are always resident cannot be dropped.
+
+        :return: None
+        """
+        if timepoint not in self.resident:
+            return
+        sg = self.resident.pop(timepoint)
+        self.resident_nbytes -= self._nbytes.pop(timepoint)
+        if self.spill_path is not None:
+            path = os.path.join(self.spill_path, '{0}.npz'.format(self._n_spilled))
+            try:
+                write_seatgroup(path, sg)
+            except SeatGroupError:
+                # Keep it in memory instead
+                del self.loaders[timepoint]
+                self.pinned[timepoint] = sg
+                return
+            self._n_spilled += 1
+            self._spilled[timepoint] = path
+            self.loaders[timepoint] = functools.partial(self._read_spilled, timepoint)
+
+    def _read_spilled(self, timepoint):
+        path = self._spilled.pop(timepoint)
+        sg = read_seatgroup(path, intern=self.intern)
+        os.remove(path)
+        return sg
+
+    def _discard(self, timepoint):
+        # Forget a timepoint without writing it anywhere
+        if timepoint in self.resident:
+            del self.resident[timepoint]
+            self.resident_nbytes -= self._nbytes.pop(timepoint)
+        if timepoint in self._spilled:
+            os.remove(self._spilled.pop(timepoint))
+        self.loaders.pop(timepoint, None)
+        self.pinned.pop(timepoint, None)
+
+    def _make_resident(self, timepoint, sg):
+        self.resident[timepoint] = sg
+        self._nbytes[timepoint] = estimate_nbytes(sg)
+        self.resident_nbytes += self._nbytes[timepoint]
+        # Always keep the newest SeatGroup, even if it alone is over budget
+        if self.max_nbytes is not None:
+            while self.resident_nbytes > self.max_nbytes and len(self.resident) > 1:
+                self.drop(next(iter(self.resident)))
+
+    def __getitem__(self, timepoint):
+        try:
+            return self.pinned[timepoint]
+        except KeyError:
+            pass
+        try:
+            self.resident.move_to_end(timepoint)
+            return self.resident[timepoint]
+        except KeyError:
+            pass
+        sg = self.loaders[timepoint]()
+        self._make_resident(timepoint, sg)
+        return sg
+
+    def __setitem__(self, timepoint, sg):
+        self._discard(timepoint)
+        if self.spill_path is None:
+            self.pinned[timepoint] = sg
+        else:
+            self.loaders[timepoint] = None
+            self._make_resident(timepoint, sg)
+
+    def __delitem__(self, timepoint):
+        if timepoint not in self:
+            raise KeyError(timepoint)
+        self._discard(timepoint)
+
+    def __contains__(self, timepoint):
+        return timepoint in self.pinned or timepoint in self.loaders
+
+    def __iter__(self):
+        yield from self.pinned
+        yield from self.loaders
+
+    def __len__(self):
+        return len(self.pinned) + len(self.loaders)
+
+
+class SeatGroupChronology(object):
+    """
+    Object for grouping many SeatGroups chronologically and extracting time-based data
+    """
+
+    def __init__(self, seatgroup_class=None, lazy=False, max_resident_nbytes=None, spill_dir=None):
+        """
+        :param seatgroup_class: Class used for SeatGroups loaded from JSON files (SeatGroup (default) or
+                                FlatSeatGroup)
+        :param lazy: If True, SeatGroups added from JSON files are only parsed when first accessed (see
+                     LazySeatGroups), so only the timepoints actually used are loaded
+        :param max_resident_nbytes: (Optional, only used if lazy or spilling) Approximate memory budget in bytes for
+                                    SeatGroups.  The least recently used are dropped when over budget, and loaded again
+                                    on their next access
+        :param spill_dir: (Optional) Directory to spill SeatGroups to when over max_resident_nbytes.  All SeatGroups,
+                          including those added directly, count toward the budget.  Chronologies made from this one
+                          (find_differences(), copy(), with_prices()) spill to the same directory with the same budget
+        """
+        if seatgroup_class is None:
+            seatgroup_class = SeatGroup
+        self.seatgroup_class = seatgroup_class
+        self.lazy = lazy
+        self.max_resident_nbytes = max_resident_nbytes
+        self.spill_dir = spill_dir
+        # Intern table for SeatListings, so a listing seen at many timepoints is stored once
+        self._listing_intern = {}
+        self.seatgroups = self._new_seatgroups()
+        self.sorted_timepoints = []
+        # sorted_timepoints as a datetime64 array, built lazily (see timepoint_index)
+        self._timepoint_index = None
+        self.meta = None  # For things like home/away team, etc.
+        self.added = None
+        self.removed = None
+        self.new_price = None
+        self.new_listid = None
+        self.sales = None
+
+    def _new_seatgroups(self):
+        # Empty mapping for seatgroups, according to the lazy and spill settings
+        if self.lazy or self.spill_dir is not None:
+            return LazySeatGroups(max_nbytes=self.max_resident_nbytes, spill_dir=self.spill_dir,
+                                  intern=self._listing_intern)
+        else:
+            return {}
+
+    def new_like(self):
+        """
+        Return a new, empty SeatGroupChronology with the same seatgroup_class, memory budget, and spill_dir as this one.
+
+        The new SGC is never lazy, as it has no files to load.
+
+        :return: SeatGroupChronology
+        """
+        return SeatGroupChronology(seatgroup_class=self.seatgroup_class, max_resident_nbytes=self.max_resident_nbytes,
+                                   spill_dir=self.spill_dir)
+
+    def copy(self, copy_seats=False):
+        """
+        Return a copy of the SeatGroupChronology, copying each SeatGroup with SeatGroup.copy().
+
+        SeatGroups are copy-on-write, so the copy shares their contents with this SGC until either side modifies them
+        through the SeatGroup API.  Chronologies from find_differences() (added, removed, sales, ...) are copied the
+        same way.
+
+        :param copy_seats: If True, also copy every Seat (see SeatGroup.copy())
+        :return: SeatGroupChronology
+        """
+        # Shallow copy of the attributes (not copy.copy, which would go through __reduce_ex__)
+        sgc = SeatGroupChronology.__new__(SeatGroupChronology)
+        sgc.__dict__.update(self.__dict__)
+        sgc.lazy = False
+        sgc.seatgroups = sgc._new_seatgroups()
+        for tp, sg in self.seatgroups.items():
+            sgc.seatgroups[tp] = sg.copy(copy_seats=copy_seats)
+        sgc.sorted_timepoints = list(self.sorted_timepoints)
+        sgc.meta = copy.copy(self.meta)
+        for attr in DERIVED_CHRONOLOGIES:
+            if getattr(self, attr) is not None:
+                setattr(sgc, attr, getattr(self, attr).copy(copy_seats=copy_seats))
+        return sgc
+
+    def to_arrays(self):
+        """
+        Return the chronology (including the chronologies from find_differences()) as a dict of numpy arrays and a
+        dict of JSON compatible information, for fast serialization.
+
+        Every seat at every timepoint is a row of a few contiguous arrays (indices into tables of locations and
+        listings, and availability), with timepoint offsets marking where each timepoint's seats start.  See
+        encode_seatgroups() for details.  Raises a SeatGroupError if any SeatGroup contains a SeatGroupFixedPrice.
+
+        :return: Tuple of (dict of {name: numpy array}, dict of information)
+        """
+        arrays, info = encode_seatgroups([self.seatgroups[tp] for tp in self.sorted_timepoints])
+        info['timepoints'] = [tp.isoformat() for tp in self.sorted_timepoints]
+        info['meta'] = encode_meta(self.meta)
+        info['seatgroup_class'] = self.seatgroup_class.__name__
+        info['derived'] = {}
+        for attr in DERIVED_CHRONOLOGIES:
+            sgc = getattr(self, attr)
+            if sgc is not None:
+                derived_arrays, info['derived'][attr] = sgc.to_arrays()
+                for name, a in derived_arrays.items():
+                    arrays[attr + '.' + name] = a
+        return arrays, info
+
+    @classmethod
+    def from_arrays(cls, arrays, info, lazy=False):
+        """
+        Return a new SeatGroupChronology from the arrays and information returned by to_arrays().
+
+        :param arrays: Dict of {name: numpy array} (arrays can be memory-mapped)
+        :param info: Dict of information
+        :param lazy: If True, return a lazy chronology that decodes each timepoint's SeatGroup from the arrays when it
+                     is first used (see LazySeatGroups), instead of decoding them all now
+        :return: SeatGroupChronology
+        """
+        sgc = cls(seatgroup_class=SEATGROUP_CLASSES[info['seatgroup_class']], lazy=lazy)
+        sgc.meta = decode_meta(info['meta'])
+        timepoints = [datetime.datetime.fromisoformat(tp) for tp in info['timepoints']]
+        if lazy:
+            # The timepoints were encoded in sorted order.  The loaders share the decoded location and listing tables
+            tables = {}
+            for i, tp in enumerate(timepoints):
+                sgc.seatgroups.register(tp, functools.partial(decode_seatgroup, arrays, info, i, tables,
+                                                              intern=sgc._listing_intern))
+            sgc.sorted_timepoints = timepoints
+            sgc._timepoint_index = None
+        else:
+            for tp, sg in zip(timepoints, decode_seatgroups(arrays, info, intern=sgc._listing_intern)):
+                sgc.add_seatgroup(tp, sg)
+        for attr, derived_info in info['derived'].items():
+            prefix = attr + '.'
+            derived_arrays = {name[len(prefix):]: a for name, a in arrays.items() if name.startswith(prefix)}
+            setattr(sgc, attr, cls.from_arrays(derived_arrays, derived_info, lazy=lazy))
+        return sgc
+
+    def save(self, path):
+        """
+        Save the chronology to directory path as one .npy file per array of to_arrays(), plus info.json.
+
+        Use SeatGroupChronology.load() to restore it.
+
+        :param path: Directory to save to (created if needed)
+        :return: None
+        """
+        arrays, info = self.to_arrays()
+        info['arrays'] = sorted(arrays)
+        os.makedirs(path, exist_ok=True)
+        for name, a in arrays.items():
+            np.save(os.path.join(path, name + '.npy'), a)
+        with open(os.path.join(path, 'info.json'), 'w') as f:
+            json.dump(info, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Load a chronology saved with save().
+
+        :param path: Directory the chronology was saved to
+        :param mmap_mode: (Optional) Memory-map the arrays instead of reading them (see numpy.load), eg: 'r'.  The
+                          chronology is then also lazy (see from_arrays()): each timepoint's SeatGroup is decoded from
+                          the memory-mapped arrays when it is first used, so loading does not read the seats
+        :return: SeatGroupChronology
+        """
+        with open(os.path.join(path, 'info.json'), 'r') as f:
+            info = json.load(f)
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in info['arrays']}
+        return cls.from_arrays(arrays, info, lazy=mmap_mode is not None)
+
+    def __reduce_ex__(self, protocol):
+        # Pickle as the arrays of to_arrays(), which is much smaller and faster than pickling every SeatGroup and Seat.
+        # Chronologies that cannot be written as arrays are pickled normally
+        try:
+            arrays, info = self.to_arrays()
+        except (SeatGroupError, TypeError, ValueError):
+            return super().__reduce_ex__(protocol)
+        return restore_seatgroupchronology, (type(self), arrays, info)
+
+    def display(self):
+        for tp in self.sorted_timepoints:
+            print(tp)
+            self.seatgroups[tp].display()
+
+    def add_seatgroup(self, timepoint, sg, update_names=None, update_meta=False):
+        """
+        Add a SeatGroup to the object, checking if another of the same timepoint already exists.
+
+        :param timepoint: datetime object identifying the SeatGroup (used as the key for storing data)
+        :param sg: SeatGroup to be added
+        :param update_names: If not None, invokes sg.update_names(update_names) to update any Seat names in the
+                             SeatGroup.  Useful for data munging.
+        :return: None
+        """
+        if timepoint in self.seatgroups:
+            raise DuplicateSeatError(
+                "Cannot add_seat SeatGroup at timepoint {0} - SeatGroup already exists with that timepoint".format(
+                    timepoint))
+        else:
+            if isinstance(timepoint, datetime.datetime):
+                self.seatgroups[timepoint] = sg
+                if update_names is not None:
+                    self.seatgroups[timepoint].update_names(update_names)
+                bisect.insort(self.sorted_timepoints, timepoint)
+                self._timepoint_index = None
+                # Check the metadata
+                if update_meta:
+                    if self.meta != None and self.meta != self.seatgroups[timepoint].meta:
+                        print(
+                            "WARNING: Seatgroup metadata '{0}' does not match past metadata '{1}'.  Metadata updated with most recent data".format(
+                                self.seatgroups[timepoint].meta, self.meta))
+                    self.meta = self.seatgroups[timepoint].meta
+            else:
+                raise SeatGroupError("Invalid timepoint {0} - must be a datetime object".format(timepoint))
+
+    def add_seatgroups_from_event_json(self, timepoints, json_files, update_names=None):
+        """
+        Add a seatgroup from a list of JSON formatted even files and their timepoint identifiers.
+
+        :param timepoints: See add_timepoint (similar version of this function)
+        :param json_files: See add_timepoint (similar version of this function)
+        :return: None
+        """
+        for timepoint, json_file in zip(timepoints, json_files):
+            self.add_seatgroup_from_event_json(timepoint, json_file, update_names=update_names)
+
+    def add_seatgroup_from_event_json(self, timepoint, json_file, update_names=None, verbose=False, ignore=None,
+                                      include=None):
+        """
+        Add a SeatGroup from a JSON formatted event file, identified by a timepoint key.
+
+        If the SGC is lazy, the file is only registered here and is parsed on first access.
+
+        :param timepoint: See add_seatgroup.
+        :param json_file: Filename of a JSON file with event listings data
+        :param update_names: See add_seatgroup
+        :param ignore: (Optional) List of locations to remove from the SeatGroup after loading it
+        :param include: (Optional) List of locations to keep in the SeatGroup after loading it (all others are removed)
+        :return: None
+        """
+        if verbose:
+            print("DEBUG: Adding timepoint {0} from file {1}".format(timepoint, json_file))
+        if self.lazy:
+            if timepoint in self.seatgroups:
+                raise DuplicateSeatError(
+                    "Cannot add_seat SeatGroup at timepoint {0} - SeatGroup already exists with that timepoint".format(
+                        timepoint))
+            if not isinstance(timepoint, datetime.datetime):
+                raise SeatGroupError("Invalid timepoint {0} - must be a datetime object".format(timepoint))
+            self.seatgroups.register(timepoint, functools.partial(self.load_seatgroup_from_event_json, json_file,
+                                                                  update_names=update_names, ignore=ignore,
+                                                                  include=include))
+            bisect.insort(self.sorted_timepoints, timepoint)
+            self._timepoint_index = None
+        else:
+            self.add_seatgroup(timepoint, self.load_seatgroup_from_event_json(json_file, update_names=update_names,
+                                                                              ignore=ignore, include=include))
+
+    def load_seatgroup_from_event_json(self, json_file, update_names=None, ignore=None, include=None):
+        """
+        Return a SeatGroup of seatgroup_class loaded from a JSON formatted event file.
+
+        :param json_file: Filename of a JSON file with event listings data
+        :param update_names: (Optional) Invokes sg.update_names(update_names) to update any Seat names
+        :param ignore: (Optional) List of locations to remove from the SeatGroup (if they exist)
+        :param include: (Optional) List of locations to keep in the SeatGroup (all others are removed)
+        :return: SeatGroup
+        """
+        sg = self.seatgroup_class.init_from_event_json(json_file, intern=self._listing_intern)
+        if update_names is not None:
+            sg.update_names(update_names)
+        for loc in ignore or []:
+            try:
+                sg.remove(loc, remove_deep_seats=True, cleanup_empty_groups=True)
+            except SeatGroupError:
+                pass
+        if include is not None:
+            sg = sg.get_seats_as_seatgroup(include, fail_if_missing=False)
+        return sg
+
+    def find_differences(self):
+        """
+        Compares all timepoints chronologically to determine sales, adds, price changes, and listings changes over time.
+
+        :return: None
+        """
+        self.added = self.new_like()
+        self.removed = self.new_like()
+        self.new_price = self.new_like()
+        self.new_listid = self.new_like()
+        for i in range(1, len(self.sorted_timepoints)):
+            this_t = self.sorted_timepoints[i]
+            prev_t = self.sorted_timepoints[i - 1]
+            # print("comparing {0} to {1}".format(this_t, prev_t))
+            diff = self.seatgroups[this_t].difference(self.seatgroups[prev_t])
+            self.added.add_seatgroup(this_t, diff['added'])
+            self.removed.add_seatgroup(this_t, diff['removed'])
+            self.new_price.add_seatgroup(this_t, diff['new_price'])
+            self.new_listid.add_seatgroup(this_t, diff['new_listid'])
+
+        # Apply some logic to figure out which removed tickets are sales:
+        #   - For any seat that is removed and then added again, assume the first removal is not a sale
+        #     (Removed again later means it was re-listed in between, so only the last removal of each seat is a sale.
+        #     See AvailabilityBitmap.sales())
+        self.sales = self.removed.copy()
+        bitmap = self.availability_bitmap()
+        sale_rows, sale_columns = bitmap.nonzero(bitmap.sales())
+        sales = set(zip(sale_columns.tolist(), [bitmap.locs[i] for i in sale_rows]))
+        for j in range(1, len(self.sorted_timepoints)):
+            sg = self.sales.seatgroups[self.sorted_timepoints[j]]
+            # Remove repeated seats from the seatgroup
+            for loc in [loc for loc in sg.get_locs() if (j, loc) not in sales]:
+                sg.remove(loc)
+        #   - Filter out "generic" seat numbers?
+
+    def calc_average_price_history(self, seat_locs=None, average_type='cumulative', moving_average_timedelta=None,
+                                   price_type='sales', filter_func=None, seat_patterns=None):
+        """
+        Returns a numpy record array of the history of average price for the SeatGroupChronology
+
+        :param seat_locs: (Optional) List of seat locations to include.  If neither seat_locs nor seat_patterns is
+                          given, all seats are included
+        :param seat_patterns: (Optional) List of location patterns (see SeatGroup.query_seats()).  If given, seats are
+                              selected with these patterns instead of seat_locs
+        :param average_type: The type of average to calculate:
+                                moving: a moving average over the last moving_average_timedelta period of time
+                                cumulative: an average over all results up to this timepoint
+        :param moving_average_timedelta: A timedelta object for the range of the moving average (default is 5 days),
+                                         or a list of timedelta objects to calculate moving averages for several
+                                         windows at once.  All timedeltas must be positive
+        :param price_type: The type of tickets to include in the average:
+                            sales: average tickets sold
+                            listed: average tickets listed
+                            filtered_sales: average filtered tickets sold
+        :param filter_func: TBD (some way to filter outliers.  Maybe a function that accepts list of prices and returns only
+                            the ones that meet some criteria?)
+        :return: Numpy record array of timepoint and price.  If average_type is moving and moving_average_timedelta
+                 is a list, returns a dict of {timedelta: numpy record array} with an entry for each timedelta
+        """
+        if moving_average_timedelta is None:
+            moving_average_timedelta = datetime.timedelta(days=5)
+        if isinstance(moving_average_timedelta, datetime.timedelta):
+            windows = [moving_average_timedelta]
+            return_windows = False
+        elif isinstance(moving_average_timedelta, (list, tuple)):
+            windows = list(moving_average_timedelta)
+            return_windows = True
+            if len(windows) == 0:
+                raise ValueError("moving_average_timedelta must include at least one timedelta")
+        else:
+            raise ValueError("moving_average_timedelta must be a datetime.timedelta object, list of them, or None")
+        for td in windows:
+            if not isinstance(td, datetime.timedelta):
+                raise ValueError("moving_average_timedelta must be a datetime.timedelta object, list of them, or None")
+            if td.total_seconds() < 0:
+                raise ValueError("moving_average_timedelta must be positive (was '{0}')".format(td.total_seconds()))
+
+        # The seats are only read (get_prices), so the slices reference the seats rather than copying them
+        if price_type == 'listed':
+            data = self
+        elif price_type == 'sales':
+            data = self.sales
+            # Add a try/catch here?  Make sales a property that initializes itself if needed?
+            # data = data.sales
+        else:
+            raise ValueError("Invalid value for price_type '{0}'".format(price_type))
+        if seat_patterns is not None:
+            data = data.query(seat_patterns)
+        elif seat_locs is not None:
+            data = data.get_seats(seat_locs)
+
+        # Slice to get only the seats requested, and filter out prices
+        # data = data.get_seats(seat_locs)
+        data = data.get_prices(f=filter_func)
+
+        # if price_type == 'listed':
+        #     data = self.get_prices(f=filter_func)
+        # elif price_type == 'sales':
+        #     data = self.sales.get_prices(f=filter_func)
+
+        # Group all data by timepoint, giving rows of (sum of prices, count of prices) for each unique timepoint
+        g = Groups(data['timepoint'])
+        tps_unique = g.keys
+        data = np.stack((g.sum(data['price']), g.count())).T
+
+        if average_type == 'cumulative':
+            data_cumsum = data.cumsum(axis=0)
+            # print('data_cumsum')
+            # pprint(data_cumsum)
+            avg = data_cumsum[:, 0] / data_cumsum[:, 1]
+            # print('avg (shape = {0}):'.format(avg.shape))
+            # pprint(avg)
+        elif average_type == 'moving':
+            # Prefix sums of (price sum, count) over the sorted timepoints.  The moving average at timepoint i over a
+            # window is then the difference between the prefix sums at i and at the first timepoint inside the window,
+            # so each window costs a single searchsorted
+            data_cumsum = np.concatenate((np.zeros((1, 2)), data.cumsum(axis=0)))
+            tps_dt64 = np.array(list(tps_unique), dtype='datetime64[us]')
+            i_end = np.arange(1, len(tps_unique) + 1)
+            avgs = {}
+            for td in windows:
+                i_start = np.searchsorted(tps_dt64, tps_dt64 - np.timedelta64(td), side='left')
+                window_sum = data_cumsum[i_end] - data_cumsum[i_start]
+                avgs[td] = np.rec.array([tps_unique, window_sum[:, 0] / window_sum[:, 1]],
+                                        dtype=[('timepoint', 'O'), ('price', 'float')])
+            if return_windows:
+                return avgs
+            else:
+                return avgs[windows[0]]
+
+        avg = np.rec.array([tps_unique, avg],
+                           dtype=[('timepoint', 'O'), ('price', 'float')])
+        return avg
+
+    def get_price_table(self):
+        """
+        Return the timepoint, location, and price of every seat in every SeatGroup in the chronology as flat columns.
+
+        Rows are ordered by timepoint, then in get_locs() order within each timepoint (the same order as get_prices()).
+        Unlike get_prices(), an empty chronology returns empty columns instead of raising an EmptySeatGroupError.
+
+        :return: Tuple of (numpy object array of timepoints, list of location tuples, numpy float array of prices)
+        """
+        timepoints = []
+        locs = []
+        prices = []
+        for tp in self.sorted_timepoints:
+            sg = self.seatgroups[tp]
+            these_locs = sg.get_locs()
+            timepoints.extend([tp] * len(these_locs))
+            locs.extend(these_locs)
+            prices.append(sg.get_prices())
+        timepoints_arr = np.empty(len(timepoints), dtype=object)
+        timepoints_arr[:] = timepoints
+        if len(prices) > 0:
+            prices = np.concatenate(prices)
+        else:
+            prices = np.array(())
+        return timepoints_arr, locs, prices
+
+    def to_matrix(self, locs=None, layout='auto', dense_threshold=0.5):
+        """
+        Return the prices of the chronology as a location by timepoint PriceMatrix, with a mask of availability.
+
+        Each row is the price path of one seat over the whole chronology, so changes over time become array operations
+        along rows, eg: for a dense matrix, prices[:, 1:] != prices[:, :-1] finds price changes and
+        available[:, :-1] & ~available[:, 1:] finds seats removed at each timepoint.
+
+        :param locs: (Optional) List of location tuples to use as the rows (seats at other locations are left out).  If
+                     None, the rows are every location in the chronology, sorted
+        :param layout: 'dense', 'csr' (compressed sparse rows, see PriceMatrix), or 'auto' to choose by fill
+        :param dense_threshold: For 'auto' layout, the fraction of the matrix that must be listed to use 'dense'
+        :return: PriceMatrix
+        """
+        if layout not in ['auto', 'dense', 'csr']:
+            raise ValueError("Invalid layout '{0}'".format(layout))
+        timepoints = list(self.sorted_timepoints)
+        if locs is None:
+            loc_ids = {}
+        else:
+            locs = list(locs)
+            loc_ids = {loc: i for i, loc in enumerate(locs)}
+
+        # (row, column, price) of each listed seat
+        rows = []
+        columns = []
+        prices = []
+        for j, tp in enumerate(timepoints):
+            sg = self.seatgroups[tp]
+            these_locs = sg.get_locs()
+            if locs is None:
+                rows.append(np.array([loc_ids.setdefault(loc, len(loc_ids)) for loc in these_locs], dtype=np.intp))
+            else:
+                rows.append(np.array([loc_ids.get(loc, -1) for loc in these_locs], dtype=np.intp))
+            columns.append(np.full(len(these_locs), j, dtype=np.intp))
+            prices.append(np.asarray(sg.get_prices(), dtype=float))
+        if len(timepoints) > 0:
+            rows = np.concatenate(rows)
+            columns = np.concatenate(columns)
+            prices = np.concatenate(prices)
+        else:
+            rows = np.zeros(0, dtype=np.intp)
+            columns = np.zeros(0, dtype=np.intp)
+            prices = np.zeros(0)
+        if locs is None:
+            # Rows in sorted location order
+            locs = sorted(loc_ids)
+            new_ids = np.empty(len(locs), dtype=np.intp)
+            new_ids[[loc_ids[loc] for loc in locs]] = np.arange(len(locs))
+            rows = new_ids[rows]
+        else:
+            keep = rows >= 0
+            rows, columns, prices = rows[keep], columns[keep], prices[keep]
+
+        shape = (len(locs), len(timepoints))
+        if layout == 'auto':
+            size = shape[0] * shape[1]
+            layout = 'dense' if size == 0 or len(prices) >= dense_threshold * size else 'csr'
+        if layout == 'dense':
+            dense_prices = np.full(shape, np.nan)
+            available = np.zeros(shape, dtype=bool)
+            dense_prices[rows, columns] = prices
+            available[rows, columns] = True
+            return PriceMatrix(timepoints, locs, 'dense', prices=dense_prices, available=available)
+        else:
+            order = np.lexsort((columns, rows))
+            indptr = np.zeros(shape[0] + 1, dtype=np.intp)
+            indptr[1:] = np.cumsum(np.bincount(rows, minlength=shape[0]))
+            return PriceMatrix(timepoints, locs, 'csr', indptr=indptr, indices=columns[order], data=prices[order])
+
+    def availability_bitmap(self):
+        """
+        Return the availability of every seat location at every timepoint as an AvailabilityBitmap.
+
+        :return: AvailabilityBitmap
+        """
+        return AvailabilityBitmap.from_matrix(self.to_matrix(layout='csr'))
+
+    def with_prices(self, prices):
+        """
+        Return a new SGC with copies of all seats, priced with prices.
+
+        Pairs with get_price_table() to reprice a whole chronology with one vectorized operation, eg:
+            timepoints, locs, prices = sgc.get_price_table()
+            sgc_half = sgc.with_prices(prices / 2.0)
+
+        :param prices: Array-like of prices, one for each seat in get_price_table() order
+        :return: SeatGroupChronology
+        """
+        prices = np.asarray(prices, dtype=float)
+        sgc = self.new_like()
+        sgc.meta = self.meta
+        start = 0
+        for tp in self.sorted_timepoints:
+            sg = self.seatgroups[tp]
+            locs = sg.get_locs()
+            seats = sg.get_seats_as_list(locs, copy_seats=True)
+            if start + len(seats) > len(prices):
+                raise ValueError("Got {0} prices for a chronology with more seats".format(len(prices)))
+            for seat, price in zip(seats, prices[start:start + len(seats)].tolist()):
+                seat.price = price
+            newsg = type(sg)()
+            newsg.add_seats(locs, seats)
+            start += len(seats)
+            sgc.add_seatgroup(tp, newsg)
+        if start != len(prices):
+            raise ValueError("Got {0} prices for a chronology with {1} seats".format(len(prices), start))
+        return sgc
+
+    def resample(self, freq, depth=None, groups=None, sales=None):
+        """
+        Aggregate the chronology into time buckets, optionally split by location prefix or by named groups of seats.
+
+        Each bucket starts at a multiple of freq (measured from 1970-01-01, so daily buckets start at midnight and
+        hourly buckets on the hour) and includes all timepoints in [start, start + freq).  Listing statistics for a
+        bucket are:
+            open: mean listed price at the first timepoint in the bucket with listings
+            close: mean listed price at the last timepoint in the bucket with listings
+            min, max, mean: over every listed seat at every timepoint in the bucket
+            listed: number of seats listed at the last timepoint in the bucket
+            sales: number of seats in sales at timepoints in the bucket
+        Buckets with sales but no listings have NaN prices and listed == 0.
+
+        :param freq: timedelta object for the size of each bucket, eg: datetime.timedelta(hours=1)
+        :param depth: If not None, group seats by the first depth levels of their location (eg: depth=1 for section)
+        :param groups: If not None, dict of {group_name: list of location tuples} to group seats by (same format as
+                       match_locs_to_groups()).  Seats not in any group are excluded.  Takes precedence over depth
+        :param sales: SeatGroupChronology of sales to count (default is self.sales, if find_differences has been run)
+        :return: numpy record array with one row per (bucket, group) and columns of timepoint (bucket start), group,
+                 open, close, min, max, mean, listed, and sales.  group is 'All' if neither depth nor groups are given
+        """
+        if not isinstance(freq, datetime.timedelta) or freq.total_seconds() <= 0:
+            raise ValueError("freq must be a positive datetime.timedelta object (was '{0}')".format(freq))
+        freq = np.timedelta64(freq).astype('timedelta64[us]')
+        if sales is None:
+            sales = self.sales
+
+        def bucket_table(sgc):
+            # Return (bucket index, timepoint, group, price) columns for every seat in sgc
+            timepoints, locs, prices = sgc.get_price_table()
+            if groups is not None:
+                rows, keys = match_locs_to_groups(locs, groups)
+            elif depth is not None:
+                rows = np.arange(len(locs))
+                keys = object_array([loc[:depth] for loc in locs])
+            else:
+                rows = np.arange(len(locs))
+                keys = object_array(['All'] * len(locs))
+            tps = timepoints[rows].astype('datetime64[us]')
+            buckets = (tps - np.datetime64(0, 'us')) // freq
+            return buckets, tps, keys, prices[rows]
+
+        # Listing statistics.  First reduce to one row per (bucket, group, timepoint), then to one per (bucket, group)
+        buckets, tps, keys, prices = bucket_table(self)
+        by_tp = Groups(buckets, keys, tps)
+        tp_mean = by_tp.mean(prices)
+        tp_count = by_tp.count()
+        tp_buckets, tp_keys, tp_tps = by_tp.keys
+        by_bucket_tp = Groups(tp_buckets, tp_keys)
+        by_bucket = Groups(buckets, keys)
+
+        # Last timepoint of every bucket, to know whether a group's last listings are at the end of its bucket
+        all_tps = self.timepoint_index
+        all_buckets = (all_tps - np.datetime64(0, 'us')) // freq
+        by_all_buckets = Groups(all_buckets)
+        bucket_last_tp = by_all_buckets.last(all_tps)
+        i_bucket = np.searchsorted(by_all_buckets.keys, by_bucket_tp.keys[0])
+        at_end = by_bucket_tp.last(tp_tps) == bucket_last_tp[i_bucket]
+
+        listing_stats = dict(zip(zip(by_bucket.keys[0].tolist(), list(by_bucket.keys[1])),
+                                 zip(by_bucket_tp.first(tp_mean), by_bucket_tp.last(tp_mean),
+                                     by_bucket.min(prices), by_bucket.max(prices), by_bucket.mean(prices),
+                                     np.where(at_end, by_bucket_tp.last(tp_count), 0))))
+
+        # Sales counts
+        sales_counts = {}
+        if sales is not None:
+            s_buckets, s_tps, s_keys, s_prices = bucket_table(sales)
+            by_sales_bucket = Groups(s_buckets, s_keys)
+            sales_counts = dict(zip(zip(by_sales_bucket.keys[0].tolist(), list(by_sales_bucket.keys[1])),
+                                    by_sales_bucket.count()))
+
+        empty_stats = (np.nan, np.nan, np.nan, np.nan, np.nan, 0)
+        data = []
+        for bucket, key in sorted(listing_stats.keys() | sales_counts.keys()):
+            bucket_start = (np.datetime64(0, 'us') + bucket * freq).astype(datetime.datetime)
+            data.append((bucket_start, key, *listing_stats.get((bucket, key), empty_stats),
+                         sales_counts.get((bucket, key), 0)))
+        # Build through np.array so an empty result is still a valid (empty) record array
+        return np.rec.array(np.array(data,
+                                     dtype=[('timepoint', 'O'), ('group', 'O'), ('open', 'float'), ('close', 'float'),
+                                            ('min', 'float'), ('max', 'float'), ('mean', 'float'), ('listed', 'int'),
+                                            ('sales', 'int')]))
+
+    def get_lens(self):
+        """
+        Return a numpy array with rows of (timepoint, len(SG@timepoint)).
+
+        :return:
+        """
+        lens = [None] * len(self.sorted_timepoints)
+        # lens = np.empty((len(self.sorted_timepoints), 2))
+
+        for i, t in enumerate(self.sorted_timepoints):
+            # lens[i, :] = (t, len(self.seatgroups[t]))
+            lens[i] = (t, len(self.seatgroups[t]))
+        return np.array(lens)
+
+    def get_prices(self, f = None, return_type='numpy'):
+        """
+
+        Future: Merge all price_type scalar options into the same returned numpy record array?  Would save computation,
+                but mess with the sgc return type option (multiple entries with min, max, avg in a SGC would be
+                impossible to use).
+
+        :param f:   Function to be applied to the prices returned for each timepoint's SeatGroup.  Default is None,
+                    which returns all prices.  Other options could be np.min (min price in each SG), np.max, np.average.
                     Note: This function is only appled if len(prices) returned from the SG is greater than zero.
         :param return_type: Type of data to be returned:
                                 numpy: a numpy record array with columns of timepoint and price (note that if
@@ -1008,12 +2401,7 @@ class SeatGroupChronology(object):
         This number is not the number of unique seats - if the same seat location is included in two SeatGroups it is
         counted twice.
         """
-        lens = self.get_lens()
-        if len(lens) > 0:
-            length = lens[:,1].sum()
-        else:
-            length = 0
-        return length
+        return sum(len(sg) for sg in self.seatgroups.values())
 
     def math_operation(self, other, operation='add', seat_locs=None, preserve_unreferenced_seats=False, inplace=False):
         """
@@ -1030,18 +2418,19 @@ class SeatGroupChronology(object):
         if inplace:
             new_sgc = self
         else:
-            new_sgc = copy.deepcopy(self)
+            new_sgc = self.copy()
         for tp in new_sgc.sorted_timepoints:
-            new_sgc.seatgroups[tp].math_operation(other, operation=operation, seat_locs=seat_locs,
-                                                  preserve_unreferenced_seats=preserve_unreferenced_seats,
-                                                  inplace=inplace)
+            new_sgc.seatgroups[tp] = new_sgc.seatgroups[tp].math_operation(
+                other, operation=operation, seat_locs=seat_locs,
+                preserve_unreferenced_seats=preserve_unreferenced_seats, inplace=inplace)
         return new_sgc
 
     def __getitem__(self, t, single_type='nearest'):
         """
         Get one or more elements of the SeatGroupChronology
 
-        A single entry is returned as a SeatGroup, whereas a slice is returned as a new SGC
+        A single entry is returned as a SeatGroup, whereas a slice is returned as a new SGC.  Either way the returned
+        SeatGroups are copies (see SeatGroup.copy()) that share their Seats with this SGC
 
         Future: Interpret the step variable of the slice to return a series of SGC's with the slice.
         Future: Make companion get that returns just the timepoint that meets the single get criteria (that way you can
@@ -1064,14 +2453,29 @@ class SeatGroupChronology(object):
         if isinstance(t, datetime.datetime):
             # Single timepoint, return single seatgroup
             t_nearest = self.get_timepoint(t, single_type=single_type)
-            return copy.deepcopy(self.seatgroups[t_nearest])
+            return self.seatgroups[t_nearest].copy()
         else:
             return self.get_timepoints_as_seatgroupchronology(dt_slice=t)
 
+    @property
+    def timepoint_index(self):
+        """
+        Return the timepoints as a numpy datetime64[us] array, in the same order as sorted_timepoints.
+
+        Built on first use after timepoints are added.  Timepoints must be naive datetimes.
+
+        :return: Numpy datetime64 array
+        """
+        if self._timepoint_index is None or len(self._timepoint_index) != len(self.sorted_timepoints):
+            self._timepoint_index = to_datetime64(self.sorted_timepoints)
+        return self._timepoint_index
+
     def get_timepoint(self, t, single_type='nearest'):
         """
         Return a the timepoint datetime object in the SeatGroupChronology nearest to t
 
+        See get_timepoint_indices() to look up many times at once.
+
         :param t: A datetime object
         :param single_type: Mode to assess nearest timepoint:
                                 exact: (Kind of useless... but a binding to check if something is in the SGC) Returns
@@ -1084,31 +2488,47 @@ class SeatGroupChronology(object):
                                 a SeatGroupError exception.
         :return: a single timepoint or a list of timepoints (the datetime objects)
         """
-
-        # Interpret single timepoint.  Not sure why I'd actually use exact, but still...  Guess it is a sort of
-        # safe and similarly API'd validation method?
-        if single_type == 'exact':
-            if t in self.sorted_timepoints:
-                t_ret = t
-            else:
+        i = self.get_timepoint_indices([t], single_type=single_type)[0]
+        if i < 0:
+            if single_type == 'exact':
                 raise SeatGroupError("Timepoint {0} not in SeatGroupChronology".format(t))
-        elif single_type == 'nearest':
-            t_ret = nearest_value(self.sorted_timepoints, t)
-        elif single_type == 'left':
-            i = bisect.bisect_right(self.sorted_timepoints, t)
-            if i == 0:
-                # Special case at the beginning
-                raise KeyError("No timepoint to the left of {0}".format(t))
+            elif single_type == 'nearest':
+                raise IndexError("No timepoints in SeatGroupChronology")
             else:
-                t_ret = self.sorted_timepoints[i - 1]
+                raise KeyError("No timepoint to the {0} of {1}".format(single_type, t))
+        return self.sorted_timepoints[i]
+
+    def get_timepoint_indices(self, ts, single_type='nearest'):
+        """
+        Return the index (into sorted_timepoints and timepoint_index) of the timepoint matching each of many times.
+
+        Vectorized version of get_timepoint() that resolves all times with one search of timepoint_index, eg: to align
+        a chronology to a grid of times:
+            i = sgc.get_timepoint_indices(grid)
+            aligned = sgc.timepoint_index[i]
+
+        :param ts: List of datetime objects or numpy datetime64 array
+        :param single_type: Mode to match timepoints (see get_timepoint()).  Ties in nearest go to the earlier timepoint
+        :return: Numpy int array of indices, one for each t, with -1 where no timepoint matches (for exact, left, or
+                 right, or if the SGC is empty)
+        """
+        index = self.timepoint_index
+        ts = to_datetime64(ts)
+        n = len(index)
+        if single_type not in ['exact', 'nearest', 'left', 'right']:
+            raise ValueError("Invalid single_type '{0}'".format(single_type))
+        if n == 0:
+            return np.full(len(ts), -1, dtype=np.intp)
+        if single_type == 'exact':
+            i = np.minimum(np.searchsorted(index, ts, side='left'), n - 1)
+            return np.where(index[i] == ts, i, -1)
+        elif single_type == 'left':
+            return np.searchsorted(index, ts, side='right') - 1
         elif single_type == 'right':
-            i = bisect.bisect_left(self.sorted_timepoints, t)
-            if i == len(self.sorted_timepoints):
-                # Special case at the beginning
-                raise KeyError("No timepoint to the right of {0}".format(t))
-            else:
-                t_ret = self.sorted_timepoints[i]
-        return t_ret
+            i = np.searchsorted(index, ts, side='left')
+            return np.where(i < n, i, -1)
+        else:
+            return nearest_indices(index, ts)
 
     def get_timepoints(self, dt_slice):
         """
@@ -1128,7 +2548,7 @@ class SeatGroupChronology(object):
         """
         return dt_list_arange(self.sorted_timepoints, dt_slice)
 
-    def get_timepoints_as_seatgroupchronology(self, dt_slice):
+    def get_timepoints_as_seatgroupchronology(self, dt_slice, copy_seats=False):
         """
         Returns a slice of timepoints from the SGC in new SGC, including all or evenly spaced timepoints in that range.
 
@@ -1142,12 +2562,13 @@ class SeatGroupChronology(object):
                                nearest timepoint between start and stop will be returned for each step.
                                If None, all data within the range is returned.
                                NOTE: Step can be negative, so long as start > stop
+        :param copy_seats: If True, return copies of the seats instead of references
         :return: A SeatGroupChronology instance
         """
         timepoints = self.get_timepoints(dt_slice)
-        sgc_new = SeatGroupChronology()
+        sgc_new = self.new_like()
         for tp in timepoints:
-            sgc_new.add_seatgroup(tp, copy.deepcopy(self.seatgroups[tp]))
+            sgc_new.add_seatgroup(tp, self.seatgroups[tp].copy(copy_seats=copy_seats))
         return sgc_new
 
     def get_seats(self, seat_locs, copy_seats=False):
@@ -1157,12 +2578,65 @@ class SeatGroupChronology(object):
         :param seat_locs: List of location tuples of the format required by SeatGroup.get_seats_as_seatgroup()
         :return: SeatGroupChronology type object
         """
-        sgc = SeatGroupChronology()
+        sgc = self.new_like()
         for tp in self.sorted_timepoints:
             sg = self.seatgroups[tp].get_seats_as_seatgroup(seat_locs, fail_if_missing=False, copy_seats=copy_seats)
             sgc.add_seatgroup(tp, sg)
         return sgc
 
+    def query(self, patterns, copy_seats=False):
+        """
+        Return a new SGC that contains data for all timepoints but only for seats matching the location patterns.
+
+        See SeatGroup.query_seats() for the pattern format.
+
+        :param patterns: List of location pattern tuples
+        :return: SeatGroupChronology type object
+        """
+        sgc = self.new_like()
+        for tp in self.sorted_timepoints:
+            sgc.add_seatgroup(tp, self.seatgroups[tp].query(patterns, copy_seats=copy_seats))
+        return sgc
+
+    def partition(self, mapping, copy_seats=False):
+        """
+        Split the chronology into one SGC per key of mapping, each with only the seats matching that key's patterns.
+
+        Equivalent to {key: self.query(patterns) for key, patterns in mapping.items()}, but walks the chronology once
+        rather than once per key.  A seat matching more than one key is included in each of them.
+
+        :param mapping: Dict of {key: list of location pattern tuples} (see SeatGroup.query_seats()).  Full location
+                        tuples are valid patterns, so a list of seat locations can also be used
+        :param copy_seats: If True, the new SGCs contain copies of the seats instead of references
+        :return: Dict of {key: SeatGroupChronology}, with every timepoint of this SGC in each
+        """
+        keys = list(mapping)
+        for key in keys:
+            for pattern in mapping[key]:
+                if not isinstance(pattern, tuple):
+                    raise SeatGroupError("Invalid pattern {0} - must be a tuple".format(pattern))
+        # Keys matching each location seen, as they are found
+        loc_keys = {}
+        parts = {key: self.new_like() for key in keys}
+        for tp in self.sorted_timepoints:
+            sg = self.seatgroups[tp]
+            locs = sg.get_locs()
+            found = {key: ([], []) for key in keys}
+            for loc, seat in zip(locs, sg.get_seats_as_list(locs)):
+                try:
+                    these_keys = loc_keys[loc]
+                except KeyError:
+                    these_keys = [key for key in keys if loc_matches(loc, mapping[key])]
+                    loc_keys[loc] = these_keys
+                for key in these_keys:
+                    found[key][0].append(loc)
+                    found[key][1].append(seat.copy() if copy_seats else seat)
+            for key, (key_locs, seats) in found.items():
+                newsg = self.seatgroup_class()
+                newsg.add_seats(key_locs, seats)
+                parts[key].add_seatgroup(tp, newsg)
+        return parts
+
     def get_locs(self, seat_locs=None, depth=None):
         """
         Returns a list of tuples identifying all the seats in any SeatGroup within this Chronology.
@@ -1198,6 +2672,419 @@ class SeatGroupChronology(object):
         return np_describe(prices)
 
 
+class RollingSeatGroupChronology(SeatGroupChronology):
+    """
+    SeatGroupChronology of only the most recent snapshots of an event, for continuously monitoring live prices.
+
+    Snapshots must be added in chronological order (eg: as the scraper writes new files, see add_timepoints()).  After
+    each is added, snapshots older than horizon before the newest are evicted, so memory and the cost of each update
+    stay constant no matter how long the event has been tracked.
+
+    The chronologies of find_differences() (added, removed, new_price, new_listid, sales) are kept up to date as each
+    snapshot is added, and are evicted with the snapshots.  Sales at retained timepoints are the same as
+    find_differences() gives for the whole event.  Running aggregates are kept for all seats ('All') and for each
+    named group of seats:
+        moving_averages(): average sales price over each of moving_average_timedeltas ending at the newest timepoint
+        min_available(): history of the cheapest listed price at each retained timepoint
+    """
+    def __init__(self, horizon, groups=None, moving_average_timedeltas=None, **kwargs):
+        """
+        :param horizon: Timedelta.  Snapshots older than this before the newest snapshot are evicted
+        :param groups: (Optional) Dict of {group name: list of location patterns} (see SeatGroup.query_seats()) to keep
+                       aggregates for, in addition to 'All' seats
+        :param moving_average_timedeltas: (Optional) List of timedeltas for moving averages (default is 5 days).  Each
+                                          must be positive and no longer than horizon
+        :param kwargs: Passed to SeatGroupChronology (seatgroup_class, max_resident_nbytes, spill_dir).  The change
+                       data chronologies are made with the same settings (see new_like())
+        """
+        super().__init__(**kwargs)
+        if horizon.total_seconds() <= 0:
+            raise ValueError("horizon must be positive (was '{0}')".format(horizon.total_seconds()))
+        if moving_average_timedeltas is None:
+            moving_average_timedeltas = [datetime.timedelta(days=5)]
+        for td in moving_average_timedeltas:
+            if td.total_seconds() <= 0 or td > horizon:
+                raise ValueError("moving_average_timedeltas must be positive and no longer than horizon (was "
+                                 "'{0}')".format(td.total_seconds()))
+        self.horizon = horizon
+        self.groups = {} if groups is None else dict(groups)
+        self.group_names = ['All'] + sorted(self.groups)
+        self.moving_average_timedeltas = list(dict.fromkeys(moving_average_timedeltas))
+        self.added = self.new_like()
+        self.removed = self.new_like()
+        self.new_price = self.new_like()
+        self.new_listid = self.new_like()
+        self.sales = self.new_like()
+
+        # Group ids (indices into group_names) of each location seen
+        self._loc_groups = {}
+        # Timepoint of the current sale of each seat location, so it can be retracted if the seat is sold again
+        self._last_sale = {}
+        # Rows of (sum of sales prices, count of priced sales) by group, for each retained timepoint in order
+        self._sales_timepoints = []
+        self._sales_rows = {}
+        # Running (sum, count) rows over each moving average window, and the index into _sales_timepoints where each
+        # window starts
+        self._window_rows = {td: np.zeros((2, len(self.group_names))) for td in self.moving_average_timedeltas}
+        self._window_starts = {td: 0 for td in self.moving_average_timedeltas}
+        # Cheapest listed price by group, for each retained timepoint
+        self._min_available = {}
+
+    def __reduce_ex__(self, protocol):
+        # The running aggregates are not included in to_arrays(), so pickle normally
+        return object.__reduce_ex__(self, protocol)
+
+    def add_seatgroup(self, timepoint, sg, update_names=None, update_meta=False):
+        """
+        Add the newest SeatGroup, updating the change data and aggregates and evicting any expired snapshots.
+
+        See SeatGroupChronology.add_seatgroup().  timepoint must be after every timepoint already added.
+        """
+        if len(self.sorted_timepoints) > 0 and isinstance(timepoint, datetime.datetime) and \
+                timepoint <= self.sorted_timepoints[-1]:
+            raise SeatGroupError("Invalid timepoint {0} - must be after the newest timepoint {1}".format(
+                timepoint, self.sorted_timepoints[-1]))
+        super().add_seatgroup(timepoint, sg, update_names=update_names, update_meta=update_meta)
+        self._update(timepoint)
+        self._evict(timepoint - self.horizon)
+
+    def add_timepoints(self, tp_map, update_names=None, ignore=None, include=None):
+        """
+        Add any new timepoints from a map of {timepoint: JSON file}, eg: to follow the scraper's output directory:
+            sgc.add_timepoints(find_listings_files(directory)[eventid])
+
+        Timepoints that are not after the newest timepoint (including any already added or evicted) are skipped.
+
+        :param tp_map: Dict of {timepoint: filename of a JSON file with event listings data}
+        :param update_names: See add_seatgroup_from_event_json()
+        :param ignore: See add_seatgroup_from_event_json()
+        :param include: See add_seatgroup_from_event_json()
+        :return: List of the timepoints added
+        """
+        added = []
+        for tp in sorted(tp_map):
+            if len(self.sorted_timepoints) == 0 or tp > self.sorted_timepoints[-1]:
+                self.add_seatgroup_from_event_json(tp, tp_map[tp], update_names=update_names, ignore=ignore,
+                                                   include=include)
+                added.append(tp)
+        return added
+
+    def find_differences(self):
+        """
+        Does nothing, as the change data is kept up to date as each SeatGroup is added (and evicted snapshots can no
+        longer be compared).
+
+        :return: None
+        """
+        pass
+
+    def moving_averages(self):
+        """
+        Return the average sales price of each group over each moving average window ending at the newest timepoint.
+
+        Windows include the timepoints at or after (newest timepoint - timedelta), the same as the moving averages of
+        calc_average_price_history().
+
+        :return: Dict of {timedelta: {group name: average price (NaN if no sales in the window)}}
+        """
+        avgs = {}
+        for td, (sums, counts) in self._window_rows.items():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                prices = sums / counts
+            avgs[td] = {name: float(prices[i]) if counts[i] > 0 else np.nan for i, name in enumerate(self.group_names)}
+        return avgs
+
+    def min_available(self):
+        """
+        Return the history of the cheapest listed price of each group over the retained timepoints.
+
+        :return: Dict of {group name: numpy record array of timepoint and price (NaN where no seats are listed)}
+        """
+        tps = list(self.sorted_timepoints)
+        mins = np.array([self._min_available[tp] for tp in tps]).reshape(len(tps), len(self.group_names))
+        return {name: np.rec.fromarrays([object_array(tps), mins[:, i]], dtype=[('timepoint', 'O'), ('price', 'float')])
+                for i, name in enumerate(self.group_names)}
+
+    def _groups_of(self, loc):
+        # Numpy array of the group ids of a seat location
+        try:
+            return self._loc_groups[loc]
+        except KeyError:
+            ids = [0] + [i + 1 for i, name in enumerate(self.group_names[1:])
+                         if loc_matches(loc, self.groups[name])]
+            self._loc_groups[loc] = np.array(ids, dtype=np.intp)
+            return self._loc_groups[loc]
+
+    def _update(self, timepoint):
+        # Update the change data and aggregates for a newly added timepoint
+        sg = self.seatgroups[timepoint]
+        n_groups = len(self.group_names)
+        mins = np.full(n_groups, np.inf)
+        locs = sg.get_locs()
+        # Unpriced seats are None from SeatGroup.get_prices() and NaN from FlatSeatGroup.get_prices()
+        for loc, price in zip(locs, np.asarray(sg.get_prices(), dtype=float).tolist()):
+            if not np.isnan(price):
+                ids = self._groups_of(loc)
+                mins[ids] = np.minimum(mins[ids], price)
+        mins[np.isinf(mins)] = np.nan
+        self._min_available[timepoint] = mins
+
+        if len(self.sorted_timepoints) < 2:
+            return
+        diff = sg.difference(self.seatgroups[self.sorted_timepoints[-2]])
+        self.added.add_seatgroup(timepoint, diff['added'])
+        self.removed.add_seatgroup(timepoint, diff['removed'])
+        self.new_price.add_seatgroup(timepoint, diff['new_price'])
+        self.new_listid.add_seatgroup(timepoint, diff['new_listid'])
+        sales = diff['removed'].copy()
+        self.sales.add_seatgroup(timepoint, sales)
+
+        row = np.zeros((2, n_groups))
+        locs = sales.get_locs()
+        for loc, seat in zip(locs, sales.get_seats_as_list(locs)):
+            # A seat removed again was relisted since it was last removed, so that removal was not a sale (see
+            # find_differences())
+            if loc in self._last_sale:
+                self._retract_sale(loc, self._last_sale[loc])
+            self._last_sale[loc] = timepoint
+            if seat.price is not None:
+                ids = self._groups_of(loc)
+                row[0, ids] += seat.price
+                row[1, ids] += 1
+        self._sales_timepoints.append(timepoint)
+        self._sales_rows[timepoint] = row
+
+        # Slide the moving average windows forward
+        for td in self.moving_average_timedeltas:
+            window = self._window_rows[td]
+            window += row
+            start = self._window_starts[td]
+            while self._sales_timepoints[start] < timepoint - td:
+                window -= self._sales_rows[self._sales_timepoints[start]]
+                start += 1
+            self._window_starts[td] = start
+
+    def _retract_sale(self, loc, timepoint):
+        # Remove the sale of loc at timepoint from sales and the aggregates
+        seat = self.sales.seatgroups[timepoint].get_seats_as_list([loc])[0]
+        self.sales.seatgroups[timepoint].remove(loc)
+        del self._last_sale[loc]
+        if seat.price is None:
+            return
+        delta = np.zeros((2, len(self.group_names)))
+        ids = self._groups_of(loc)
+        delta[0, ids] = seat.price
+        delta[1, ids] = 1
+        self._sales_rows[timepoint] -= delta
+        # Remove it from the windows that include it as they are now (before they slide forward to the new timepoint)
+        i = bisect.bisect_left(self._sales_timepoints, timepoint)
+        for td in self.moving_average_timedeltas:
+            if i >= self._window_starts[td]:
+                self._window_rows[td] -= delta
+
+    def _evict(self, before):
+        # Remove all timepoints before datetime before from this and the change data
+        n = bisect.bisect_left(self.sorted_timepoints, before)
+        for tp in self.sorted_timepoints[:n]:
+            del self.seatgroups[tp]
+            del self._min_available[tp]
+        del self.sorted_timepoints[:n]
+        for sgc in [self.added, self.removed, self.new_price, self.new_listid, self.sales]:
+            n_derived = bisect.bisect_left(sgc.sorted_timepoints, before)
+            for tp in sgc.sorted_timepoints[:n_derived]:
+                del sgc.seatgroups[tp]
+            del sgc.sorted_timepoints[:n_derived]
+            sgc._timepoint_index = None
+        self._timepoint_index = None
+
+        # Expired sales can no longer be retracted.  Windows are no longer than horizon, so none include them
+        n = bisect.bisect_left(self._sales_timepoints, before)
+        for tp in self._sales_timepoints[:n]:
+            del self._sales_rows[tp]
+        if n > 0:
+            del self._sales_timepoints[:n]
+            for td in self.moving_average_timedeltas:
+                self._window_starts[td] -= n
+            self._last_sale = {loc: tp for loc, tp in self._last_sale.items() if tp >= before}
+
+
+class PriceMatrix(object):
+    """
+    Location by timepoint matrix of prices from a SeatGroupChronology (see SeatGroupChronology.to_matrix()).
+
+    Row i is locs[i] and column j is timepoints[j].  available[i, j] is True where the seat at locs[i] is listed at
+    timepoints[j] (its price may still be NaN if the listing has no price).  The matrix is stored either:
+        dense: prices (float, NaN where not available) and available (bool) are 2D numpy arrays
+        csr: compressed sparse rows, where the listed entries of row i are columns indices[indptr[i]:indptr[i+1]] with
+             prices data[indptr[i]:indptr[i+1]] (columns in increasing order)
+    """
+    def __init__(self, timepoints, locs, layout, prices=None, available=None, indptr=None, indices=None, data=None):
+        """
+        :param timepoints: Sorted list of datetime objects (the columns)
+        :param locs: List of location tuples (the rows)
+        :param layout: 'dense' or 'csr'
+        :param prices: (dense) 2D numpy float array of prices
+        :param available: (dense) 2D numpy bool array of availability
+        :param indptr: (csr) Numpy int array of the start of each row in indices and data, plus the end of the last row
+        :param indices: (csr) Numpy int array of the column of each entry
+        :param data: (csr) Numpy float array of the price of each entry
+        """
+        if layout not in ['dense', 'csr']:
+            raise ValueError("Invalid layout '{0}'".format(layout))
+        self.timepoints = timepoints
+        self.locs = locs
+        self.loc_index = {loc: i for i, loc in enumerate(locs)}
+        self.layout = layout
+        self.prices = prices
+        self.available = available
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def shape(self):
+        return len(self.locs), len(self.timepoints)
+
+    @property
+    def nnz(self):
+        """
+        Number of (location, timepoint) entries where the seat is listed
+        """
+        if self.layout == 'dense':
+            return int(self.available.sum())
+        else:
+            return len(self.data)
+
+    def to_dense(self):
+        """
+        Return the matrix as dense arrays.
+
+        :return: Tuple of (2D numpy float array of prices (NaN where not available), 2D numpy bool array of
+                 availability)
+        """
+        if self.layout == 'dense':
+            return self.prices, self.available
+        rows = np.repeat(np.arange(len(self.locs)), np.diff(self.indptr))
+        prices = np.full(self.shape, np.nan)
+        available = np.zeros(self.shape, dtype=bool)
+        prices[rows, self.indices] = self.data
+        available[rows, self.indices] = True
+        return prices, available
+
+    def price_path(self, loc):
+        """
+        Return the prices of one seat location at each timepoint it is listed.
+
+        :param loc: Location tuple
+        :return: Numpy record array of timepoint and price
+        """
+        i = self.loc_index[loc]
+        if self.layout == 'dense':
+            columns = np.flatnonzero(self.available[i])
+            prices = self.prices[i, columns]
+        else:
+            columns = self.indices[self.indptr[i]:self.indptr[i + 1]]
+            prices = self.data[self.indptr[i]:self.indptr[i + 1]]
+        return np.rec.fromarrays([object_array([self.timepoints[j] for j in columns]), prices],
+                                 dtype=[('timepoint', 'O'), ('price', 'float')])
+
+
+class AvailabilityBitmap(object):
+    """
+    Availability of every seat location at every timepoint of a SeatGroupChronology, as one row of bits per location
+    (see SeatGroupChronology.availability_bitmap()).
+
+    Row i is locs[i], and bit j of a row (numpy.packbits order, so bit j is in byte j // 8) is timepoints[j].  Changes
+    in availability are bitwise operations between each row and itself shifted by one timepoint:
+        removals(): 1 -> 0 transitions (listed at the previous timepoint, not at this one)
+        additions(): 0 -> 1 transitions (not listed at the previous timepoint, listed at this one), eg: re-listings
+        sales(): the removals that find_differences() counts as sales (each location's last removal)
+    All return bit arrays of the same shape as bits, which can be unpacked with nonzero().
+    """
+    def __init__(self, timepoints, locs, bits):
+        """
+        :param timepoints: Sorted list of datetime objects
+        :param locs: List of location tuples
+        :param bits: 2D numpy uint8 array of shape (len(locs), ceil(len(timepoints) / 8)) of packed availability bits
+        """
+        self.timepoints = timepoints
+        self.locs = locs
+        self.loc_index = {loc: i for i, loc in enumerate(locs)}
+        self.bits = bits
+        # Masks of the bits that are timepoints (not the padding at the end of each row), and of those after the first
+        self._valid = np.packbits(np.ones(len(timepoints), dtype=bool))
+        self._after_first = np.packbits(np.arange(len(timepoints)) > 0)
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """
+        Return the availability of a PriceMatrix as an AvailabilityBitmap.
+
+        :param matrix: PriceMatrix
+        :return: AvailabilityBitmap
+        """
+        n_locs, n_timepoints = matrix.shape
+        bits = np.zeros((n_locs, (n_timepoints + 7) // 8), dtype=np.uint8)
+        if matrix.layout == 'dense':
+            rows, columns = np.nonzero(matrix.available)
+        else:
+            rows = np.repeat(np.arange(n_locs), np.diff(matrix.indptr))
+            columns = matrix.indices
+        np.bitwise_or.at(bits, (rows, columns // 8), (0x80 >> (columns % 8)).astype(np.uint8))
+        return cls(matrix.timepoints, matrix.locs, bits)
+
+    def previous(self):
+        """
+        Return the bits shifted forward one timepoint, so bit j is the availability at timepoint j - 1 (bit 0 is 0).
+        """
+        shifted = self.bits >> 1
+        shifted[:, 1:] |= (self.bits[:, :-1] & 1) << 7
+        return shifted & self._valid
+
+    def removals(self):
+        """
+        Return the bits of the seats removed at each timepoint (listed at the previous timepoint but not this one).
+        """
+        return self.previous() & ~self.bits
+
+    def additions(self):
+        """
+        Return the bits of the seats added at each timepoint after the first (not listed at the previous timepoint
+        but listed at this one).
+        """
+        return ~self.previous() & self.bits & self._after_first
+
+    def sales(self):
+        """
+        Return the bits of the removals that are sales.
+
+        As in find_differences(), a removed seat that is removed again later must have been re-listed in between, so
+        the earlier removal was not a sale.  This leaves only the last removal of each location.
+        """
+        removals = self.removals()
+        sales = np.zeros_like(removals)
+        if removals.size == 0:
+            return sales
+        nonzero = removals != 0
+        rows = np.flatnonzero(nonzero.any(axis=1))
+        last_bytes = removals.shape[1] - 1 - np.argmax(nonzero[rows, ::-1], axis=1)
+        # The last timepoint in a byte is its lowest set bit
+        last_bits = removals[rows, last_bytes]
+        sales[rows, last_bytes] = last_bits & (~last_bits + np.uint8(1))
+        return sales
+
+    def nonzero(self, bits=None):
+        """
+        Return the (location index, timepoint index) of each set bit.
+
+        :param bits: (Optional) Bit array from this bitmap (eg: sales()).  Default is the availability bits
+        :return: Tuple of (numpy int array of indices into locs, numpy int array of indices into timepoints)
+        """
+        if bits is None:
+            bits = self.bits
+        return np.nonzero(np.unpackbits(bits, axis=1, count=len(self.timepoints)))
+
+
 # Exceptions
 class SeatGroupError(Exception):
     pass
@@ -1218,6 +3105,406 @@ def mygen(start=0, stop=100, inc=1):
         i += inc
 
 
+def to_datetime64(dts):
+    """
+    Return a list of (naive) datetime objects or a datetime64 array as a numpy datetime64[us] array.
+    """
+    return np.asarray(dts, dtype='datetime64[us]')
+
+
+def object_array(items):
+    """
+    Return a 1D numpy object array of items.
+
+    Unlike np.array(items, dtype=object), this does not turn a list of equal length tuples (eg: seat locations) into a
+    2D array.
+    """
+    a = np.empty(len(items), dtype=object)
+    for i, item in enumerate(items):
+        a[i] = item
+    return a
+
+
+def match_locs_to_groups(locs, groups):
+    """
+    Match seat locations to the named groups of locations that include them.
+
+    Group locations can reference a seat at any depth (eg: (section,) or (section, row)).  A seat referenced by more
+    than one group is matched once to each of those groups.
+
+    :param locs: List of full seat location tuples, eg: from SeatGroup.get_locs()
+    :param groups: Dict of {group_name: list of location tuples}, eg: {'A1': [(111,), (112,)], 'B': [(106, 'A')]}
+    :return: Tuple of (numpy array of indices into locs, numpy object array of group names), with one entry for each
+             (seat, group) match
+    """
+    # Index of location prefix (as strings, the same as SeatGroup names) to the groups that include it
+    prefix_groups = {}
+    for group in groups:
+        for loc in groups[group]:
+            prefix_groups.setdefault(tuple(str(x) for x in loc), set()).add(group)
+    depths = sorted(set(len(prefix) for prefix in prefix_groups))
+
+    rows = []
+    group_names = []
+    for i, loc in enumerate(locs):
+        these_groups = set()
+        for depth in depths:
+            these_groups.update(prefix_groups.get(tuple(loc[:depth]), ()))
+        for group in sorted(these_groups):
+            rows.append(i)
+            group_names.append(group)
+    return np.array(rows, dtype=np.intp), object_array(group_names)
+
+
+# Chronologies made by SeatGroupChronology.find_differences()
+DERIVED_CHRONOLOGIES = ['added', 'removed', 'new_price', 'new_listid', 'sales']
+
+# Classes that can be written by encode_seatgroups(), by name
+SEATGROUP_CLASSES = {'SeatGroup': SeatGroup, 'FlatSeatGroup': FlatSeatGroup}
+
+# Codes for Seat.available in encoded seats
+AVAILABLE_CODES = {None: -1, False: 0, True: 1}
+AVAILABLE_VALUES = {-1: None, 0: False, 1: True}
+
+
+def restore_seatgroupchronology(cls, arrays, info):
+    """
+    Unpickle a SeatGroupChronology (see SeatGroupChronology.__reduce_ex__())
+    """
+    return cls.from_arrays(arrays, info)
+
+
+def encode_seatgroups(seatgroups):
+    """
+    Encode a list of SeatGroups as a few contiguous numpy arrays and a dict of JSON compatible information.
+
+    Arrays:
+        offsets: Seats of seatgroups[i] are rows offsets[i]:offsets[i+1] of the seat_* arrays
+        seat_loc: Index of each seat's location in loc_codes
+        seat_listing: Index of each seat's SeatListing in the listing table (listing_price, and the listing_facevalue
+                      and listing_list_id information)
+        seat_available: Seat.available of each seat (see AVAILABLE_CODES)
+        seat_group: Index of each seat's season_ticket_group in the season_ticket_groups information (-1 for None)
+        loc_codes: One row for each unique location, of indices into the names information (-1 pads short locations)
+        listing_price: Price of each unique SeatListing (NaN for None)
+
+    Seat and listing values other than prices must be JSON compatible.  SeatGroups containing a SeatGroupFixedPrice
+    cannot be encoded.
+
+    :param seatgroups: List of SeatGroup or FlatSeatGroup objects
+    :return: Tuple of (dict of {name: numpy array}, dict of information)
+    """
+    loc_ids = {}
+    listing_ids = {}
+    group_ids = {}
+    offsets = [0]
+    seat_loc = []
+    seat_listing = []
+    seat_available = []
+    seat_group = []
+    for sg in seatgroups:
+        if type(sg).__name__ not in SEATGROUP_CLASSES or contains_fixed_price(sg):
+            raise SeatGroupError("Cannot encode SeatGroup of type {0} or containing a SeatGroupFixedPrice".format(
+                type(sg).__name__))
+        locs = sg.get_locs()
+        for loc, seat in zip(locs, sg.get_seats_as_list(locs)):
+            seat_loc.append(loc_ids.setdefault(loc, len(loc_ids)))
+            seat_listing.append(listing_ids.setdefault(seat.listing, len(listing_ids)))
+            try:
+                seat_available.append(AVAILABLE_CODES[seat.available])
+            except KeyError:
+                raise SeatGroupError("Cannot encode Seat.available value {0}".format(seat.available))
+            if seat.season_ticket_group is None:
+                seat_group.append(-1)
+            else:
+                seat_group.append(group_ids.setdefault(seat.season_ticket_group, len(group_ids)))
+        offsets.append(len(seat_loc))
+
+    name_ids = {}
+    depth = max([len(loc) for loc in loc_ids] + [0])
+    loc_codes = np.full((len(loc_ids), depth), -1, dtype=np.int32)
+    for loc, i in loc_ids.items():
+        loc_codes[i, :len(loc)] = [name_ids.setdefault(name, len(name_ids)) for name in loc]
+    listings = list(listing_ids)
+    listing_price = np.array([np.nan if listing.price is None else listing.price for listing in listings],
+                             dtype=np.float64)
+
+    arrays = {
+        'offsets': np.array(offsets, dtype=np.int64),
+        'seat_loc': np.array(seat_loc, dtype=np.int32),
+        'seat_listing': np.array(seat_listing, dtype=np.int32),
+        'seat_available': np.array(seat_available, dtype=np.int8),
+        'seat_group': np.array(seat_group, dtype=np.int32),
+        'loc_codes': loc_codes,
+        'listing_price': listing_price,
+    }
+    info = {
+        'classes': [type(sg).__name__ for sg in seatgroups],
+        'metas': [encode_meta(sg.meta) for sg in seatgroups],
+        'names': list(name_ids),
+        'listing_price_none': [i for i, listing in enumerate(listings) if listing.price is None],
+        'listing_facevalue': [listing.facevalue for listing in listings],
+        'listing_list_id': [listing.list_id for listing in listings],
+        'season_ticket_groups': list(group_ids),
+    }
+    # Check now that everything can be written, rather than when saving
+    json.dumps(info)
+    return arrays, info
+
+
+def decode_seatgroups(arrays, info, intern=None):
+    """
+    Return the list of SeatGroups encoded by encode_seatgroups().
+
+    :param arrays: Dict of {name: numpy array}
+    :param info: Dict of information
+    :param intern: (Optional) Dict used to intern the SeatListings (see make_seat_listing())
+    :return: List of SeatGroup or FlatSeatGroup objects
+    """
+    tables = {}
+    return [decode_seatgroup(arrays, info, i, tables, intern=intern) for i in range(len(info['classes']))]
+
+
+def decode_seatgroup(arrays, info, i, tables, intern=None):
+    """
+    Return SeatGroup i of those encoded by encode_seatgroups(), reading only its rows of the seat arrays.
+
+    :param arrays: Dict of {name: numpy array}
+    :param info: Dict of information
+    :param i: Index of the SeatGroup
+    :param tables: Dict shared by all calls for the same arrays, which holds the decoded locations and listings after
+                   the first call (pass an empty dict)
+    :param intern: (Optional) Dict used to intern the SeatListings (see make_seat_listing())
+    :return: SeatGroup or FlatSeatGroup
+    """
+    if not tables:
+        names = info['names']
+        prices = arrays['listing_price'].tolist()
+        for j in info['listing_price_none']:
+            prices[j] = None
+        tables['locs'] = [tuple(names[code] for code in row if code >= 0) for row in arrays['loc_codes'].tolist()]
+        tables['listings'] = [make_seat_listing(price, facevalue, list_id, intern=intern) for price, facevalue, list_id
+                              in zip(prices, info['listing_facevalue'], info['listing_list_id'])]
+    locs = tables['locs']
+    listings = tables['listings']
+    groups = info['season_ticket_groups']
+
+    start, stop = arrays['offsets'][i:i + 2].tolist()
+    seat_loc = arrays['seat_loc'][start:stop].tolist()
+    seat_listing = arrays['seat_listing'][start:stop].tolist()
+    seat_available = arrays['seat_available'][start:stop].tolist()
+    seat_group = arrays['seat_group'][start:stop].tolist()
+    sg = SEATGROUP_CLASSES[info['classes'][i]]()
+    sg.meta = decode_meta(info['metas'][i])
+    sg.add_seats([locs[j] for j in seat_loc],
+                 [Seat(listing=listings[j], available=AVAILABLE_VALUES[a], season_ticket_group=None if g < 0 else
+                       groups[g]) for j, a, g in zip(seat_listing, seat_available, seat_group)])
+    return sg
+
+
+def write_seatgroup(path, sg):
+    """
+    Write a SeatGroup to a .npz file of the arrays of encode_seatgroups(), with the information stored as JSON.
+
+    :param path: Filename to write to
+    :param sg: SeatGroup or FlatSeatGroup
+    :return: None
+    """
+    arrays, info = encode_seatgroups([sg])
+    with open(path, 'wb') as f:
+        np.savez(f, info=np.array(json.dumps(info)), **arrays)
+
+
+def read_seatgroup(path, intern=None):
+    """
+    Return the SeatGroup written to path by write_seatgroup().
+
+    :param path: Filename to read from
+    :param intern: (Optional) Dict used to intern the SeatListings (see make_seat_listing())
+    :return: SeatGroup or FlatSeatGroup
+    """
+    with np.load(path) as f:
+        info = json.loads(f['info'].item())
+        arrays = {name: f[name] for name in f.files if name != 'info'}
+    return decode_seatgroups(arrays, info, intern=intern)[0]
+
+
+def contains_fixed_price(sg):
+    """
+    Return True if sg or any SeatGroup nested in it is a SeatGroupFixedPrice.
+    """
+    if isinstance(sg, SeatGroupFixedPrice):
+        return True
+    return any(contains_fixed_price(seat) for seat in sg.seats.values() if isinstance(seat, SeatGroup))
+
+
+def encode_meta(meta):
+    """
+    Return a JSON compatible version of a metadata dict (or None), encoding datetime values as tagged strings.
+    """
+    if meta is None:
+        return None
+    return {key: {'datetime': value.isoformat()} if isinstance(value, datetime.datetime) else value
+            for key, value in meta.items()}
+
+
+def decode_meta(meta):
+    """
+    Return the metadata dict encoded by encode_meta().
+    """
+    if meta is None:
+        return None
+    return {key: datetime.datetime.fromisoformat(value['datetime'])
+            if isinstance(value, dict) and list(value) == ['datetime'] else value
+            for key, value in meta.items()}
+
+
+# Totals (see SeatGroup.totals) of nothing
+NO_TOTALS = (0, 0.0, 0)
+
+# Approximate memory used per Seat of a loaded SeatGroup, including its share of the SeatGroup structure (listings are
+# interned, so are mostly shared between timepoints).  Measured with tracemalloc (see tests/test_seats.py), SeatGroups
+# built with add_seats() take about 220 bytes per seat (300 for FlatSeatGroups).  Seats loaded from listings JSON files
+# also hold their listing data, so this is rounded well up, erring toward keeping fewer SeatGroups resident
+SEAT_NBYTES = 500
+
+
+def estimate_nbytes(sg):
+    """
+    Return the approximate memory used by a SeatGroup, in bytes (see SEAT_NBYTES).
+    """
+    return len(sg) * SEAT_NBYTES
+
+
+def seat_totals(item):
+    """
+    Return the totals (number of seats, sum of prices, number of seats without a price) of a Seat or SeatGroup.
+
+    :param item: A Seat or SeatGroup
+    :return: Tuple of (int, float, int)
+    """
+    if isinstance(item, SeatGroup):
+        return item.totals
+    price = item.price
+    if price is None:
+        return 1, 0.0, 1
+    return 1, price, 0
+
+
+class _Any(object):
+    """
+    Wildcard for location patterns that matches any name (see SeatGroup.query_seats())
+    """
+    def __repr__(self):
+        return "ANY"
+
+ANY = _Any()
+
+
+class NameRange(object):
+    """
+    Inclusive range of names for location patterns (see SeatGroup.query_seats()).
+
+    If start and stop are both ints, names are compared as integers (names that are not integers never match).
+    Otherwise names are compared as strings.
+    """
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+        self.numeric = isinstance(start, int) and isinstance(stop, int)
+
+    def __repr__(self):
+        return "NameRange({0!r}, {1!r})".format(self.start, self.stop)
+
+    def __contains__(self, name):
+        if self.numeric:
+            try:
+                name = int(name)
+            except ValueError:
+                return False
+            return self.start <= name <= self.stop
+        else:
+            return str(self.start) <= str(name) <= str(self.stop)
+
+
+def match_names(element, names):
+    """
+    Return the names in names that match one element of a location pattern (see SeatGroup.query_seats()).
+
+    :param element: A name, collection of names, ANY, or NameRange
+    :param names: Dict or set of the (string) names available at this level
+    :return: List of matching names
+    """
+    if element is ANY:
+        return list(names)
+    elif isinstance(element, NameRange):
+        return [name for name in names if name in element]
+    elif isinstance(element, (list, tuple, set, frozenset, range)):
+        matched = []
+        for e in element:
+            e = str(e)
+            if e in names:
+                matched.append(e)
+        return matched
+    else:
+        element = str(element)
+        if element in names:
+            return [element]
+        return []
+
+
+def loc_matches(loc, patterns):
+    """
+    Return True if a seat location matches any of a list of location patterns (see SeatGroup.query_seats()).
+
+    :param loc: Location tuple of (string) names
+    :param patterns: List of location pattern tuples
+    :return: Boolean
+    """
+    for pattern in patterns:
+        if len(pattern) <= len(loc) and all(match_names(element, (name,)) for element, name in zip(pattern, loc)):
+            return True
+    return False
+
+
+def expand_pattern(pattern):
+    """
+    Return the list of location tuples described by a pattern of names and collections of names (see
+    SeatGroup.query_seats()), eg: ([105, 114], ['A', 'B']) -> [(105, 'A'), (105, 'B'), (114, 'A'), (114, 'B')]
+
+    :param pattern: Location pattern tuple.  Cannot include ANY or NameRange
+    :return: List of location tuples
+    """
+    levels = []
+    for element in pattern:
+        if element is ANY or isinstance(element, NameRange):
+            raise SeatGroupError("Cannot expand pattern {0} - ANY and NameRange cannot be expanded".format(pattern))
+        elif isinstance(element, (list, tuple, set, frozenset, range)):
+            levels.append(list(element))
+        else:
+            levels.append([element])
+    return list(product(*levels))
+
+
+def make_seat_listing(price=None, facevalue=None, list_id=None, intern=None):
+    """
+    Return a SeatListing, optionally interned so identical listings are represented by a single shared object.
+
+    :param price: Price of the seats (converted to float)
+    :param facevalue: Face value of the seats
+    :param list_id: Listing ID of the seats
+    :param intern: (Optional) Dict used as an intern table.  If the same listing is already in the dict, that
+                   SeatListing is returned instead of a new one
+    :return: SeatListing
+    """
+    if price is not None:
+        price = float(price)
+    listing = SeatListing(price, facevalue, list_id)
+    if intern is not None:
+        listing = intern.setdefault(listing, listing)
+    return listing
+
+
 # These datetime list functions could be wrapped into a datetime list object.  Could still be interacted with like a
 # (maybe a subclass of list?) but with these additional features
 def dt_list_trim(dt_list, dt_slice):
@@ -1232,41 +3519,10 @@ def dt_list_trim(dt_list, dt_slice):
                            must be chronologically before stop.  If step < 0, start can be chronologically after stop
         :return: A sorted list of datetime objects
     """
-    # Make start <= stop
-    if dt_slice.step is None or dt_slice.step.total_seconds() >= 0:
-        start = dt_slice.start
-        stop = dt_slice.stop
-    else:
-        start = dt_slice.stop
-        stop = dt_slice.start
+    start, stop = dt_slice_bounds(to_datetime64(dt_list), dt_slice)
 
-    # Get the indices bounding the slice of the timepoint list
-    if start is None:
-        start = 0
-    else:
-        i = bisect.bisect_left(dt_list, start)
-        # Ensure the returned timepoint is inside the range, not just outside
-        if dt_list[i] < start:
-            start = i + 1
-        else:
-            start = i
-    if stop is None:
-        stop = None
-    else:
-        i = bisect.bisect_right(dt_list, stop)
-        # Ensure the returned timepoint is inside the range, not just outside
-        if dt_list[i] > stop:
-            stop = i - 1
-        else:
-            stop = i
-            # stop = bisect.bisect_right(dt_list, stop)
-
-    # deepcopy seems messy here, but I want to make sure I'm not returning a view of anything...
-    if start == stop:
-        new_list = [copy.deepcopy(dt_list[start])]
-    else:
-        new_list = copy.deepcopy(dt_list[start:stop])
-    return new_list
+    # Always return a new list.  Datetimes are immutable, so the elements themselves do not need copying
+    return list(dt_list[start:stop])
 
 
 def dt_list_arange(dt_list, dt_slice):
@@ -1286,32 +3542,70 @@ def dt_list_arange(dt_list, dt_slice):
     """
     if dt_slice.step is None:
         raise ValueError("step must be defined - value is None")
-    # Get only the relevant portion of the dt_list
-    dt_list = dt_list_trim(dt_list, dt_slice)
+    step = np.timedelta64(dt_slice.step, 'us')
+    if step == np.timedelta64(0, 'us'):
+        raise ValueError("step must be non-zero")
 
-    # Starting position for the search for either direction(this will always be the first search index)
-    if dt_slice.step.total_seconds() > 0:
-        i = 0
+    # Get only the relevant portion of the dt_list
+    index = to_datetime64(dt_list)
+    start, stop = dt_slice_bounds(index, dt_slice)
+    dt_list = dt_list[start:stop]
+    index = index[start:stop]
+    if len(index) == 0:
+        return []
+
+    # The grid of target times marches from dt_slice.start (or the respective end of the list) in step increments,
+    # always including the first index in the direction of marching
+    if step > np.timedelta64(0, 'us'):
+        first = 0
+        end = index[-1] + np.timedelta64(1, 'us')
     else:
-        i = len(dt_list) - 1
+        first = len(index) - 1
+        end = index[0] - np.timedelta64(1, 'us')
     if dt_slice.start is None:
-        dt_target = copy.deepcopy(dt_list[i])
+        origin = index[first]
     else:
-        dt_target = dt_slice.start
+        origin = to_datetime64(dt_slice.start)
+    targets = np.arange(origin + step, end, step)
+    targets = targets[(targets >= index[0]) & (targets <= index[-1])]
+
+    indices = np.unique(np.append(nearest_indices(index, targets), first))
+    return [dt_list[i] for i in indices]
+
+
+def dt_slice_bounds(index, dt_slice):
+    """
+    Return the (start, stop) bounds of the portion of a sorted datetime64 array within the range of a datetime slice
+
+    See dt_list_trim() for the meaning of dt_slice.  A stop of None means the bounds extend to the end of index.
 
-    indices = set()
-    indices.add(i)
+    :param index: Sorted numpy datetime64 array
+    :param dt_slice: Slice object with start and/or stop as datetime objects (or None), and step as a timedelta
+    :return: Tuple of (start, stop) indices into index, to be used as index[start:stop]
+    """
+    # Make start <= stop
+    if dt_slice.step is None or dt_slice.step.total_seconds() >= 0:
+        start = dt_slice.start
+        stop = dt_slice.stop
+    else:
+        start = dt_slice.stop
+        stop = dt_slice.start
 
-    while True:
-        dt_target = dt_target + dt_slice.step
-        if dt_target < dt_list[0] or dt_target > dt_list[-1]:
-            break
-        i = nearest_index(dt_list, dt_target)
-        # i = bisect.bisect_left(dt_list, dt_target)
-        indices.add(i)
+    # Get the indices bounding the slice of the timepoint list
+    if start is None:
+        start = 0
+    else:
+        start = int(np.searchsorted(index, to_datetime64(start), side='left'))
+    if stop is not None:
+        i = int(np.searchsorted(index, to_datetime64(stop), side='right'))
+        # The timepoint at i is past stop.  The (in range) timepoint preceding it also ends the slice, unless it is
+        # the only timepoint in range
+        if i == len(index) or i - 1 == start:
+            stop = i
+        else:
+            stop = max(i - 1, 0)
+    return start, stop
 
-    dt_list = sorted([copy.deepcopy(dt_list[i]) for i in indices])
-    return dt_list
 
 def np_describe(a):
     if len(a) == 0:
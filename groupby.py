@@ -70,6 +70,221 @@ def groupby(a, by=0, axis=0):
         out = out.T
     return out
 
+class Groups(object):
+    """
+    Sorted segmentation of data by one or more keys, used to compute many grouped reductions from a single sort.
+
+    Rows are sorted once (stably, so rows within a group keep their original order) and every reduction is then a
+    ufunc.reduceat over the contiguous segments of the sorted data.  Groups are always ordered by their sorted keys.
+
+    Example:
+        g = Groups(timepoints)
+        g.keys          # Unique timepoints, sorted
+        g.count()       # Number of rows per timepoint
+        g.sum(prices)   # Sum of prices per timepoint
+        g.as_dict(g.min(prices))  # {timepoint: min price}
+
+        g = Groups(season_ticket_group, timepoints)  # Multi-key grouping
+        g.keys          # List of arrays [group of each segment, timepoint of each segment]
+    """
+
+    def __init__(self, *keys):
+        """
+        :param keys: One or more 1D array-likes of equal length.  Rows are grouped by the unique combinations of all
+                     keys, ordered as a multi-column sort (first key is the primary sort)
+        """
+        if len(keys) == 0:
+            raise ValueError("At least one key is required")
+        keys = [np.asarray(k) for k in keys]
+        n = len(keys[0])
+        for k in keys:
+            if k.ndim != 1 or len(k) != n:
+                raise ValueError("Keys must be 1D and all the same length")
+        self.n = n
+        self.n_keys = len(keys)
+
+        # Factorize each key to integer codes (np.unique works on object arrays too, eg: datetimes), then sort the rows
+        # by the codes.  Both argsort(kind='stable') and lexsort are stable.
+        codes = [np.unique(k, return_inverse=True)[1].reshape(-1) for k in keys]
+        if len(codes) == 1:
+            self.order = np.argsort(codes[0], kind='stable')
+        else:
+            # lexsort uses the last key as the primary key
+            self.order = np.lexsort(codes[::-1])
+
+        # A new segment starts wherever any of the keys change in the sorted data
+        boundary = np.zeros(n, dtype=bool)
+        if n > 0:
+            boundary[0] = True
+            for c in codes:
+                c_sorted = c[self.order]
+                boundary[1:] |= c_sorted[1:] != c_sorted[:-1]
+        self.starts = np.flatnonzero(boundary)
+        if n > 0:
+            self.ends = np.append(self.starts[1:], n).astype(self.starts.dtype)
+        else:
+            self.ends = self.starts.copy()
+
+        # Group index of each row in the original (unsorted) order
+        self.group_index = np.empty(n, dtype=np.intp)
+        self.group_index[self.order] = np.cumsum(boundary) - 1
+
+        first_rows = self.order[self.starts]
+        if self.n_keys == 1:
+            self.keys = keys[0][first_rows]
+        else:
+            self.keys = [k[first_rows] for k in keys]
+
+    def __len__(self):
+        """
+        Return the number of groups
+        """
+        return len(self.starts)
+
+    def _sorted(self, values):
+        values = np.asarray(values)
+        if len(values) != self.n:
+            raise ValueError("values must have the same length as the keys ({0} != {1})".format(len(values), self.n))
+        return values[self.order]
+
+    def reduce(self, ufunc, values):
+        """
+        Apply ufunc.reduceat to each group of values, returning an array with one entry per group.
+
+        :param ufunc: A numpy ufunc, eg: np.add, np.minimum, np.maximum
+        :param values: 1D array-like aligned with the keys
+        :return: numpy array of length len(self)
+        """
+        values = self._sorted(values)
+        if len(self) == 0:
+            return values[:0]
+        return ufunc.reduceat(values, self.starts)
+
+    def count(self):
+        """
+        Return the number of rows in each group
+        """
+        return self.ends - self.starts
+
+    def sum(self, values):
+        return self.reduce(np.add, values)
+
+    def min(self, values):
+        return self.reduce(np.minimum, values)
+
+    def max(self, values):
+        return self.reduce(np.maximum, values)
+
+    def first(self, values):
+        """
+        Return the first value (in the original row order) of each group
+        """
+        return self._sorted(values)[self.starts]
+
+    def last(self, values):
+        """
+        Return the last value (in the original row order) of each group
+        """
+        return self._sorted(values)[self.ends - 1]
+
+    def mean(self, values):
+        return self.sum(values) / self.count()
+
+    def weighted_mean(self, values, weights):
+        """
+        Return the weighted mean of values in each group
+
+        :param values: 1D array-like aligned with the keys
+        :param weights: 1D array-like aligned with the keys
+        :return: numpy array of length len(self)
+        """
+        weights = np.asarray(weights, dtype=float)
+        return self.sum(np.asarray(values, dtype=float) * weights) / self.sum(weights)
+
+    def std(self, values):
+        """
+        Return the (population, ddof=0) standard deviation of values in each group, matching np.std
+        """
+        values = np.asarray(values, dtype=float)
+        dev = values - self.broadcast(self.mean(values))
+        return np.sqrt(self.sum(dev * dev) / self.count())
+
+    def quantile(self, values, q):
+        """
+        Return quantiles of values in each group, using linear interpolation as in np.quantile/np.percentile.
+
+        :param values: 1D array-like aligned with the keys
+        :param q: A scalar or sequence of quantiles in [0, 1]
+        :return: numpy array of shape (len(self),) for scalar q, or (len(self), len(q)) for a sequence of q
+        """
+        values = np.asarray(values, dtype=float)
+        if len(values) != self.n:
+            raise ValueError("values must have the same length as the keys ({0} != {1})".format(len(values), self.n))
+        q = np.asarray(q, dtype=float)
+        # Sort by group then by value.  Groups occupy the same segments as in self.order
+        v_sorted = values[np.lexsort((values, self.group_index))]
+
+        counts = self.count()
+        virtual_index = (counts[:, None] - 1) * q.reshape(1, -1)
+        lower = np.floor(virtual_index)
+        gamma = virtual_index - lower
+        lower = lower.astype(np.intp)
+        upper = np.minimum(lower + 1, counts[:, None] - 1)
+        a = v_sorted[self.starts[:, None] + lower]
+        b = v_sorted[self.starts[:, None] + upper]
+
+        # Same interpolation numpy uses, so results match np.percentile exactly
+        diff_b_a = b - a
+        res = a + diff_b_a * gamma
+        res = np.where(gamma >= 0.5, b - diff_b_a * (1 - gamma), res)
+        if q.ndim == 0:
+            res = res[:, 0]
+        return res
+
+    def describe(self, values):
+        """
+        Return summary statistics of values in each group, in the same format as Seats.np_describe but with arrays
+        (one entry per group) for each statistic
+
+        :param values: 1D array-like aligned with the keys
+        :return: Dictionary of numpy arrays including count, mean, std, min, 25%, 50%, 75%, max
+        """
+        values = np.asarray(values, dtype=float)
+        per = self.quantile(values, [0.25, 0.5, 0.75])
+        return {
+            'count': self.count(),
+            'mean': self.mean(values),
+            'std': self.std(values),
+            'min': self.min(values),
+            '25%': per[:, 0],
+            '50%': per[:, 1],
+            '75%': per[:, 2],
+            'max': self.max(values),
+        }
+
+    def broadcast(self, group_values):
+        """
+        Expand a per-group result back to one entry per row, in the original row order
+
+        :param group_values: array of length len(self)
+        :return: numpy array of length n
+        """
+        return np.asarray(group_values)[self.group_index]
+
+    def as_dict(self, group_values):
+        """
+        Return a per-group result as a dict keyed by group (keys are tuples when grouping by multiple keys)
+
+        :param group_values: array of length len(self)
+        :return: Dict of {key: value}
+        """
+        if self.n_keys == 1:
+            keys = self.keys.tolist() if self.keys.dtype != object else list(self.keys)
+        else:
+            keys = list(zip(*[k.tolist() if k.dtype != object else list(k) for k in self.keys]))
+        return dict(zip(keys, group_values))
+
+
 if __name__ == '__main__':
     a = np.array([[1, 2, 3],
                   [1, 4, 6],
@@ -83,4 +298,8 @@ if __name__ == '__main__':
 
     print("array grouped by first column:")
     res = groupby(a, 0, axis=0)
-    pprint(res)
\ No newline at end of file
+    pprint(res)
+
+    print("array grouped by first column using Groups (sum, min, max, median):")
+    g = Groups(a[:, 0])
+    pprint(g.as_dict(zip(g.sum(a[:, 1]), g.min(a[:, 1]), g.max(a[:, 1]), g.quantile(a[:, 1], 0.5))))
\ No newline at end of file
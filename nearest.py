@@ -1,5 +1,6 @@
 import random
 import bisect
+import numpy as np
 
 def nearest_index(a, x, bisection_dir='left'):
     """
@@ -44,6 +45,25 @@ def nearest_value(a, x, bisection_dir='left'):
     """
     return a[nearest_index(a, x, bisection_dir=bisection_dir)]
 
+
+def nearest_indices(a, x):
+    """
+    Return the indices of the elements of the sorted numpy array a that are nearest to each element of x
+
+    Vectorized version of nearest_index(), resolving all of x with one searchsorted.  As in nearest_index(), ties go to
+    the earlier element.
+
+    :param a: Sorted numpy array (must not be empty)
+    :param x: Numpy array of values to find in a (same dtype as a)
+    :return: Numpy int array of indices into a, one for each element of x
+    """
+    n = len(a)
+    i = np.searchsorted(a, x, side='left')
+    left = np.clip(i - 1, 0, n - 1)
+    right = np.minimum(i, n - 1)
+    nearest = np.where(x - a[left] <= a[right] - x, left, right)
+    return np.where(i == 0, 0, nearest)
+
 if __name__ == "__main__":
     # Really lazy testing...
     N = 25
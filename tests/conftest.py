@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+
+# The modules are flat scripts in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+matplotlib.use('Agg')
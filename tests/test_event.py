@@ -0,0 +1,158 @@
+import datetime
+import random
+
+import numpy as np
+import pytest
+
+from Event import Event, asof_join, asof_snapshots, asof_aggregate
+from Seats import SeatGroupChronology, SeatGroup, Seat
+
+
+def make_event(season_ticket_groups):
+    event = Event()
+    event.season_ticket_groups = season_ticket_groups
+    event.init_season_ticket_group_locs()
+    event.init_season_ticket_seatgroup()
+    return event
+
+
+def make_chronology(seats):
+    sgc = SeatGroupChronology()
+    sg = SeatGroup()
+    for loc, price in seats:
+        sg.add_seat(Seat(price=price), loc)
+    sgc.add_seatgroup(datetime.datetime(2017, 11, 1), sg)
+    return sgc
+
+
+def test_relative_prices_overlapping_groups_use_cheapest_price():
+    sgc = make_chronology([(('101', 'A', '1'), 100.0), (('101', 'B', '1'), 120.0), (('102', 'A', '1'), 90.0)])
+    for first, second in [(50.0, 30.0), (30.0, 50.0)]:
+        event = make_event({
+            'outer': {'price': first, 'locs': [('101',), ('102',)]},
+            'inner': {'price': second, 'locs': [('101',)]},
+        })
+        expected = sgc - event.season_tickets
+        _, locs, prices = event.relative_prices(sgc).get_price_table()
+        expected_locs, expected_prices = expected.get_price_table()[1:]
+        assert locs == expected_locs
+        np.testing.assert_array_equal(prices, expected_prices)
+        np.testing.assert_array_equal(prices, [100.0 - min(first, second), 120.0 - min(first, second), 90.0 - first])
+
+
+def test_days_relative_to_matches_total_seconds():
+    def expected(timepoints, reference):
+        return [(t - reference).total_seconds() / 86400.0 for t in timepoints]
+
+    timepoints = [datetime.datetime(2017, 11, 1, 10, 0, 0, 123), datetime.datetime(2017, 11, 3, 7, 30),
+                  datetime.datetime(2017, 11, 8, 1)]
+    event = Event()
+    event.chronology = SeatGroupChronology()
+    for tp in timepoints:
+        sg = SeatGroup()
+        sg.add_seat(Seat(price=100.0), ('101', 'A', '1'))
+        event.chronology.add_seatgroup(tp, sg)
+    event.datetime = datetime.datetime(2017, 11, 7, 19)
+    np.testing.assert_array_equal(event.days_to_event, expected(timepoints, event.datetime))
+    assert event.days_to_event is event.days_to_event
+
+    others = [timepoints[1], datetime.datetime(2017, 11, 2, 0, 0, 1), timepoints[0], datetime.datetime(2017, 11, 9)]
+    np.testing.assert_array_equal(event.days_relative_to(others), expected(others, event.datetime))
+    np.testing.assert_array_equal(event.days_relative_to(others, event.datetime), expected(others, event.datetime))
+    reference = datetime.datetime(2017, 10, 30, 12, 0, 0, 7)
+    np.testing.assert_array_equal(event.days_relative_to(others, reference), expected(others, reference))
+
+    # Recomputed after the datetime or the data changes
+    event.datetime = datetime.datetime(2017, 11, 7, 20)
+    np.testing.assert_array_equal(event.days_to_event, expected(timepoints, event.datetime))
+    timepoints.append(datetime.datetime(2017, 11, 9))
+    event.chronology.add_seatgroup(timepoints[-1], SeatGroup())
+    event.invalidate_cache()
+    np.testing.assert_array_equal(event.days_to_event, expected(timepoints, event.datetime))
+    np.testing.assert_array_equal(event.days_relative_to(others), expected(others, event.datetime))
+
+
+def test_calc_all_average_price_history_rejects_empty_window_list():
+    event = Event()
+    with pytest.raises(ValueError):
+        event.calc_all_average_price_history(moving_average_timedeltas=[])
+
+
+def test_cached_results_follow_group_changes_and_are_read_only():
+    event = make_event({'a': {'price': 50.0, 'locs': [('101',)]}})
+    event.chronology = make_chronology([(('101', 'A', '1'), 100.0), (('102', 'A', '1'), 90.0)])
+    event.invalidate_cache()
+    prices = event.get_group_prices('a')
+    assert prices['price'].tolist() == [100.0]
+    with pytest.raises(ValueError):
+        prices['price'][0] = 0.0
+    groups = event.group_chronologies()
+    del groups['a']
+    assert list(event.group_chronologies()) == ['a']
+    assert event.get_group_prices('a')['price'].tolist() == [100.0]
+
+    # Setting the groups, or changing them in place and rebuilding them, gives new results
+    event.season_ticket_groups = {'a': {'price': 50.0, 'patterns': [('102',)]}}
+    assert event.get_group_prices('a')['price'].tolist() == [90.0]
+    event.season_ticket_groups['a']['patterns'] = [('101',), ('102',)]
+    event.init_season_ticket_group_locs()
+    assert event.get_group_prices('a')['price'].tolist() == [100.0, 90.0]
+
+    version = event.data_version
+    event.namemap = [(r'(?i)\s*Club\s*', '')]
+    assert event.data_version != version
+
+
+def make_asof_events():
+    # Events with irregular timepoints around their start, including one with no timepoints
+    rng = random.Random(7)
+    events = []
+    for n_timepoints in [12, 0, 5, 30]:
+        event = Event()
+        event.datetime = datetime.datetime(2017, 11, 1, 19) + datetime.timedelta(days=rng.randint(0, 60))
+        offsets = sorted(rng.sample(range(-10 * 24 * 60, 12 * 60, 30), n_timepoints))
+        for minutes in offsets:
+            sg = SeatGroup()
+            for n in range(rng.randint(0, 4)):
+                sg.add_seat(Seat(price=float(rng.randint(10, 90))), ('101', 'A', str(n)))
+            event.chronology.add_seatgroup(event.datetime + datetime.timedelta(minutes=minutes), sg)
+        events.append(event)
+    return events
+
+
+def test_asof_join_matches_each_event():
+    events = make_asof_events()
+    offsets = [datetime.timedelta(days=-12), datetime.timedelta(days=-3), datetime.timedelta(days=-1, minutes=15),
+               datetime.timedelta(minutes=-30), datetime.timedelta(0), datetime.timedelta(hours=2),
+               datetime.timedelta(days=2)]
+    for single_type in ['left', 'right', 'nearest', 'exact']:
+        for tolerance in [None, datetime.timedelta(minutes=20), datetime.timedelta(hours=6)]:
+            indices = asof_join(events, offsets, single_type=single_type, tolerance=tolerance)
+            assert indices.shape == (len(events), len(offsets))
+            for event, event_indices in zip(events, indices):
+                targets = [event.datetime + offset for offset in offsets]
+                expected = event.chronology.get_timepoint_indices(targets, single_type=single_type)
+                if tolerance is not None:
+                    expected = [i if i >= 0 and abs(event.chronology.sorted_timepoints[i] - t) <= tolerance else -1
+                                for i, t in zip(expected, targets)]
+                assert list(event_indices) == list(expected)
+    assert asof_join(events, []).shape == (len(events), 0)
+    assert (asof_join([events[1]], offsets) == -1).all()
+
+
+def test_asof_aggregate_matches_each_snapshot():
+    events = make_asof_events()
+    offsets = [datetime.timedelta(days=-3), datetime.timedelta(days=-1), datetime.timedelta(hours=-1),
+               datetime.timedelta(hours=-1)]
+    snapshots = asof_snapshots(events, offsets, single_type='nearest', tolerance=datetime.timedelta(hours=12))
+    for f, reduce in [('mean', np.mean), ('min', np.min), ('max', np.max), ('sum', np.sum), ('count', len),
+                      ('std', np.std), (np.median, np.median)]:
+        values = asof_aggregate(events, offsets, f=f, single_type='nearest', tolerance=datetime.timedelta(hours=12))
+        for event_values, event_snapshots in zip(values, snapshots):
+            for value, sg in zip(event_values, event_snapshots):
+                if sg is None or len(sg) == 0:
+                    assert np.isnan(value)
+                else:
+                    assert np.isclose(value, reduce(sg.get_prices()))
+    with pytest.raises(ValueError):
+        asof_aggregate(events, offsets, f='median')
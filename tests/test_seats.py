@@ -0,0 +1,808 @@
+import bisect
+import datetime
+import gc
+import math
+import os
+import random
+import re
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from Seats import SeatGroupChronology, RollingSeatGroupChronology, SeatGroup, FlatSeatGroup, Seat
+from Seats import LazySeatGroups, SeatGroupFixedPrice, estimate_nbytes, SEAT_NBYTES
+from Seats import EmptySeatGroupError, DuplicateSeatError
+from Seats import dt_list_arange, dt_list_trim, dt_slice_bounds, to_datetime64
+from nearest import nearest_index, nearest_indices
+
+
+def make_seatgroup(seats, seatgroup_class=SeatGroup):
+    sg = seatgroup_class()
+    for loc, price in seats:
+        sg.add_seat(Seat(price=price), loc)
+    return sg
+
+
+def assert_totals_match_seats(sg):
+    prices = sg.get_prices()
+    assert len(sg) == len(sg.get_locs()) == len(prices)
+    assert sg.totals[1] == sum(prices)
+
+
+def test_get_seats_as_seatgroup_totals_after_changes_through_either_group():
+    sg = make_seatgroup([(('100', 'A', '0'), 10.0), (('100', 'A', '1'), 20.0), (('100', 'B', '0'), 30.0),
+                         (('101', 'A', '0'), 40.0)])
+    sub = sg.get_seats_as_seatgroup([('100',)])
+
+    sg.remove(('100', 'A', '0'))
+    assert_totals_match_seats(sg)
+    assert_totals_match_seats(sub)
+    assert len(sg) == 3
+    assert len(sub) == 3
+
+    sub.remove(('100', 'B', '0'))
+    assert_totals_match_seats(sg)
+    assert_totals_match_seats(sub)
+    assert sg.get_locs() == [('100', 'A', '1'), ('100', 'B', '0'), ('101', 'A', '0')]
+    assert sub.get_locs() == [('100', 'A', '0'), ('100', 'A', '1')]
+
+
+def test_changing_a_copy_leaves_the_original_unchanged():
+    seats = [(('100', 'A', '0'), 10.0), (('100', 'A', '1'), 20.0), (('100', 'B', '0'), 30.0), (('101', 'A', '0'), 40.0)]
+    changes = [lambda sg: sg.add_seat(Seat(price=50.0), ('100', 'A', '2')),
+               lambda sg: sg.remove(('100', 'B', '0')),
+               lambda sg: sg.merge(make_seatgroup([(('100', 'A', '0'), 5.0), (('102', 'A', '0'), 60.0)],
+                                                  type(sg)), inplace=True, handle_duplicates='cheapest'),
+               lambda sg: sg.update_names([('^A$', 'Z')])]
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        for change in changes:
+            # Either the copy or the original can be changed
+            for changed_copy in [True, False]:
+                sg = make_seatgroup(seats, seatgroup_class)
+                # Compute the totals first, so the copy starts with them
+                sg.totals
+                copied = sg.copy()
+                change(copied if changed_copy else sg)
+                unchanged = sg if changed_copy else copied
+                assert unchanged.get_locs() == [loc for loc, price in seats]
+                assert list(unchanged.get_prices()) == [price for loc, price in seats]
+                assert_totals_match_seats(unchanged)
+                assert_totals_match_seats(copied if changed_copy else sg)
+
+        # SeatGroups from an SGC share its Seats, but changing their structure leaves the SGC unchanged
+        t0, t1, hour = datetime.datetime(2017, 11, 1, 0), datetime.datetime(2017, 11, 1, 1), datetime.timedelta(hours=1)
+        sgc = SeatGroupChronology(seatgroup_class=seatgroup_class)
+        for tp in [t0, t1]:
+            sgc.add_seatgroup(tp, make_seatgroup(seats, seatgroup_class))
+        before = snapshot(sgc)
+        for sg in [sgc[t1], sgc[t0::hour].seatgroups[t1]]:
+            assert sg.get_seats_as_list([('100', 'A', '0')])[0] is \
+                sgc.seatgroups[t1].get_seats_as_list([('100', 'A', '0')])[0]
+            for change in changes:
+                change(sg)
+            assert snapshot(sgc) == before
+            assert_totals_match_seats(sgc.seatgroups[t1])
+        sliced = sgc.get_timepoints_as_seatgroupchronology(slice(None, None, hour), copy_seats=True)
+        sliced.seatgroups[t0].get_seats_as_list([('100', 'A', '0')])[0].price = 1.0
+        assert snapshot(sgc) == before
+
+
+def as_tree(sg):
+    # Nested dict of {name: subtree or price} of a SeatGroup
+    return {name: as_tree(sg.seats[name]) if isinstance(sg.seats[name], SeatGroup) else sg.seats[name].price
+            for name in sg.sorted_names}
+
+
+def tree_seats(tree, prefix=()):
+    for name, value in sorted(tree.items()):
+        if isinstance(value, dict):
+            yield from tree_seats(value, prefix + (name,))
+        else:
+            yield prefix + (name,), value
+
+
+def original_update_names(tree, namemap, depth=None):
+    # The original SeatGroup.update_names() on a nested dict without name collisions: names are visited by position in
+    # the sorted names as renames reorder them, and depth is used up by each child group renamed in turn
+    i = 0
+    while i < len(tree):
+        name = sorted(tree)[i]
+        if isinstance(tree[name], dict):
+            if depth is None:
+                original_update_names(tree[name], namemap, depth)
+            elif depth > 1:
+                depth = depth - 1
+                original_update_names(tree[name], namemap, depth)
+        for pattern, repl in namemap:
+            for oldname in [n for n in sorted(tree) if re.search(pattern, n)]:
+                tree[re.sub(pattern, repl, oldname)] = tree.pop(oldname)
+        i += 1
+
+
+def test_update_names_depth_is_used_up_across_sibling_groups():
+    sg = make_seatgroup(tree_seats({'a': {'a': {'a': 1.0}}, 'b': {'a': {'a': 2.0}}}))
+    sg.update_names([('a', 'A')], depth=2)
+    assert as_tree(sg) == {'A': {'A': {'a': 1.0}}, 'b': {'a': {'a': 2.0}}}
+    assert sg.totals[1] == 3.0
+
+
+def test_update_names_matches_original_semantics():
+    rng = random.Random(4)
+    for trial in range(200):
+        names = [letter + digit for letter in 'abc' for digit in '12']
+        tree = {}
+        for _ in range(rng.randint(1, 12)):
+            tree.setdefault(rng.choice(names), {}).setdefault(rng.choice(names), {})[rng.choice(names)] = \
+                float(rng.randint(1, 50))
+        # Renames to upper case move names earlier and those to '~' later.  Each is one-to-one, so names never merge
+        namemap = rng.sample([('a', 'A'), ('b', '~b'), ('c', 'C'), ('1', '9')], rng.randint(1, 3))
+        depth = rng.choice([None, 1, 2, 3])
+        sg = make_seatgroup(tree_seats(tree))
+        sg.update_names(namemap, depth=depth)
+        original_update_names(tree, namemap, depth=depth)
+        assert as_tree(sg) == tree
+        assert sg.totals[1] == sum(price for loc, price in tree_seats(tree))
+
+
+def random_tree(rng, sections):
+    # Nested dict of {section: {row: {seat: price}}} with a random subset of seats
+    tree = {}
+    for section in sections:
+        for row in ['Row A', 'Row B', 'Row C']:
+            for seat in ['1', '2', '10']:
+                if rng.random() < 0.5:
+                    tree.setdefault(section, {}).setdefault(row, {})[seat] = float(rng.randint(1, 50))
+    return tree
+
+
+def assert_same_seats(flat, nested):
+    assert isinstance(flat, FlatSeatGroup)
+    assert flat.get_locs() == nested.get_locs()
+    assert list(flat.get_prices()) == list(nested.get_prices())
+    assert flat.totals == nested.totals
+
+
+def test_flat_seatgroup_matches_seatgroup():
+    rng = random.Random(5)
+    # Renames that keep the order of names and match no name made by any of them, for which both layouts rename the
+    # same names (see FlatSeatGroup.update_names())
+    renames = [('^Sec ', ''), ('^Row ', ''), (r'^(\d\d?)$', r'S\1')]
+    for trial in range(100):
+        sections = rng.choice([['Sec 101'], ['Sec 101', 'Sec 102', 'Sec 110']])
+        tree = random_tree(rng, sections)
+        if not tree:
+            continue
+        nested = make_seatgroup(tree_seats(tree))
+        flat = make_seatgroup(tree_seats(tree), FlatSeatGroup)
+        assert_same_seats(flat, nested)
+        for depth in [None, 1, 2, 3]:
+            assert flat.get_locs(depth=depth) == nested.get_locs(depth=depth)
+
+        other_tree = random_tree(rng, sections)
+        for other in [make_seatgroup(tree_seats(other_tree)), make_seatgroup(tree_seats(other_tree), FlatSeatGroup)]:
+            flat_diff = flat.difference(other)
+            nested_diff = nested.difference(make_seatgroup(tree_seats(other_tree)))
+            for key in ['added', 'removed', 'new_price', 'new_listid']:
+                assert_same_seats(flat_diff[key], nested_diff[key])
+
+        prefix = rng.choice([loc[:n] for loc, price in tree_seats(tree) for n in [1, 2, 3]])
+        flat.remove(prefix)
+        nested.remove(prefix)
+        assert_same_seats(flat, nested)
+
+        # SeatGroup uses up depth across sibling groups, so a depth that reaches sibling groups is not compared (depth 2
+        # only reaches the rows of a single section)
+        namemap = rng.sample(renames, rng.randint(1, len(renames)))
+        depth = rng.choice([None, 1] if len(sections) > 1 else [None, 1, 2])
+        flat.update_names(namemap, depth=depth)
+        nested.update_names(namemap, depth=depth)
+        assert_same_seats(flat, nested)
+
+
+def test_add_seats_matches_add_seat():
+    rng = random.Random(6)
+    locs = [(section, row, str(n)) for section in ['101', '102'] for row in ['A', 'B'] for n in range(5)]
+    for trial in range(50):
+        existing = rng.sample(locs, rng.randint(0, 5))
+        new = rng.sample([loc for loc in locs if loc not in existing], rng.randint(0, 10))
+        prices = {loc: float(rng.randint(1, 50)) for loc in locs}
+        for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+            one_by_one = make_seatgroup([(loc, prices[loc]) for loc in existing + new], seatgroup_class)
+            bulk = make_seatgroup([(loc, prices[loc]) for loc in existing], seatgroup_class)
+            bulk.add_seats(new, [Seat(price=prices[loc]) for loc in new])
+            assert bulk.get_locs() == one_by_one.get_locs()
+            assert list(bulk.get_prices()) == list(one_by_one.get_prices())
+            assert bulk.totals == one_by_one.totals
+            assert_totals_match_seats(bulk)
+
+
+def test_add_seats_duplicates(capsys):
+    # ('101', 'A', '1') is already in the group, and ('101', 'B', '1') is repeated in the new seats
+    locs = [('101', 'A', '0'), ('101', 'A', '1'), ('101', 'B', '1'), ('101', 'B', '1'), ('101', 'B', '2')]
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        for on_duplicate in ['raise', 'warn', 'skip']:
+            sg = make_seatgroup([(('101', 'A', '1'), 10.0)], seatgroup_class)
+            seats = [Seat(price=price) for price in [20.0, 30.0, 40.0, 50.0, 60.0]]
+            if on_duplicate == 'raise':
+                with pytest.raises(DuplicateSeatError):
+                    sg.add_seats(locs, seats, on_duplicate=on_duplicate)
+                # Seats before the duplicate are kept
+                assert sg.get_locs() == [('101', 'A', '0'), ('101', 'A', '1')]
+                assert list(sg.get_prices()) == [20.0, 10.0]
+            else:
+                sg.add_seats(locs, seats, on_duplicate=on_duplicate)
+                # The first seat at each location is kept
+                assert sg.get_locs() == [('101', 'A', '0'), ('101', 'A', '1'), ('101', 'B', '1'), ('101', 'B', '2')]
+                assert list(sg.get_prices()) == [20.0, 10.0, 40.0, 60.0]
+                assert (capsys.readouterr().out.count('WARNING') == 2) == (on_duplicate == 'warn')
+            assert_totals_match_seats(sg)
+        with pytest.raises(ValueError):
+            make_seatgroup([], seatgroup_class).add_seats(locs, seats, on_duplicate='ignore')
+
+
+def snapshot(sgc):
+    return [(tp, sgc.seatgroups[tp].get_locs(), list(sgc.seatgroups[tp].get_prices())) for tp in sgc.sorted_timepoints]
+
+
+def test_save_and_load_with_and_without_mmap(tmp_path):
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        sgc = SeatGroupChronology(seatgroup_class=seatgroup_class)
+        for t, seats in enumerate([[(('100', 'A', '0'), 10.0), (('100', 'A', '1'), 20.0), (('101', 'B', '0'), 30.0)],
+                                   [(('100', 'A', '1'), 25.0), (('101', 'B', '0'), 30.0)],
+                                   [(('100', 'A', '0'), 12.0), (('101', 'B', '0'), 30.0)]]):
+            sg = seatgroup_class()
+            sg.add_seats([loc for loc, price in seats], [Seat(price=price) for loc, price in seats])
+            sgc.add_seatgroup(datetime.datetime(2017, 11, 1, t), sg)
+        sgc.find_differences()
+        path = str(tmp_path / seatgroup_class.__name__)
+        sgc.save(path)
+        for mmap_mode in [None, 'r']:
+            loaded = SeatGroupChronology.load(path, mmap_mode=mmap_mode)
+            assert loaded.lazy == (mmap_mode is not None)
+            assert snapshot(loaded) == snapshot(sgc)
+            assert snapshot(loaded.sales) == snapshot(sgc.sales)
+            assert all(type(loaded.seatgroups[tp]) is seatgroup_class for tp in loaded.sorted_timepoints)
+
+
+def test_partition_matches_query_and_keeps_seatgroup_class():
+    mapping = {'lower': [('100',)], 'row_b': [('100', 'B'), ('101', 'B')], 'none': [('102',)]}
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        sgc = SeatGroupChronology(seatgroup_class=seatgroup_class)
+        for t, seats in enumerate([[(('100', 'A', '0'), 10.0), (('100', 'B', '1'), 20.0), (('101', 'B', '0'), 30.0)],
+                                   [(('100', 'B', '1'), 25.0), (('101', 'B', '0'), 30.0)]]):
+            sg = seatgroup_class()
+            sg.add_seats([loc for loc, price in seats], [Seat(price=price) for loc, price in seats])
+            sgc.add_seatgroup(datetime.datetime(2017, 11, 1, t), sg)
+        parts = sgc.partition(mapping)
+        assert sorted(parts) == sorted(mapping)
+        for key, patterns in mapping.items():
+            assert parts[key].seatgroup_class is seatgroup_class
+            assert snapshot(parts[key]) == snapshot(sgc.query(patterns))
+            assert all(type(parts[key].seatgroups[tp]) is seatgroup_class for tp in parts[key].sorted_timepoints)
+
+
+def test_derived_chronologies_keep_settings(tmp_path):
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        spill_dir = str(tmp_path / seatgroup_class.__name__)
+        sgc = SeatGroupChronology(seatgroup_class=seatgroup_class, max_resident_nbytes=1, spill_dir=spill_dir)
+        for t, seats in enumerate([[(('100', 'A', '0'), 10.0), (('100', 'B', '1'), 20.0), (('101', 'B', '0'), 30.0)],
+                                   [(('100', 'B', '1'), 25.0), (('101', 'B', '0'), 30.0)]]):
+            sgc.add_seatgroup(datetime.datetime(2017, 11, 1, t), make_seatgroup(seats, seatgroup_class))
+        for derived in [sgc.query([('100',)]), sgc.get_seats([('101', 'B', '0')]),
+                        sgc[datetime.datetime(2017, 11, 1, 1)::datetime.timedelta(hours=1)]]:
+            assert derived.seatgroup_class is seatgroup_class
+            assert derived.max_resident_nbytes == 1
+            assert derived.spill_dir == spill_dir
+        assert snapshot(sgc.query([('100',)])) == [
+            (datetime.datetime(2017, 11, 1, 0), [('100', 'A', '0'), ('100', 'B', '1')], [10.0, 20.0]),
+            (datetime.datetime(2017, 11, 1, 1), [('100', 'B', '1')], [25.0])]
+
+
+def random_seatgroup(rng, seatgroup_class):
+    # SeatGroup of a random subset of 30 seats, with list ids, face values and some unpriced seats
+    sg = seatgroup_class()
+    locs = [(section, row, str(n)) for section in ['101', '102'] for row in ['A', 'B', 'C'] for n in range(5)]
+    locs = [loc for loc in locs if rng.random() < 0.7]
+    sg.add_seats(locs, [Seat(price=rng.choice([None, 10.0, 20.5, 40.0]), facevalue=rng.choice([None, 15.0]),
+                             list_id=rng.randint(1, 5)) for loc in locs])
+    return sg
+
+
+def assert_same_seatgroup(sg, expected):
+    assert type(sg) is type(expected)
+    assert sg.get_locs() == expected.get_locs()
+    assert sg.get_seats_as_list(sg.get_locs()) == expected.get_seats_as_list(expected.get_locs())
+    assert sg.totals == expected.totals
+
+
+def test_lazy_seatgroups_evicts_least_recently_used():
+    loads = []
+
+    def loader(tp):
+        loads.append(tp)
+        return make_seatgroup([(('101', 'A', str(n)), 10.0) for n in range(tp + 1)])
+
+    # Room for the SeatGroups of timepoints 1 and 2 (2 and 3 seats), but not with timepoint 0 (1 seat) as well
+    mapping = LazySeatGroups(max_nbytes=5 * SEAT_NBYTES)
+    for tp in range(3):
+        mapping.register(tp, lambda tp=tp: loader(tp))
+    assert loads == [] and len(mapping) == 3
+    assert len(mapping[0]) == 1 and len(mapping[1]) == 2 and len(mapping[2]) == 3
+    assert loads == [0, 1, 2]
+    assert [mapping.is_resident(tp) for tp in range(3)] == [False, True, True]
+    assert mapping.resident_nbytes == 5 * SEAT_NBYTES
+
+    # Using timepoint 1 makes timepoint 2 the least recently used, so it is dropped when timepoint 0 is reloaded
+    mapping[1]
+    mapping[0]
+    assert loads == [0, 1, 2, 0]
+    assert [mapping.is_resident(tp) for tp in range(3)] == [True, True, False]
+
+    # SeatGroups assigned directly are always resident and do not count toward the budget
+    mapping[3] = make_seatgroup([(('101', 'A', str(n)), 10.0) for n in range(10)])
+    assert mapping.is_resident(3) and mapping.resident_nbytes == 3 * SEAT_NBYTES
+    del mapping[0]
+    assert 0 not in mapping and sorted(mapping) == [1, 2, 3]
+
+
+def test_spilled_seatgroups_reload_unchanged(tmp_path):
+    rng = random.Random(8)
+    spill_dir = str(tmp_path / 'spill')
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        sgc = SeatGroupChronology(seatgroup_class=seatgroup_class, max_resident_nbytes=40 * SEAT_NBYTES,
+                                  spill_dir=spill_dir)
+        expected = {}
+        for t in range(6):
+            tp = datetime.datetime(2017, 11, 1, t)
+            sg = random_seatgroup(rng, seatgroup_class)
+            expected[tp] = sg.copy(copy_seats=True)
+            sgc.add_seatgroup(tp, sg)
+        mapping = sgc.seatgroups
+        assert len(mapping._spilled) > 0
+        assert sorted(os.listdir(mapping.spill_path)) == sorted(os.path.basename(path)
+                                                                for path in mapping._spilled.values())
+        # Reading back every timepoint (in an order that spills and reloads them again) gives the same SeatGroups
+        for tp in list(reversed(sgc.sorted_timepoints)) + sgc.sorted_timepoints:
+            assert_same_seatgroup(sgc.seatgroups[tp], expected[tp])
+        assert mapping.resident_nbytes <= 40 * SEAT_NBYTES
+
+        # A removed timepoint's file is deleted, and the directory goes with the mapping
+        spilled_tp = next(iter(mapping._spilled))
+        spilled_path = mapping._spilled[spilled_tp]
+        del mapping[spilled_tp]
+        assert not os.path.exists(spilled_path)
+        spill_path = mapping.spill_path
+        del sgc, mapping
+        gc.collect()
+        assert not os.path.exists(spill_path)
+    assert os.listdir(spill_dir) == []
+
+
+def test_seatgroup_with_fixed_price_group_stays_resident(tmp_path):
+    mapping = LazySeatGroups(max_nbytes=1, spill_dir=str(tmp_path))
+    fixed = SeatGroup()
+    sgfp = SeatGroupFixedPrice()
+    sgfp.add_seat(Seat(price=50.0))
+    fixed.add_seat(sgfp, ('101',))
+    mapping['fixed'] = fixed
+    mapping['plain'] = make_seatgroup([(('101', 'A', '1'), 10.0)])
+    mapping['other'] = make_seatgroup([(('101', 'A', '2'), 20.0)])
+    assert mapping.is_resident('fixed') and mapping['fixed'] is fixed
+    assert 'fixed' not in mapping._spilled
+    assert 'plain' in mapping._spilled
+    assert mapping['plain'].get_prices().tolist() == [10.0]
+
+
+def test_seat_nbytes_is_not_below_measured_size():
+    locs = [(str(section), row, str(n)) for section in range(100, 110) for row in 'ABCDEFGHIJ' for n in range(20)]
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            sg = seatgroup_class()
+            sg.add_seats(locs, [Seat(price=float(i % 90), list_id=i // 4) for i in range(len(locs))])
+            gc.collect()
+            measured = tracemalloc.get_traced_memory()[0] - before
+        finally:
+            tracemalloc.stop()
+        assert measured <= estimate_nbytes(sg) <= 3 * measured
+
+
+def rolling_and_batch(snapshots, horizon, windows, groups=None, **kwargs):
+    # Yield a RollingSeatGroupChronology (made with kwargs) and a batch chronology (with find_differences()) after
+    # each snapshot
+    rolling = RollingSeatGroupChronology(horizon, groups=groups, moving_average_timedeltas=windows, **kwargs)
+    batch = SeatGroupChronology()
+    for k, prices in enumerate(snapshots):
+        tp = datetime.datetime(2017, 11, 1) + datetime.timedelta(hours=k)
+        seats = [(('100', 'A', name), price) for name, price in prices.items()]
+        rolling.add_seatgroup(tp, make_seatgroup(seats, rolling.seatgroup_class))
+        batch.add_seatgroup(tp, make_seatgroup(seats))
+        full = batch.copy()
+        full.find_differences()
+        yield rolling, full
+
+
+def batch_moving_average(sgc, td, seat_patterns=None):
+    # Moving average of sgc's sales at its newest timepoint, or None if it has no sales there
+    try:
+        history = sgc.calc_average_price_history(average_type='moving', moving_average_timedelta=td,
+                                                 seat_patterns=seat_patterns)
+    except EmptySeatGroupError:
+        return None
+    if len(history) == 0 or history['timepoint'][-1] != sgc.sorted_timepoints[-1]:
+        return None
+    return history['price'][-1]
+
+
+def masked_moving_average(sgc, td):
+    # The original moving average: for each timepoint with prices, the average of the prices at the timepoints
+    # between td before it and itself, found by masking every timepoint
+    tps = np.array([tp for tp in sgc.sorted_timepoints if len(sgc.seatgroups[tp]) > 0], dtype=object)
+    rows = np.array([(sum(sgc.seatgroups[tp].get_prices()), len(sgc.seatgroups[tp])) for tp in tps])
+    avg = []
+    for i in range(len(tps)):
+        subset_sum = rows[(tps >= tps[i] - td) & (tps <= tps[i])].sum(axis=0)
+        avg.append(subset_sum[0] / subset_sum[1])
+    return list(tps), avg
+
+
+def test_moving_averages_for_several_windows_match_single_window_loop():
+    rng = random.Random(3)
+    sgc = SeatGroupChronology()
+    tp = datetime.datetime(2017, 11, 1)
+    for _ in range(40):
+        tp += datetime.timedelta(minutes=rng.choice([10, 45, 60, 300]))
+        seats = [(('100', 'A', str(n)), round(rng.uniform(10, 90), 2)) for n in range(6) if rng.random() < 0.5]
+        sgc.add_seatgroup(tp, make_seatgroup(seats))
+    windows = [datetime.timedelta(0), datetime.timedelta(hours=1), datetime.timedelta(hours=5),
+               datetime.timedelta(days=2)]
+    averages = sgc.calc_average_price_history(average_type='moving', moving_average_timedelta=windows,
+                                              price_type='listed')
+    assert list(averages) == windows
+    for td in windows:
+        tps, expected = masked_moving_average(sgc, td)
+        assert list(averages[td]['timepoint']) == tps
+        np.testing.assert_allclose(averages[td]['price'], expected, rtol=1e-12)
+        single = sgc.calc_average_price_history(average_type='moving', moving_average_timedelta=td,
+                                                price_type='listed')
+        np.testing.assert_array_equal(single['price'], averages[td]['price'])
+
+
+def test_moving_average_rejects_empty_window_list():
+    sgc = SeatGroupChronology()
+    sgc.add_seatgroup(datetime.datetime(2017, 11, 1), make_seatgroup([(('100', 'A', '0'), 10.0)]))
+    with pytest.raises(ValueError):
+        sgc.calc_average_price_history(average_type='moving', moving_average_timedelta=[], price_type='listed')
+
+
+def test_rolling_moving_average_retracts_sale_leaving_window():
+    # A is removed at 1h, relisted at 2h and removed again at 3h, so only its last removal is a sale
+    snapshots = [{'A': 10.0, 'B': 50.0, 'C': 30.0}, {'B': 50.0, 'C': 30.0}, {'A': 10.0, 'C': 30.0}, {'C': 30.0}]
+    td = datetime.timedelta(hours=1)
+    for rolling, full in rolling_and_batch(snapshots, datetime.timedelta(hours=10), [td]):
+        pass
+    assert rolling.moving_averages()[td]['All'] == batch_moving_average(full, td) == 30.0
+
+
+def test_rolling_chronology_matches_batch_results():
+    rng = random.Random(0)
+    names = [str(i) for i in range(8)]
+    snapshots = [{name: float(rng.choice([10, 20, 40])) for name in names if rng.random() < 0.6} for _ in range(40)]
+    horizon = datetime.timedelta(hours=4)
+    windows = [datetime.timedelta(hours=1), datetime.timedelta(hours=3)]
+    groups = {'low': [('100', 'A', ['0', '1', '2', '3'])]}
+    for rolling, full in rolling_and_batch(snapshots, horizon, windows, groups=groups):
+        newest = full.sorted_timepoints[-1]
+        assert rolling.sorted_timepoints == [tp for tp in full.sorted_timepoints if tp >= newest - horizon]
+        for tp in rolling.sales.sorted_timepoints:
+            assert rolling.sales.seatgroups[tp].get_locs() == full.sales.seatgroups[tp].get_locs()
+        averages = rolling.moving_averages()
+        for td in windows:
+            for group, patterns in [('All', None), ('low', groups['low'])]:
+                sales = full.sales if patterns is None else full.sales.query(patterns)
+                prices = [p for tp in sales.sorted_timepoints if tp >= newest - td
+                          for p in sales.seatgroups[tp].get_prices()]
+                if prices:
+                    assert math.isclose(averages[td][group], sum(prices) / len(prices))
+                else:
+                    assert math.isnan(averages[td][group])
+                expected = batch_moving_average(full, td, seat_patterns=patterns)
+                if expected is not None:
+                    assert math.isclose(averages[td][group], expected)
+
+
+def test_rolling_chronology_evicts_and_matches_batch_with_spill(tmp_path):
+    rng = random.Random(2)
+    names = [str(i) for i in range(6)]
+    snapshots = [{name: float(rng.choice([10, 20, 40])) for name in names if rng.random() < 0.7} for _ in range(30)]
+    horizon = datetime.timedelta(hours=5)
+    windows = [datetime.timedelta(hours=2), datetime.timedelta(hours=5)]
+    groups = {'low': [('100', 'A', ['0', '1', '2'])]}
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        spill_dir = str(tmp_path / seatgroup_class.__name__)
+        n_compared = 0
+        for rolling, full in rolling_and_batch(snapshots, horizon, windows, groups=groups,
+                                               seatgroup_class=seatgroup_class, max_resident_nbytes=1,
+                                               spill_dir=spill_dir):
+            newest = full.sorted_timepoints[-1]
+            retained = [tp for tp in full.sorted_timepoints if tp >= newest - horizon]
+            assert rolling.sorted_timepoints == retained
+            assert snapshot(rolling) == [entry for entry in snapshot(full) if entry[0] in retained]
+            for attr in ['added', 'removed', 'new_price', 'new_listid', 'sales']:
+                derived = getattr(rolling, attr)
+                assert derived.seatgroup_class is seatgroup_class
+                assert derived.spill_dir == spill_dir and derived.max_resident_nbytes == 1
+                assert snapshot(derived) == [entry for entry in snapshot(getattr(full, attr)) if entry[0] in retained]
+
+            averages = rolling.moving_averages()
+            mins = rolling.min_available()
+            for group, patterns in [('All', None), ('low', groups['low'])]:
+                for td in windows:
+                    # The batch history only has a moving average at timepoints with sales
+                    expected = batch_moving_average(full, td, seat_patterns=patterns)
+                    if expected is not None:
+                        assert math.isclose(averages[td][group], expected)
+                        n_compared += 1
+                assert list(mins[group]['timepoint']) == retained
+                for tp, price in zip(retained, mins[group]['price']):
+                    sg = full.seatgroups[tp] if patterns is None else full.seatgroups[tp].query(patterns)
+                    if len(sg) == 0:
+                        assert math.isnan(price)
+                    else:
+                        assert price == min(sg.get_prices())
+        assert n_compared > 0
+
+
+def test_rolling_min_available_ignores_unpriced_seats():
+    snapshots = [[(('100', 'A', '0'), None), (('100', 'A', '1'), 20.0), (('100', 'B', '0'), 10.0)],
+                 [(('100', 'A', '0'), None), (('100', 'B', '0'), 15.0)]]
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        rolling = RollingSeatGroupChronology(datetime.timedelta(days=10), groups={'row_a': [('100', 'A')]},
+                                             seatgroup_class=seatgroup_class)
+        for k, seats in enumerate(snapshots):
+            rolling.add_seatgroup(datetime.datetime(2017, 11, 1, k), make_seatgroup(seats, seatgroup_class))
+        mins = rolling.min_available()
+        assert mins['All']['price'].tolist() == [10.0, 15.0]
+        assert mins['row_a']['price'][0] == 20.0
+        assert np.isnan(mins['row_a']['price'][1])
+
+
+def test_find_differences_sales_match_original_rule():
+    # The original rule: a removed seat is a sale unless the same location is removed again at a later timepoint
+    rng = random.Random(1)
+    locs = [(section, row, str(n)) for section in ['100', '101'] for row in ['A', 'B'] for n in range(3)]
+    for trial in range(300):
+        n_timepoints = rng.randint(1, 10)
+        listed = [[(loc, float(rng.choice([10, 20]))) for loc in locs if rng.random() < rng.random()]
+                  for _ in range(n_timepoints)]
+        for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+            sgc = SeatGroupChronology(seatgroup_class=seatgroup_class)
+            for k, seats in enumerate(listed):
+                sg = seatgroup_class()
+                sg.add_seats([loc for loc, price in seats], [Seat(price=price) for loc, price in seats])
+                sgc.add_seatgroup(datetime.datetime(2017, 11, 1) + datetime.timedelta(hours=k), sg)
+            sgc.find_differences()
+
+            removed = [set(sgc.removed.seatgroups[tp].get_locs()) for tp in sgc.removed.sorted_timepoints]
+            added = [set(sgc.added.seatgroups[tp].get_locs()) for tp in sgc.added.sorted_timepoints]
+            bitmap = sgc.availability_bitmap()
+            for changes, bits in [(removed, bitmap.removals()), (added, bitmap.additions())]:
+                rows, columns = bitmap.nonzero(bits)
+                assert sorted((j - 1, bitmap.locs[i]) for i, j in zip(rows, columns)) == \
+                    sorted((j, loc) for j, locs_j in enumerate(changes) for loc in locs_j)
+            assert sgc.sales.sorted_timepoints == sgc.removed.sorted_timepoints
+            for i, tp in enumerate(sgc.sales.sorted_timepoints):
+                expected = sorted(loc for loc in removed[i] if not any(loc in later for later in removed[i + 1:]))
+                assert sgc.sales.seatgroups[tp].get_locs() == expected
+
+
+def make_resample_chronology(seatgroup_class):
+    # Hourly buckets 10:00 (two timepoints), 11:00 (two timepoints), and 13:00 (one timepoint; 12:00 is empty).  A2's
+    # removal at 10:30 is not a sale because it is relisted and removed again at 11:45
+    a1, a2, b1, c1 = ('101', 'A', '1'), ('101', 'A', '2'), ('102', 'B', '1'), ('103', 'C', '1')
+    sgc = SeatGroupChronology(seatgroup_class=seatgroup_class)
+    for (hour, minute), seats in [((10, 0), [(a1, 10.0), (a2, 20.0), (b1, 30.0)]),
+                                  ((10, 30), [(a1, 12.0), (b1, 30.0)]),
+                                  ((11, 15), [(a1, 14.0), (a2, 20.0), (c1, 50.0)]),
+                                  ((11, 45), [(a1, 16.0)]),
+                                  ((13, 10), [(a1, 18.0)])]:
+        sgc.add_seatgroup(datetime.datetime(2017, 11, 1, hour, minute), make_seatgroup(seats, seatgroup_class))
+    sgc.find_differences()
+    return sgc
+
+
+def resample_rows(table):
+    # Fields by name, since record attributes min and max are numpy methods
+    fields = ['open', 'close', 'min', 'max', 'mean']
+    return [(row['timepoint'].hour, row['group'],
+             *[None if math.isnan(row[field]) else round(row[field], 6) for field in fields],
+             row['listed'], row['sales']) for row in table]
+
+
+def test_resample_matches_hand_computed_buckets():
+    nan = None
+    hour = datetime.timedelta(hours=1)
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        sgc = make_resample_chronology(seatgroup_class)
+        # (bucket hour, group, open, close, min, max, mean, listed, sales)
+        assert resample_rows(sgc.resample(hour)) == [
+            (10, 'All', 20.0, 21.0, 10.0, 30.0, 20.4, 2, 0),
+            (11, 'All', 28.0, 16.0, 14.0, 50.0, 25.0, 1, 3),
+            (13, 'All', 18.0, 18.0, 18.0, 18.0, 18.0, 1, 0)]
+        # 102 has a sale but no listings in the 11:00 bucket, and 103 is not listed at the bucket's last timepoint
+        assert resample_rows(sgc.resample(hour, depth=1)) == [
+            (10, ('101',), 15.0, 12.0, 10.0, 20.0, 14.0, 1, 0),
+            (10, ('102',), 30.0, 30.0, 30.0, 30.0, 30.0, 1, 0),
+            (11, ('101',), 17.0, 16.0, 14.0, 20.0, round(50 / 3, 6), 1, 1),
+            (11, ('102',), nan, nan, nan, nan, nan, 0, 1),
+            (11, ('103',), 50.0, 50.0, 50.0, 50.0, 50.0, 0, 1),
+            (13, ('101',), 18.0, 18.0, 18.0, 18.0, 18.0, 1, 0)]
+        assert resample_rows(sgc.resample(hour, groups={'lower': [('101',)], 'upper': [('102',), ('103',)]})) == [
+            (10, 'lower', 15.0, 12.0, 10.0, 20.0, 14.0, 1, 0),
+            (10, 'upper', 30.0, 30.0, 30.0, 30.0, 30.0, 1, 0),
+            (11, 'lower', 17.0, 16.0, 14.0, 20.0, round(50 / 3, 6), 1, 1),
+            (11, 'upper', 50.0, 50.0, 50.0, 50.0, 50.0, 0, 2),
+            (13, 'lower', 18.0, 18.0, 18.0, 18.0, 18.0, 1, 0)]
+        # Two-hour buckets start at even hours since the epoch
+        assert [(row['timepoint'], row['listed'], row['sales']) for row in sgc.resample(2 * hour)] == [
+            (datetime.datetime(2017, 11, 1, 10), 1, 3), (datetime.datetime(2017, 11, 1, 12), 1, 0)]
+
+
+def test_to_matrix_dense_and_csr_layouts_agree():
+    a1, b1, c1 = ('101', 'A', '1'), ('102', 'B', '1'), ('103', 'C', '1')
+    for seatgroup_class in [SeatGroup, FlatSeatGroup]:
+        sgc = make_resample_chronology(seatgroup_class)
+        dense = sgc.to_matrix(layout='dense')
+        csr = sgc.to_matrix(layout='csr')
+        assert dense.locs == csr.locs == sorted(dense.locs)
+        assert dense.shape == csr.shape == (4, 5)
+        assert dense.nnz == csr.nnz == 10
+        prices, available = csr.to_dense()
+        np.testing.assert_array_equal(prices, dense.prices)
+        np.testing.assert_array_equal(available, dense.available)
+        assert prices[dense.loc_index[a1]].tolist() == [10.0, 12.0, 14.0, 16.0, 18.0]
+        assert available[dense.loc_index[b1]].tolist() == [True, True, False, False, False]
+        for loc in dense.locs:
+            assert dense.price_path(loc).tolist() == csr.price_path(loc).tolist()
+        assert csr.price_path(c1).tolist() == [(datetime.datetime(2017, 11, 1, 11, 15), 50.0)]
+
+        # Given rows, including one never listed, and an unpriced listing that is available with a NaN price
+        sgc.add_seatgroup(datetime.datetime(2017, 11, 1, 14), make_seatgroup([(b1, None)], seatgroup_class))
+        locs = [b1, ('104', 'D', '1')]
+        dense = sgc.to_matrix(locs=locs, layout='dense')
+        csr = sgc.to_matrix(locs=locs, layout='csr')
+        assert dense.locs == csr.locs == locs
+        prices, available = csr.to_dense()
+        np.testing.assert_array_equal(prices, dense.prices)
+        np.testing.assert_array_equal(available, dense.available)
+        assert available.tolist() == [[True, True, False, False, False, True], [False] * 6]
+        assert np.isnan(prices[0, -1])
+        assert len(csr.price_path(('104', 'D', '1'))) == 0
+        assert sgc.to_matrix(locs=locs).layout == 'csr'
+        assert sgc.to_matrix(locs=locs, dense_threshold=0.25).layout == 'dense'
+
+
+def original_dt_list_trim(dt_list, dt_slice):
+    # The original dt_list_trim(), which raises IndexError for a start past the last timepoint or a stop at or past it
+    if dt_slice.step is None or dt_slice.step.total_seconds() >= 0:
+        start, stop = dt_slice.start, dt_slice.stop
+    else:
+        start, stop = dt_slice.stop, dt_slice.start
+    if start is None:
+        start = 0
+    else:
+        i = bisect.bisect_left(dt_list, start)
+        start = i + 1 if dt_list[i] < start else i
+    if stop is not None:
+        i = bisect.bisect_right(dt_list, stop)
+        stop = i - 1 if dt_list[i] > stop else i
+    if start == stop:
+        return [dt_list[start]]
+    return dt_list[start:stop]
+
+
+def original_dt_list_arange(dt_list, dt_slice):
+    # The original dt_list_arange(), which marches one target at a time and stops at the first one out of range
+    dt_list = original_dt_list_trim(dt_list, dt_slice)
+    i = 0 if dt_slice.step.total_seconds() > 0 else len(dt_list) - 1
+    dt_target = dt_list[i] if dt_slice.start is None else dt_slice.start
+    indices = {i}
+    while True:
+        dt_target = dt_target + dt_slice.step
+        if dt_target < dt_list[0] or dt_target > dt_list[-1]:
+            break
+        indices.add(nearest_index(dt_list, dt_target))
+    return sorted(dt_list[i] for i in indices)
+
+
+def test_dt_list_functions_match_original_loops():
+    rng = random.Random(2)
+    t0 = datetime.datetime(2017, 11, 1)
+    n_compared = {'trim': 0, 'arange': 0, 'short': 0}
+    for trial in range(500):
+        minutes = sorted(rng.sample(range(24 * 60), rng.randint(1, 40)))
+        dt_list = [t0 + datetime.timedelta(minutes=m) for m in minutes]
+        ends = [None] + [t0 + datetime.timedelta(minutes=rng.randint(-60, 25 * 60)) for _ in range(2)] + \
+               [rng.choice(dt_list)]
+        start, stop = rng.choice(ends), rng.choice(ends)
+        step = datetime.timedelta(minutes=rng.choice([-1, 1]) * rng.randint(1, 180))
+        if start is not None and stop is not None and (stop - start).total_seconds() * step.total_seconds() < 0:
+            start, stop = stop, start
+        dt_slice = slice(start, stop, step)
+        try:
+            expected = original_dt_list_trim(dt_list, dt_slice)
+        except IndexError:
+            continue
+        upper = start if step.total_seconds() < 0 else stop
+        if upper is not None and upper < dt_list[0]:
+            # The original kept every timepoint but the last for a range before the first timepoint
+            assert dt_list_trim(dt_list, dt_slice) == []
+            continue
+        assert dt_list_trim(dt_list, dt_slice) == expected
+        n_compared['trim'] += 1
+
+        trimmed = expected
+        if len(trimmed) == 0:
+            assert dt_list_arange(dt_list, dt_slice) == []
+            continue
+        origin = trimmed[0 if step.total_seconds() > 0 else -1] if start is None else start
+        if (step.total_seconds() > 0 and origin + step < trimmed[0]) or \
+                (step.total_seconds() < 0 and origin + step > trimmed[-1]):
+            # The first target falls short of the range, where the original stopped without trying later targets
+            # Instead, every target on the grid inside the range is kept
+            index = to_datetime64(trimmed)
+            if step.total_seconds() > 0:
+                first, end = 0, index[-1] + np.timedelta64(1, 'us')
+            else:
+                first, end = len(trimmed) - 1, index[0] - np.timedelta64(1, 'us')
+            targets = np.arange(to_datetime64(origin) + np.timedelta64(step), end, np.timedelta64(step))
+            targets = targets[(targets >= index[0]) & (targets <= index[-1])]
+            assert dt_list_arange(dt_list, dt_slice) == \
+                [trimmed[i] for i in sorted(set(nearest_indices(index, targets).tolist()) | {first})]
+            n_compared['short'] += 1
+        else:
+            assert dt_list_arange(dt_list, dt_slice) == original_dt_list_arange(dt_list, dt_slice)
+            n_compared['arange'] += 1
+    assert min(n_compared.values()) > 20
+
+
+def test_dt_list_arange_edge_cases():
+    dt_list = [datetime.datetime(2017, 11, 1, h) for h in range(10)]
+    hour = datetime.timedelta(hours=1)
+    # The first target (23:00) is before the list, but later targets on the grid (1:00, 3:00, ...) are kept
+    assert dt_list_arange(dt_list, slice(datetime.datetime(2017, 10, 31, 21), None, 2 * hour)) == \
+        [datetime.datetime(2017, 11, 1, h) for h in [0, 1, 3, 5, 7, 9]]
+    assert original_dt_list_arange(dt_list, slice(datetime.datetime(2017, 10, 31, 21), None, 2 * hour)) == \
+        [datetime.datetime(2017, 11, 1, 0)]
+    # Likewise for a negative step from after the list (the first target is 10:00)
+    assert dt_list_arange(dt_list, slice(datetime.datetime(2017, 11, 1, 13), None, -3 * hour)) == \
+        [datetime.datetime(2017, 11, 1, h) for h in [1, 4, 7, 9]]
+    with pytest.raises(ValueError):
+        dt_list_arange(dt_list, slice(None, None, datetime.timedelta(0)))
+    with pytest.raises(ValueError):
+        dt_list_arange(dt_list, slice(None, None, None))
+    # A range outside the list is empty rather than an IndexError or every timepoint but the last
+    assert dt_list_arange(dt_list, slice(datetime.datetime(2017, 11, 2), None, hour)) == []
+    assert dt_list_trim(dt_list, slice(None, datetime.datetime(2017, 10, 31), hour)) == []
+    assert dt_list_trim(dt_list, slice(datetime.datetime(2017, 11, 1, 8), datetime.datetime(2017, 11, 2), hour)) == \
+        dt_list[8:]
+    index = to_datetime64(dt_list)
+    assert dt_slice_bounds(index, slice(None, None, None)) == (0, None)
+    assert dt_slice_bounds(index, slice(datetime.datetime(2017, 11, 1, 5), datetime.datetime(2017, 11, 1, 2),
+                                        -hour)) == (2, 5)
+
+
+def test_nearest_indices_matches_nearest_index():
+    rng = random.Random(3)
+    for trial in range(200):
+        a = np.array(sorted(rng.choices(range(100), k=rng.randint(1, 20))))
+        x = np.array([rng.randint(-10, 110) for _ in range(20)] + [a[0], a[-1]])
+        # nearest_index() returns -1 for the last element when x is past the end
+        expected = [nearest_index(list(a), xi) % len(a) for xi in x]
+        assert nearest_indices(a, x).tolist() == expected
+    # Ties go to the earlier element, for datetime64 arrays as well
+    index = to_datetime64([datetime.datetime(2017, 11, 1, h) for h in [0, 2, 4]])
+    assert nearest_indices(index, index + np.timedelta64(1, 'h')).tolist() == [0, 1, 2]